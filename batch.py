@@ -0,0 +1,278 @@
+'''
+Fits and generates points for every csv file in a directory (or matching a
+    glob) without prompting, spreading the files over a process pool, and
+    writes the Filename,Slope,Intercept summary to output.csv.
+Author: Edward Zhou
+'''
+
+import os
+import glob
+import time
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+import loader
+import seeding
+import engines
+import formats
+import fit_cache
+import instrument
+import gen_stream
+import fit_engine
+import generators
+
+def find_inputs(patterns):
+    '''
+    Expands directories and globs into a sorted list of csv files.
+    Args:
+        patterns (arr) : directories, globs or filenames.
+    Returns:
+        filenames (arr) : the matching csv files, without duplicates.
+    '''
+    filenames = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*.csv')
+        filenames.update(path for path in glob.glob(pattern)
+                         if os.path.isfile(path))
+    return sorted(filenames)
+
+def process_file(filename, engine = 'lsr', outDir = 'output_data',
+                 cache = False, seed = None, size = None,
+                 blockSize = gen_stream.BLOCK_SIZE, fmt = 'csv',
+                 generator = 'partition', fitCache = False, dtype = 'float64'):
+    '''
+    Fits one file, generates as many points as it has and writes them out.
+    Args:
+        filename (str) : the csv file with the points.
+        engine (str) : the name of the fitting engine (see engines.ENGINES).
+        outDir (str) : the directory the generated points are written to.
+        cache (bool) : reuses the binary copy of previously parsed files.
+        seed (int/SeedSequence) : the seed of the generated points.
+        size (int) : the number of points to generate, defaults to as many
+            as the file has.
+        blockSize (int) : the number of points generated and written at a time.
+        fmt (str) : the format of the generated points (see formats.SINKS).
+        generator (str) : the name of the point generator (see generators).
+        fitCache (bool) : reuses the fit of a file whose contents were fitted
+            with the same engine before (see fit_cache), skipping the load
+            and fit stages.
+        dtype (str) : the dtype the points are kept as (see
+            fit_engine.DTYPES), float32 halves the memory of the loaded
+            points, residuals and sample table while the fit is still summed
+            in float64. Generated blocks are drawn in float64 and only cast
+            before being written.
+    Returns:
+        result (dict) : the filename, slope, intercept, the time in seconds
+            spent in each stage, the peak memory (peakRss, in bytes, and
+            bytesPerPoint, the peak over the memory before the file per input
+            point) and the instrument metrics of the file.
+    '''
+    instrument.reset()
+    instrument.reset_peak_rss()
+    baseline = instrument.current_rss()
+    timings = {}
+    start = last = time.perf_counter()
+
+    fit = None
+    if fitCache:
+        key = fit_cache.cache_key(filename, engine, dtype)
+        fit = fit_cache.lookup(key)[0]
+    if fit is None:
+        xs, ys = loader.load_points(filename, cache = cache, dtype = dtype)
+        timings['load'] = time.perf_counter() - last
+        last = time.perf_counter()
+
+        slope, intercept = engines.fit(engine, xs, ys)
+        fit = fit_engine.FitResult(xs, ys, slope, intercept, keepErrors =
+                                   fitCache or
+                                   generators.uses_errors(generator),
+                                   dtype = dtype)
+        if fitCache:
+            fit_cache.store(key, fit)
+    else:
+        #a cached fit is loaded in place of the points.
+        xs, slope, intercept = fit.xs, fit.slope, fit.intercept
+        timings['load'] = time.perf_counter() - last
+        last = time.perf_counter()
+    timings['fit'] = time.perf_counter() - last
+    last = time.perf_counter()
+
+    #generation and writing overlap, so "write" is the time the writer
+    #thread was busy and "generate" the time for both together.
+    if size is None:
+        size = xs.size
+    outFileName = formats.output_name(filename, fmt, outDir)
+    generators.prepare(generator, fit)
+    writer = gen_stream.generate_to_file(outFileName,
+                                         generators.get_generator(generator),
+                                         (fit,), size, seed, blockSize,
+                                         fmt = fmt, dtype = dtype)
+    timings['generate'] = time.perf_counter() - last
+    timings['write'] = writer.busy
+    timings['total'] = time.perf_counter() - start
+    peak = instrument.memory_snapshot(filename, xs.size, baseline)
+
+    return {'filename' : filename, 'slope' : slope, 'intercept' : intercept,
+            'points' : int(xs.size), 'generated' : writer.rows,
+            'output' : outFileName, 'dtype' : np.dtype(dtype).name,
+            'timings' : timings, 'peakRss' : peak,
+            'bytesPerPoint' : instrument.bytes_per_point(peak, xs.size,
+                                                         baseline),
+            'metrics' : instrument.METRICS.to_dict()}
+
+def write_summary(results, outFileName = 'output.csv', fmt = None):
+    '''
+    Writes the slope and intercept of every file in the format of output.csv.
+    Args:
+        results (arr) : the results returned by process_file.
+        outFileName (str) : the summary file to write.
+        fmt (str) : the summary format, defaults to the one of the extension.
+    '''
+    formats.write_summary([(os.path.basename(result['filename']),
+                            result['slope'], result['intercept'])
+                           for result in results], outFileName, fmt)
+
+def run(filenames, engine = 'lsr', outDir = 'output_data', workers = None,
+        cache = False, seed = None, size = None,
+        blockSize = gen_stream.BLOCK_SIZE, fmt = 'csv',
+        generator = 'partition', verbosity = None, logFile = None,
+        fitCache = False, dtype = 'float64'):
+    '''
+    Processes every file, in a pool of worker processes when workers > 1.
+    Args:
+        filenames (arr) : the csv files with the points.
+        engine (str) : the name of the fitting engine (see engines.ENGINES).
+        outDir (str) : the directory the generated points are written to.
+        workers (int) : the number of processes, defaults to the cpu count.
+        cache (bool) : reuses the binary copy of previously parsed files.
+        seed (int) : the seed of the generated points, each file gets its own
+            child stream so results don't depend on the worker count.
+        size (int) : the number of points to generate per file, defaults to
+            as many as each file has.
+        blockSize (int) : the number of points generated and written at a time.
+        fmt (str) : the format of the generated points (see formats.SINKS).
+        generator (str) : the name of the point generator (see generators).
+        verbosity (str) : logs events at this verbosity as json lines (see
+            instrument.configure), None to leave logging as it is.
+        logFile (str) : the file the events go to, None for stderr.
+        fitCache (bool) : reuses cached fits of unchanged files (see
+            fit_cache).
+        dtype (str) : the dtype the points are kept as, float32 for the
+            compact mode (see fit_engine.DTYPES).
+    Returns:
+        results (arr) : the results of process_file, in the order of filenames.
+    '''
+    engines.get_engine(engine)
+    formats.get_format(fmt)
+    generators.get_generator(generator)
+    fit_engine.get_dtype(dtype)
+    os.makedirs(outDir, exist_ok = True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(filenames)))
+
+    if seed is None:
+        seeds = [None]*len(filenames)
+    else:
+        seeds = [seeding.child(seed, i) for i in range(len(filenames))]
+    args = ([engine]*len(filenames), [outDir]*len(filenames),
+            [cache]*len(filenames), seeds, [size]*len(filenames),
+            [blockSize]*len(filenames), [fmt]*len(filenames),
+            [generator]*len(filenames), [fitCache]*len(filenames),
+            [dtype]*len(filenames))
+    if verbosity is not None:
+        instrument.configure(verbosity, logFile)
+    if workers == 1:
+        return list(map(process_file, filenames, *args))
+
+    #hands the files out in batches so hundreds of small files don't each
+    #pay for a round trip to a worker.
+    chunkSize = max(1, len(filenames)//(workers*4))
+    if verbosity is None:
+        pool = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer = instrument.configure,
+            initargs = (verbosity, logFile))
+    with pool:
+        return list(pool.map(process_file, filenames, *args,
+                             chunksize = chunkSize))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument('inputs', nargs = '*', default = ['input_data'],
+                        help = "directories, globs or csv files "
+                               "(default: input_data)")
+    parser.add_argument('-o', '--output', default = 'output.csv',
+                        help = "the summary file, its extension (.csv, .npy "
+                               "or .npz) sets its format (default: output.csv)")
+    parser.add_argument('-d', '--out-dir', default = 'output_data',
+                        help = "where gen_*.csv files are written "
+                               "(default: output_data)")
+    parser.add_argument('-e', '--engine', default = 'lsr',
+                        choices = sorted(engines.ENGINES))
+    parser.add_argument('-j', '--workers', type = int, default = None,
+                        help = "worker processes (default: cpu count)")
+    parser.add_argument('-s', '--seed', type = int, default = None,
+                        help = "seed for reproducible generated points")
+    parser.add_argument('-g', '--generator', default = 'partition',
+                        choices = sorted(generators.GENERATORS))
+    parser.add_argument('-f', '--format', default = 'csv',
+                        choices = sorted(formats.SINKS),
+                        help = "format of the generated points (default: csv)")
+    parser.add_argument('-n', '--size', type = int, default = None,
+                        help = "points to generate per file "
+                               "(default: as many as the input has)")
+    parser.add_argument('--block-size', type = int,
+                        default = gen_stream.BLOCK_SIZE,
+                        help = "points generated and written at a time")
+    parser.add_argument('--cache', action = 'store_true',
+                        help = "cache parsed inputs as memory mapped .npy")
+    parser.add_argument('--fit-cache', action = 'store_true',
+                        help = "reuse the fits of unchanged inputs")
+    parser.add_argument('--dtype', default = 'float64',
+                        choices = sorted(fit_engine.DTYPES),
+                        help = "precision the points are kept in, float32 "
+                               "halves their memory (default: float64)")
+    parser.add_argument('-v', '--verbosity', default = None,
+                        choices = sorted(instrument.VERBOSITY),
+                        help = "log events as json lines at this verbosity")
+    parser.add_argument('--log-file', default = None,
+                        help = "where the log goes (default: stderr)")
+    parser.add_argument('--metrics', default = None,
+                        help = "writes the timings, counters and peak memory "
+                               "of every file to this json file")
+    args = parser.parse_args(argv)
+
+    filenames = find_inputs(args.inputs)
+    if not filenames:
+        parser.error("no csv files found in %s"%", ".join(args.inputs))
+
+    start = time.perf_counter()
+    results = run(filenames, args.engine, args.out_dir, args.workers,
+                  args.cache, args.seed, args.size, args.block_size,
+                  args.format, args.generator, args.verbosity,
+                  args.log_file, args.fit_cache, args.dtype)
+    write_summary(results, args.output)
+    if args.metrics is not None:
+        instrument.write_metrics(args.metrics, {result['filename'] :
+                                                result['metrics']
+                                                for result in results})
+
+    for result in results:
+        timings = result['timings']
+        perPoint = result['bytesPerPoint']
+        print("%s: %d points, %d generated in %.3fs (load %.3fs, fit %.3fs,"
+              " generate %.3fs, write %.3fs, %s bytes/point)"%(
+                  result['filename'], result['points'], result['generated'],
+                  timings['total'], timings['load'], timings['fit'],
+                  timings['generate'], timings['write'],
+                  '-' if perPoint is None else '%.1f'%perPoint))
+    print("Fitted %d files in %.3fs, summary located in %s"
+          %(len(results), time.perf_counter() - start, args.output))
+
+if __name__ == '__main__':
+    main()
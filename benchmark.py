@@ -0,0 +1,297 @@
+'''
+Times every stage of the pipeline (csv load, calculator, find_errors, each
+    generator and write_gen) on synthetic inputs of 1e3 to 1e8 points, and
+    records the seconds, throughput and peak memory of each stage in a json
+    results file that later runs can be compared against as a baseline.
+Author: Edward Zhou
+'''
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import concurrent.futures
+import multiprocessing
+
+import numpy as np
+
+import loader
+import seeding
+import formats
+import instrument
+import calc_lsr
+import fit_engine
+import generators
+
+#inputs and results are kept next to the other caches of the package, not
+#in whatever directory the benchmark is run from.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '.cache', 'bench')
+RESULTS_FILE = os.path.join(DATA_DIR, 'benchmark.json')
+SIZES = (1000, 10000, 100000, 1000000)
+STAGES = ('load', 'fit', 'errors', 'partition', 'gaussian', 'kde',
+          'kde-kernel', 'write')
+#the kde grid is a kernel density sum over every sample point per cell, so
+#it is skipped above this many points unless asked for.
+KDE_LIMIT = 100000
+
+def make_dataset(size, seed = 0, dataDir = DATA_DIR):
+    '''
+    Writes a csv of points around y = 2x + 1 with gaussian noise and a few
+        outliers, reusing the file if it was made before.
+    Args:
+        size (int) : the number of points.
+        seed (int) : the seed of the points.
+        dataDir (str) : the directory the file is written to.
+    Returns:
+        filename (str) : the path of the csv file.
+    '''
+    filename = os.path.join(dataDir, 'bench_%d_%d.csv'%(size, seed))
+    if os.path.isfile(filename):
+        return filename
+    os.makedirs(dataDir, exist_ok = True)
+
+    partName = filename + '.part'
+    sink = formats.open_sink(partName, 'csv', size)
+    try:
+        for i, start in enumerate(range(0, size, seeding.BLOCK_SIZE)):
+            rng = seeding.make_rng(seeding.child(seed, i))
+            blockLen = min(seeding.BLOCK_SIZE, size-start)
+            xs = rng.uniform(0, 100, blockLen)
+            ys = 2*xs + 1 + rng.normal(0, 5, blockLen)
+            outliers = rng.random(blockLen) < 0.01
+            ys[outliers] += rng.normal(0, 100, outliers.sum())
+            sink.write(xs, ys)
+    except BaseException:
+        sink.close(complete = False)
+        raise
+    sink.close()
+    os.replace(partName, filename)
+    return filename
+
+def time_stage(timings, stage, size, function, *args, **kwargs):
+    '''
+    Runs a stage with its output hidden and records its time and memory.
+        The peak is reset before the stage, so it is the stage's own peak
+        rather than the largest of the stages before it.
+    Args:
+        timings (dict) : the stage results, the stage is added to it.
+        stage (str) : the name of the stage.
+        size (int) : the number of points the stage handles.
+        function (function) : the stage.
+    Returns:
+        result : what the stage returned.
+    '''
+    instrument.reset_peak_rss()
+    baseline = instrument.current_rss()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    peak = instrument.peak_rss()
+    timings[stage] = {'seconds' : seconds,
+                      'throughput' : size/seconds if seconds else None,
+                      'peakRss' : peak,
+                      'bytesPerPoint' : instrument.bytes_per_point(
+                          peak, size, baseline)}
+    return result
+
+def run_size(filename, size, stages = STAGES, outDir = DATA_DIR, seed = 0,
+             kdeLimit = KDE_LIMIT, dtype = 'float64'):
+    '''
+    Times the stages on one input file. Stages after the fit need the
+        loaded points and the line, so load and fit always run.
+    Args:
+        filename (str) : the csv file with the points.
+        size (int) : the number of points in the file.
+        stages (arr) : the names of the stages timed (see STAGES).
+        outDir (str) : the directory write_gen writes to.
+        seed (int) : the seed of the generated points.
+        kdeLimit (int) : the largest input the kde grid generator is run on.
+        dtype (str) : the dtype the points are loaded as (see
+            fit_engine.DTYPES).
+    Returns:
+        timings (dict) : seconds, throughput (points/s), peakRss (bytes,
+            the peak of the process during the stage) and bytesPerPoint
+            (that peak over the memory before the stage, per point) per
+            stage, or the reason it was skipped.
+    '''
+    timings = {}
+    xs, ys = time_stage(timings, 'load', size, loader.load_points, filename,
+                        dtype = dtype)
+    slope, intercept = time_stage(timings, 'fit', size, calc_lsr.calculator,
+                                  xs, ys, xs.mean(dtype = np.float64),
+                                  ys.mean(dtype = np.float64))[2:]
+    errors, sd = time_stage(timings, 'errors', size, calc_lsr.find_errors,
+                            xs, ys, slope, intercept)
+    fit = fit_engine.FitResult(xs, ys, slope, intercept, errors, sd)
+
+    genx = geny = None
+    for name in generators.GENERATORS:
+        if name not in stages:
+            continue
+        if name == 'kde' and size > kdeLimit:
+            timings[name] = {'skipped' : "more than %d points"%kdeLimit}
+            continue
+        try:
+            points = time_stage(timings, name, size, generators.generate,
+                                name, fit, size, seed)
+        except ImportError as error:
+            timings[name] = {'skipped' : str(error)}
+            continue
+        if genx is None:
+            genx, geny = points
+
+    if 'write' in stages:
+        if genx is None:
+            genx, geny = generators.generate('partition', fit, size, seed)
+        outFileName = time_stage(timings, 'write', size, calc_lsr.write_gen,
+                                 filename, genx, geny, outDir)
+        os.remove(outFileName)
+
+    return {stage : timings[stage] for stage in timings
+            if stage in stages}
+
+def run(sizes = SIZES, stages = STAGES, repeat = 1, seed = 0,
+        dataDir = DATA_DIR, kdeLimit = KDE_LIMIT, dtype = 'float64'):
+    '''
+    Times the stages at every size. Every run is in a fresh process, so the
+        peak memory of a size is not hidden by a larger one before it.
+    Args:
+        sizes (arr) : the numbers of points.
+        stages (arr) : the names of the stages timed (see STAGES).
+        repeat (int) : the runs per size, the fastest of which is kept.
+        seed (int) : the seed of the inputs and generated points.
+        dataDir (str) : where the inputs are kept between runs.
+        kdeLimit (int) : the largest input the kde grid generator is run on.
+        dtype (str) : the dtype the points are loaded as (see
+            fit_engine.DTYPES).
+    Returns:
+        results (dict) : the environment and the timings of every size.
+    '''
+    results = {'python' : platform.python_version(),
+               'numpy' : np.__version__,
+               'platform' : platform.platform(),
+               'repeat' : repeat,
+               'dtype' : dtype,
+               'sizes' : {}}
+    context = multiprocessing.get_context('spawn')
+    for size in sizes:
+        filename = make_dataset(size, seed, dataDir)
+        best = {}
+        for i in range(repeat):
+            with concurrent.futures.ProcessPoolExecutor(
+                    1, mp_context = context) as pool:
+                timings = pool.submit(run_size, filename, size, stages,
+                                      dataDir, seed, kdeLimit,
+                                      dtype).result()
+            for stage, timing in timings.items():
+                if (stage not in best or 'skipped' in best[stage] or
+                        timing.get('seconds', np.inf) <
+                        best[stage]['seconds']):
+                    best[stage] = timing
+        results['sizes'][str(size)] = best
+    return results
+
+def compare(results, baseline, tolerance = 0.25, minSeconds = 0.01):
+    '''
+    Finds the stages that got slower than in a baseline.
+    Args:
+        results (dict) : results of run.
+        baseline (dict) : earlier results of run.
+        tolerance (float) : how much slower a stage can be before it counts
+            as a regression (0.25 is 25% slower).
+        minSeconds (float) : slowdowns smaller than this are timer noise and
+            never count.
+    Returns:
+        regressions (arr) : (size, stage, baseline seconds, seconds) tuples.
+    '''
+    regressions = []
+    for size, timings in results['sizes'].items():
+        baseTimings = baseline.get('sizes', {}).get(size, {})
+        for stage, timing in timings.items():
+            base = baseTimings.get(stage, {})
+            if 'seconds' not in timing or 'seconds' not in base:
+                continue
+            if (timing['seconds'] > base['seconds']*(1 + tolerance) and
+                    timing['seconds'] - base['seconds'] > minSeconds):
+                regressions.append((int(size), stage, base['seconds'],
+                                    timing['seconds']))
+    return regressions
+
+def print_results(results):
+    '''
+    Prints the results of run as a table.
+    Args:
+        results (dict) : results of run.
+    '''
+    print("%-10s %-11s %10s %14s %10s %10s"%("points", "stage", "seconds",
+                                             "points/s", "peak MB",
+                                             "B/point"))
+    for size, timings in results['sizes'].items():
+        for stage, timing in timings.items():
+            if 'skipped' in timing:
+                print("%-10s %-11s skipped (%s)"%(size, stage,
+                                                  timing['skipped']))
+                continue
+            peak = timing['peakRss']
+            perPoint = timing.get('bytesPerPoint')
+            print("%-10s %-11s %10.4f %14.0f %10s %10s"%(
+                size, stage, timing['seconds'], timing['throughput'] or 0,
+                '-' if peak is None else '%.1f'%(peak/2**20),
+                '-' if perPoint is None else '%.1f'%perPoint))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument('-n', '--sizes', type = float, nargs = '+',
+                        default = SIZES,
+                        help = "numbers of points, e.g. 1e3 1e8 "
+                               "(default: 1e3 to 1e6)")
+    parser.add_argument('--stages', nargs = '+', default = STAGES,
+                        choices = STAGES)
+    parser.add_argument('-r', '--repeat', type = int, default = 1,
+                        help = "runs per size, the fastest is kept")
+    parser.add_argument('-s', '--seed', type = int, default = 0)
+    parser.add_argument('-o', '--output', default = RESULTS_FILE,
+                        help = "the results file (default: %s)"%RESULTS_FILE)
+    parser.add_argument('-b', '--baseline', default = None,
+                        help = "results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type = float, default = 0.25,
+                        help = "slowdown counted as a regression "
+                               "(default: 0.25)")
+    parser.add_argument('--data-dir', default = DATA_DIR,
+                        help = "where the inputs are kept (default: %s)"
+                               %DATA_DIR)
+    parser.add_argument('--kde-limit', type = float, default = KDE_LIMIT,
+                        help = "largest input the kde grid is run on")
+    parser.add_argument('--dtype', default = 'float64',
+                        choices = sorted(fit_engine.DTYPES),
+                        help = "precision the points are loaded in "
+                               "(default: float64)")
+    args = parser.parse_args(argv)
+
+    results = run([int(size) for size in args.sizes], args.stages,
+                  args.repeat, args.seed, args.data_dir, int(args.kde_limit),
+                  args.dtype)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok = True)
+    with open(args.output, 'w') as resultsOut:
+        json.dump(results, resultsOut, indent = 2)
+    print_results(results)
+    print("Results located in %s"%args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baselineIn:
+            baseline = json.load(baselineIn)
+        regressions = compare(results, baseline, args.tolerance)
+        for size, stage, before, after in regressions:
+            print("Regression: %s at %d points took %.4fs (baseline %.4fs)"
+                  %(stage, size, after, before))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
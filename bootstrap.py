@@ -0,0 +1,251 @@
+'''
+Estimates the uncertainty of the line of best fit by bootstrapping: the
+    points are resampled many times and every resample is refitted, with all
+    the refits of a chunk of resamples done as one matrix product instead of
+    a Python loop of calculator calls. Gives percentile intervals for the
+    slope and intercept.
+Author: Edward Zhou
+'''
+
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+import loader
+import seeding
+import fit_engine
+import gen_partition
+
+MODES = ('pairs', 'residuals')
+#resamples per seed block, so the resamples only depend on the seed and not
+#on the chunking or worker count.
+BLOCK_REPLICATES = 64
+#the approximate memory used by the resample matrices of a chunk.
+CHUNK_BYTES = 1 << 26
+#bytes of index and value matrices per resampled point.
+BYTES_PER_POINT = 32
+
+class BootstrapResult:
+    '''
+    The fitted line with the fits of its resamples and their intervals.
+    Attributes:
+        slope (float) : the slope fitted to the points.
+        intercept (float) : the intercept fitted to the points.
+        slopes (np.array) : the slope fitted to every resample.
+        intercepts (np.array) : the intercept fitted to every resample.
+        level (float) : the confidence level of the intervals.
+        slopeInterval (tuple) : the (low, high) percentile interval of the
+            slope.
+        interceptInterval (tuple) : the (low, high) percentile interval of
+            the intercept.
+        mode (str) : how the points were resampled (one of MODES).
+    '''
+
+    def __init__(self, slope, intercept, slopes, intercepts, level, mode):
+        self.slope = slope
+        self.intercept = intercept
+        self.slopes = slopes
+        self.intercepts = intercepts
+        self.level = level
+        self.slopeInterval = percentile_interval(slopes, level)
+        self.interceptInterval = percentile_interval(intercepts, level)
+        self.mode = mode
+
+    def __repr__(self):
+        return ("BootstrapResult(slope=%g [%g, %g], intercept=%g [%g, %g], "
+                "level=%g, replicates=%d)"%(self.slope, *self.slopeInterval,
+                                            self.intercept,
+                                            *self.interceptInterval,
+                                            self.level, self.slopes.size))
+
+def percentile_interval(values, level = 0.95):
+    '''
+    Gets the central interval holding a share of the values.
+    Args:
+        values (np.array) : the bootstrapped values, nan ones are left out.
+        level (float) : the share of values inside the interval.
+    Returns:
+        low (float) : the (1-level)/2 quantile.
+        high (float) : the (1+level)/2 quantile.
+    '''
+    low, high = np.nanquantile(values, [(1-level)/2, (1+level)/2])
+    return float(low), float(high)
+
+def pair_fits(table, xMean, yMean, count, rng):
+    '''
+    Refits resamples of the points drawn with replacement.
+    Args:
+        table (np.array) : (n, 4) centred x, y, x*x and x*y of the points.
+        xMean (float) : the mean of the x values.
+        yMean (float) : the mean of the y values.
+        count (int) : the number of resamples.
+        rng (np.random.Generator) : the generator of the resamples.
+    Returns:
+        slopes (np.array) : the slope of every resample.
+        intercepts (np.array) : the intercept of every resample.
+    '''
+    n = table.shape[0]
+    index = rng.integers(0, n, (count, n), dtype = np.int64)
+    #how often each point is drawn in each resample, as one bincount.
+    index += (np.arange(count)*n)[:, None]
+    draws = np.bincount(index.ravel(), minlength = count*n)
+    sums = draws.reshape(count, n).astype(np.float64) @ table
+
+    xShift = sums[:, 0]/n
+    yShift = sums[:, 1]/n
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        slopes = ((sums[:, 3] - n*xShift*yShift)/
+                  (sums[:, 2] - n*xShift*xShift))
+    return slopes, (yMean + yShift) - slopes*(xMean + xShift)
+
+def residual_fits(xDiff, sortedError, lows, widths, slope, intercept, xMean,
+                  xSqDiff, count, rng):
+    '''
+    Refits the line plus residuals resampled from the points with nearby x
+        values, the buckets gen_partition draws its errors from, so a spread
+        that changes with x is kept.
+    Args:
+        xDiff (np.array) : the centred x values in increasing order.
+        sortedError (np.array) : the residual of each sorted point.
+        lows (np.array) : the first index of the bucket of each point.
+        widths (np.array) : the number of points in the bucket of each point.
+        slope (float) : the slope fitted to the points.
+        intercept (float) : the intercept fitted to the points.
+        xMean (float) : the mean of the x values.
+        xSqDiff (float) : the sum of squared centred x values.
+        count (int) : the number of resamples.
+        rng (np.random.Generator) : the generator of the resamples.
+    Returns:
+        slopes (np.array) : the slope of every resample.
+        intercepts (np.array) : the intercept of every resample.
+    '''
+    n = xDiff.size
+    draws = rng.random((count, n))
+    draws *= widths
+    index = draws.astype(np.int64)
+    index += lows
+    errors = sortedError[index]
+    #refitting y = line + errors only moves the line by the fit of the errors.
+    slopes = slope + (errors @ xDiff)/xSqDiff
+    return slopes, intercept + errors.mean(axis = 1) - (slopes - slope)*xMean
+
+def run_blocks(xs, ys, mode, seed, blocks, replicates,
+               chunkBytes = CHUNK_BYTES):
+    '''
+    Fits the resamples of a range of seed blocks.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        mode (str) : how the points are resampled (one of MODES).
+        seed (SeedSequence) : the root seed, block i uses its i-th child.
+        blocks (range) : the blocks fitted.
+        replicates (int) : the total number of resamples, which the last
+            block is cut to.
+        chunkBytes (int) : the approximate memory of a chunk of resamples.
+    Returns:
+        slopes (np.array) : the slope of every resample of the blocks.
+        intercepts (np.array) : the intercept of every resample.
+    '''
+    n = xs.size
+    xMean = xs.mean()
+    yMean = ys.mean()
+    if mode == 'pairs':
+        xDiff = xs - xMean
+        yDiff = ys - yMean
+        table = np.column_stack((xDiff, yDiff, xDiff*xDiff, xDiff*yDiff))
+    else:
+        slope, intercept = fit_engine.moments_fit(fit_engine.moments(xs, ys))
+        errors = ys - (slope*xs + intercept)
+        sortedX, sortedError = gen_partition.build_table(xs, errors)
+        bounds, bucketLows, bucketHighs = gen_partition.partitions(sortedX)
+        bucket = np.minimum(np.searchsorted(bucketHighs, np.arange(n)), 9)
+        lows = bucketLows[bucket]
+        widths = (bucketHighs - bucketLows + 1)[bucket].astype(np.float64)
+        xDiff = sortedX - xMean
+        xSqDiff = float(np.dot(xDiff, xDiff))
+
+    chunk = max(1, chunkBytes//(BYTES_PER_POINT*n))
+    slopes = []
+    intercepts = []
+    for block in blocks:
+        rng = seeding.make_rng(seeding.child(seed, block))
+        blockLen = min(BLOCK_REPLICATES,
+                       replicates - block*BLOCK_REPLICATES)
+        for start in range(0, blockLen, chunk):
+            count = min(chunk, blockLen - start)
+            if mode == 'pairs':
+                fits = pair_fits(table, xMean, yMean, count, rng)
+            else:
+                fits = residual_fits(xDiff, sortedError, lows, widths, slope,
+                                     intercept, xMean, xSqDiff, count, rng)
+            slopes.append(fits[0])
+            intercepts.append(fits[1])
+    if not slopes:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(slopes), np.concatenate(intercepts)
+
+def bootstrap(xs, ys, replicates = 1000, level = 0.95, mode = 'pairs',
+              seed = None, workers = 1, chunkBytes = CHUNK_BYTES):
+    '''
+    Bootstraps the least squares line of a set of points.
+    Args:
+        xs (arr) : an array of x values.
+        ys (arr) : an array of y values.
+        replicates (int) : the number of resamples.
+        level (float) : the confidence level of the intervals.
+        mode (str) : 'pairs' resamples the points with replacement,
+            'residuals' keeps the x values and resamples the residuals
+            within the x buckets of gen_partition.
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+            The resamples are the same whatever the workers and chunkBytes
+            (their fits may differ in the last bit between chunkBytes).
+        workers (int) : the number of processes the resamples are split over.
+        chunkBytes (int) : the approximate memory of a chunk of resamples
+            (per worker), which bounds memory whatever the replicates.
+    Returns:
+        result (BootstrapResult) : the fit, its resamples and intervals.
+    '''
+    if mode not in MODES:
+        raise ValueError("unknown mode %r, expected one of: %s"
+                         %(mode, ", ".join(MODES)))
+    xs, ys = fit_engine.as_points(xs, ys)
+    slope, intercept = fit_engine.moments_fit(fit_engine.moments(xs, ys))
+    seed = seeding.seed_sequence(seed)
+
+    blockCount = -(-replicates//BLOCK_REPLICATES)
+    workers = max(1, min(workers, blockCount))
+    ranges = [range(blockCount*i//workers, blockCount*(i+1)//workers)
+              for i in range(workers)]
+    args = ([xs]*workers, [ys]*workers, [mode]*workers, [seed]*workers,
+            ranges, [replicates]*workers, [chunkBytes]*workers)
+    if workers == 1:
+        parts = list(map(run_blocks, *args))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(run_blocks, *args))
+
+    slopes = np.concatenate([part[0] for part in parts])
+    intercepts = np.concatenate([part[1] for part in parts])
+    return BootstrapResult(slope, intercept, slopes, intercepts, level, mode)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument('filename', help = "the csv file with the points")
+    parser.add_argument('-B', '--replicates', type = int, default = 1000)
+    parser.add_argument('-l', '--level', type = float, default = 0.95)
+    parser.add_argument('-m', '--mode', default = 'pairs', choices = MODES)
+    parser.add_argument('-s', '--seed', type = int, default = None)
+    parser.add_argument('-j', '--workers', type = int, default = 1)
+    args = parser.parse_args(argv)
+
+    xs, ys = loader.load_points(args.filename)
+    result = bootstrap(xs, ys, args.replicates, args.level, args.mode,
+                       args.seed, args.workers)
+    print("Slope: %.5f (%g%% interval %.5f to %.5f)"
+          %(result.slope, 100*args.level, *result.slopeInterval))
+    print("Intercept: %.5f (%g%% interval %.5f to %.5f)"
+          %(result.intercept, 100*args.level, *result.interceptInterval))
+
+if __name__ == '__main__':
+    main()
@@ -4,148 +4,170 @@ Calculates the line of best fit for a set of points in a csv using
 Author: Edward Zhou
 '''
 
-import csv
+import os
 import time
-import random
 
-import gen_partition as gen
-#import gen_distribution as gen
-#import gen_kdf as gen
+import numpy as np
 
-def get_file():
+import loader
+import fit_engine
+import instrument
+import residuals
+from fit_state import FitState
+import formats
+import gen_stream
+import generators
+
+def get_file(generator = 'partition'):
     '''
     Gets the input file name and feeds the file to other functions.
+    Args:
+        generator (str) : the name of the point generator
+            ('partition', 'gaussian', 'kde' or 'kde-kernel').
     '''
     validFile = False
     while not validFile:
         filename = input("Enter the name of the file with points: ")
-        try:
-            if not ".csv" in filename:
-                filename += ".csv"
-            file = open(filename)
-            file = csv.reader(file, delimiter = ",")
+        if not ".csv" in filename:
+            filename += ".csv"
+        if os.path.isfile(filename):
             validFile = True
-        except:
+        else:
             print("Could not find file in directory.")
             print("Please enter a valid filename.")
 
-    xs, ys, slope, intercept = get_points(file)
+    xs, ys, slope, intercept = get_points(filename)
 
     #prints the SSError of all the points for the final model
-    print("\nTotal Squared Loss:")
-    errors, sd = find_errors(xs, ys, slope, intercept)
-
-    #uncomment to use resampling to generate points
-    genx, geny = gen.generator(xs, slope, intercept, errors, len(xs))
-
-    #uncomment to use a distribution to generate points
-    #genx, geny  = gen.generator(xs, slope, intercept, errors, sd, len(xs))
+    keepErrors = generators.uses_errors(generator)
+    errors, sd = find_errors(xs, ys, slope, intercept, keepErrors)
+    print("\nTotal Squared Loss:\n%f"%(sd*sd*len(xs)))
 
-    #uncomment to use kernel desnity to generate points
-    #genx, geny = gen.generator(xs, ys, len(xs))
+    #generates points with the generator named by "generator" (see generators).
+    fit = fit_engine.FitResult(xs, ys, slope, intercept, errors, sd,
+                               keepErrors = keepErrors)
+    genx, geny = generators.generate(generator, fit, len(xs))
 
     print("\nSlope: %.5f\nIntercept: %.5f"%(slope, intercept))
-    write_gen(filename, genx, geny)
+    print("Generated points located in %s"%write_gen(filename, genx, geny))
     time.sleep(5)
 
-def get_points(file):
+def get_points(filename, cache = False):
     '''
     Reads the input file of points, and outputs an estimation using the
         least squares model for m and x in the linear model mx+b with
         it's losses.
     Args:
-        file (file) : a file that contains the lines with points.
+        filename (str) : the csv file with the points.
+        cache (bool) : reuses the binary copy of previously parsed files.
     Returns:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
         slope (float) : the updated slope of the model (a in y = ax+b).
         intercept (float) : the updated intercept of the model (b in y = ax+b).
     '''
-    seen = slope = intercept = 0
-
-    xs = []
-    ys = []
-    xTot = yTot = 0
-    for line in file:
-        #checks if the first character in a line is a number (i.e. a point)
-        if line[0][0] in "-0123456789":
-            x = float(line[0])
-            y = float(line[1])
-            xs.append(x)
-            ys.append(y)
-            xTot += x
-            yTot += y
-
-    return calculator(xs, ys, xTot/len(xs), yTot/len(ys))
-    
-
-def calculator(xs, ys, xMean, yMean):
+    xs, ys = loader.load_points(filename, cache = cache)
+
+    return calculator(xs, ys, xs.mean(), ys.mean())
+
+def stream_points(filename, chunkBytes = loader.CHUNK_BYTES):
     '''
-    Calculates the slope and intercept updated with each given point.
+    Reads the input file of points in blocks and reduces them to the
+        sufficient statistics of the least squares model, using constant
+        memory whatever the size of the file.
     Args:
-        xs (arr) : an array of x values stored as floats.
-        ys (arr) : an array of y values stored as floats.
+        filename (str) : the csv file with the points.
+        chunkBytes (int) : the approximate size of text read per block.
+    Returns:
+        state (FitState) : the statistics of every point in the file.
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    state = FitState()
+    for xs, ys in loader.iter_chunks(filename, chunkBytes):
+        state.update(xs, ys)
+    slope, intercept = state.fit()
+    return state, slope, intercept
+
+def calculator(xs, ys, xMean, yMean, trace = None, stable = False):
+    '''
+    Calculates the slope and intercept of the line of best fit.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
         xMean (float) : the mean of all x values.
         yMean (float) : the mean of all y valeus.
+        trace (bool) : logs the loss of every 10th point as the fit is
+            built up point by point, by default only when the log verbosity
+            is trace (see instrument).
+        stable (bool) : uses the chunked moment merge instead of the
+            centred sums, for very large or badly centred data. float32
+            points always use it, so their sums are taken in float64.
     Returns:
-        xs (arr) : an array of x values stored as floats.
-        ys (arr) : an array of y values stored as floats.
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
         slope (float) : the slope of the model (a in y = ax+b).
         intercept (float) : the intercept of the model (b in y = ax+b).
     '''
-    xyDiff = xSqDiff = slope = intercept = 0
-
-    print("Printing the loss of every 10th point")
-    for i in range(len(xs)):
-        oldSlope, oldInt = slope, intercept
-        xyDiff += (xs[i] - xMean)*(ys[i] - yMean)
-        xSqDiff += (xs[i] - xMean)**2
-        slope = xyDiff/xSqDiff
-        intercept = yMean - xMean*slope
-
-        #loss function
-        if i%10 == 0:
-            print("Loss (Residual) of observed - " +\
-                  "predicted: %f"%(ys[i]-(slope*xs[i]+intercept)))
-            print("Slope loss: %f"%(oldSlope - slope))
-            print("Intercept loss: %f"%(oldInt - intercept))
+    stable = stable or xs.dtype != np.float64
+    with instrument.span('calculator', points = xs.size, stable = stable):
+        if stable:
+            slope, intercept = fit_engine.stable_fit(xs, ys)
+        else:
+            xDiff = xs - xMean
+            slope = float(np.dot(xDiff, ys - yMean)/np.dot(xDiff, xDiff))
+            intercept = float(yMean - xMean*slope)
+
+    if trace is None:
+        trace = instrument.enabled(instrument.TRACE)
+    if trace:
+        #the loss of every 10th point.
+        pointErrors, slopeLoss, intLoss = fit_engine.loss_trace(xs, ys,
+                                                                xMean, yMean)
+        for i in range(0, xs.size, 10):
+            instrument.log('fit.trace', instrument.TRACE, point = i,
+                           residual = float(pointErrors[i]),
+                           slopeLoss = float(slopeLoss[i]),
+                           interceptLoss = float(intLoss[i]))
 
     return xs, ys, slope, intercept
 
-def find_errors(xs, ys, slope, intercept):
+def find_errors(xs, ys, slope, intercept, keep = True):
     '''
-    Prints the sum of errors squared for all x,y pairs given a slope and intercept.
+    Logs the sum of errors squared for all x,y pairs given a slope and intercept.
     Args:
-        xs (arr) : an array of x values stored as floats.
-        ys (arr) : an array of y values stored as floats.
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
         slope (float) : the slope of the current model (a in y = ax+b).
         intercept (float) : the y-intercept of the current model (b in y = ax+b).
+        keep (bool) : returns the residuals, False to only calculate the loss
+            and sd without storing them (see residuals.residual_stats).
     Returns:
-        errors (arr) : an array the residuals from the line of best fit.
+        errors (np.array) : an array the residuals from the line of best fit,
+            None if keep is False.
         sd (float) : the average standard deviation from the line of best fit.
     '''
-    loss = tot = 0
-    errors = []
-    for i in range(len(xs)):
-        residual = (ys[i] - (slope*xs[i]+intercept))
-        loss += residual**2
-        errors.append(residual)
-    print(loss)
-    return errors, (loss/len(xs))**0.5
-
-def write_gen(filename, xs, ys):
+    errors, stats = residuals.residual_stats(xs, ys, slope, intercept, keep)
+    instrument.log('fit.loss', sse = stats.sse, rmse = stats.rmse,
+                   minError = stats.minError, maxError = stats.maxError)
+    return errors, stats.rmse
+
+def write_gen(filename, xs, ys, outDir = None, fmt = 'csv'):
     '''
-    Writes out the generated points in a csv file.
+    Writes out the generated points in a csv (or binary) file.
     Args:
         filename (str) : the name of the input file.
         xs (arr) : an array of generated x values.
         ys (arr) : an array of generated y values.
+        outDir (str) : the directory to write to, defaults to the current one.
+        fmt (str) : the output format, one of 'csv', 'npy' or 'npz'.
+    Returns:
+        outFileName (str) : the path of the written file.
     '''
-    outFileName = 'gen_'+filename
-    with open(outFileName, 'w', newline = '') as pointsOut:
-        slopeWrite = csv.writer(pointsOut)
-        slopeWrite.writerow(['x', 'y'])
-        for i in range(len(xs)):
-            slopeWrite.writerow(['%f'%xs[i], '%f'%ys[i]])
-    print("Generated points located in %s"%outFileName)
+    outFileName = formats.output_name(filename, fmt, outDir)
+    gen_stream.write_blocks(outFileName, [(xs, ys)], fmt = fmt, size = len(xs))
+    instrument.log('write', output = outFileName, points = len(xs))
+    return outFileName
 
 if __name__ == '__main__':
     get_file()
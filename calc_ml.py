@@ -1,144 +1,556 @@
 '''
 Calculates the line of best fit for a set of points in a csv using
-    machine learning (1 layer).
+    machine learning (1 layer). The model is trained with numpy by default,
+    tensorflow is only imported when the 'tensorflow' backend is asked for.
 Author: Edward Zhou
 '''
 
 from __future__ import absolute_import, division, print_function, unicode_literals
-import csv
+import os
 import numpy as np
-import tensorflow as tf
 import time
+import queue
+import threading
 
-import keras
-from keras.models import Sequential
-from keras.optimizers import Adam
-from keras.layers import Dense
+import loader
+import seeding
+import fit_engine
+import instrument
+import residuals
+import formats
+import gen_stream
+import generators
 
-import gen_partition as gen
-#import gen_distribution as gen
-#import gen_kdf as gen
-
-def get_file():
+def get_file(generator = 'partition'):
     '''
     Gets the input file name and feeds the file to other functions.
+    Args:
+        generator (str) : the name of the point generator
+            ('partition', 'gaussian', 'kde' or 'kde-kernel').
     '''
     validFile = False
     while not validFile:
         filename = input("Enter the name of the file with points: ")
-        try:
-            if not ".csv" in filename:
-                filename += ".csv"
-            file = open(filename)
-            file = csv.reader(file, delimiter = ",")
-            validFile = True 
-        except FileNotFoundError:
+        if not ".csv" in filename:
+            filename += ".csv"
+        if os.path.isfile(filename):
+            validFile = True
+        else:
             print("Could not find file in directory.")
             print("Please enter a valid filename.")
 
-    xs, ys, slope, intercept, errors, sd = get_points(file)
-
-    #uncomment to use resampling to generate points
-    genx, geny = gen.generator(xs, slope, intercept, errors, len(xs))
+    keepErrors = generators.uses_errors(generator)
+    xs, ys, slope, intercept, errors, sd = get_points(
+        filename, keepErrors = keepErrors)
 
-    #uncomment to use a distribution to generate points
-    #genx, geny  = gen.generator(xs, slope, intercept, errors, sd, len(xs))
+    #prints the SSError of all the points for the final model
+    print("\nTotal Squared Loss:\n%f"%(sd*sd*len(xs)))
 
-    #uncomment to use kernel desnity to generate points
-    #genx, geny = gen.generator(xs, ys, len(xs))
+    #generates points with the generator named by "generator" (see generators).
+    fit = fit_engine.FitResult(xs, ys, slope, intercept, errors, sd,
+                               keepErrors = keepErrors)
+    genx, geny = generators.generate(generator, fit, len(xs))
 
     print("\nSlope: %.5f\nIntercept: %.5f"%(slope, intercept))
-    write_gen(filename, genx, geny)
+    print("Generated points located in %s"%write_gen(filename, genx, geny))
     time.sleep(5)
 
-def get_points(file):
+def get_points(filename, cache = False, backend = 'gd', keepErrors = True):
     '''
     Reads the input file of points, and outputs an estimation using
         machine learning.
     Args:
-        file (file) : a file that contains the lines with points.
+        filename (str) : the csv file with the points.
+        cache (bool) : reuses the binary copy of previously parsed files.
+        backend (str) : how the model is trained (see make_train_model).
+        keepErrors (bool) : returns the residuals, False when only the sd
+            is needed.
     Returns:
         xs (arr) : an array of x values stored as floats.
         ys (arr) : an array of y values stored as floats.
         slope (float) : the updated slope of the model (a in y = ax+b).
         intercept (float) : the updated intercept of the model (b in y = ax+b).
     '''
-    xs = []
-    ys = []
-    for line in enumerate(file):
-        if line[1][0][0] in "-0123456789":
-            xs.append(float(line[1][0]))
-            ys.append(float(line[1][1]))
+    xs, ys = loader.load_points(filename, cache = cache)
 
-    xs = np.array(xs,  dtype = float)
-    ys = np.array(ys,  dtype = float)
+    slope, intercept = make_train_model(xs, ys, backend)
+    errors, sd = find_errors(xs, ys, slope, intercept, keepErrors)
 
-    slope, intercept = make_train_model(xs, ys)
+    return xs, ys, slope, intercept, errors, sd
 
-    #prints the SSError of all the points for the final model
-    print("\nTotal Squared Loss:")
-    errors, sd = find_errors(xs, ys, slope, intercept)
+#the fewest steps per epoch when an epoch is one pass, so small inputs are
+#not stopped after a handful of steps.
+MIN_STEPS = 200
 
-    return xs, ys, slope, intercept, errors, sd
+class TrainConfig:
+    '''
+    The settings used to train the model. Training usually converges well
+        within the first pass over the points, so the loss is checked every
+        checkEvery steps and training stops once it has plateaued.
+    Attributes:
+        epochs (int) : the maximum number of epochs.
+        learningRate (float) : the Adam learning rate.
+        batchSize (int) : the number of points per step.
+        stepsPerEpoch (int) : the number of steps per epoch, None for one
+            pass over the points.
+        shuffle (bool) : reshuffles the points before every pass over them.
+        prefetch (int) : the number of shuffled passes prepared ahead on a
+            background thread, 0 to prepare them in line.
+        patience (int) : stops after this many checks without the loss
+            improving by more than minDelta, None to always run every epoch.
+        minDelta (float) : the relative improvement of the loss that counts
+            as progress.
+        checkEvery (int) : the number of steps between plateau checks, None
+            to check once per epoch.
+        decay (float) : the factor the learning rate is cut by on a plateau.
+        decays (int) : the number of times the learning rate is cut before a
+            plateau stops training. A constant rate leaves the coefficients
+            jittering by about the rate around the minimum, so the rate is
+            cut to settle them.
+        seed (int/SeedSequence/Generator) : the seed of the shuffling.
+    '''
+
+    def __init__(self, epochs = 10, learningRate = 0.1, batchSize = 1024,
+                 stepsPerEpoch = None, shuffle = True, prefetch = 1,
+                 patience = 10, minDelta = 1e-5, checkEvery = 50,
+                 decay = 0.1, decays = 2, seed = None):
+        self.epochs = epochs
+        self.learningRate = learningRate
+        self.batchSize = batchSize
+        self.stepsPerEpoch = stepsPerEpoch
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.patience = patience
+        self.minDelta = minDelta
+        self.checkEvery = checkEvery
+        self.decay = decay
+        self.decays = decays
+        self.seed = seed
+
+    def steps(self, size):
+        '''
+        Gets the number of steps per epoch.
+        Args:
+            size (int) : the number of points.
+        Returns:
+            steps (int) : the steps per epoch.
+        '''
+        if self.stepsPerEpoch is None:
+            return max(MIN_STEPS, -(-size//self.batchSize))
+        return self.stepsPerEpoch
+
+    def check_steps(self, size):
+        '''
+        Gets the number of steps between plateau checks.
+        Args:
+            size (int) : the number of points.
+        Returns:
+            steps (int) : the steps between checks.
+        '''
+        if self.checkEvery is None:
+            return self.steps(size)
+        return max(1, self.checkEvery)
+
+class TrainResult:
+    '''
+    The trained model and how long it took to get there.
+    Attributes:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+        losses (arr) : the mean batch loss between every plateau check.
+        checks (int) : the number of checks run.
+        bestCheck (int) : the check with the lowest loss (1 based).
+        steps (int) : the number of steps run.
+        seconds (float) : the total training time.
+        secondsToConverge (float) : the time until the end of bestCheck.
+        stoppedEarly (bool) : True if training stopped on a loss plateau.
+    '''
+
+    def __init__(self, slope, intercept, losses, bestCheck, steps, seconds,
+                 secondsToConverge, stoppedEarly):
+        self.slope = slope
+        self.intercept = intercept
+        self.losses = losses
+        self.checks = len(losses)
+        self.bestCheck = bestCheck
+        self.steps = steps
+        self.seconds = seconds
+        self.secondsToConverge = secondsToConverge
+        self.stoppedEarly = stoppedEarly
+
+    def __repr__(self):
+        return ("TrainResult(slope=%g, intercept=%g, steps=%d, checks=%d, "
+                "bestCheck=%d, seconds=%.3f, secondsToConverge=%.3f)"
+                %(self.slope, self.intercept, self.steps, self.checks,
+                  self.bestCheck, self.seconds, self.secondsToConverge))
+
+class EarlyStopping:
+    '''
+    Tracks the loss at every check and decides when it has plateaued. The
+        first config.decays plateaus cut the learning rate (rate) instead of
+        stopping.
+    '''
 
-def make_train_model(xs, ys):
+    def __init__(self, config):
+        self.patience = config.patience
+        self.minDelta = config.minDelta
+        self.decay = config.decay
+        self.decays = config.decays
+        self.rate = config.learningRate
+        self.losses = []
+        self.best = np.inf
+        self.bestCheck = 0
+        self.bestTime = 0.0
+        self.waited = 0
+
+    def update(self, loss, elapsed):
+        '''
+        Records the loss since the last check.
+        Args:
+            loss (float) : the mean batch loss since the last check.
+            elapsed (float) : the training time so far.
+        Returns:
+            stop (bool) : True if training should stop.
+        '''
+        self.losses.append(loss)
+        self.waited += 1
+        if (len(self.losses) == 1 or
+                loss < self.best - self.minDelta*abs(self.best)):
+            self.best = loss
+            self.bestCheck = len(self.losses)
+            self.bestTime = elapsed
+            self.waited = 0
+        if self.patience is None or self.waited < self.patience:
+            return False
+        if self.decays > 0:
+            self.decays -= 1
+            self.rate *= self.decay
+            self.waited = 0
+            return False
+        return True
+
+def make_train_model(xs, ys, backend = 'gd', config = None, **kwargs):
     '''
     Trains the model using the given x and y values.
     Args:
         xs (arr) : an array of x values stored as floats.
         ys (arr) : an array of y values stored as floats.
+        backend (str) : 'gd' for gradient descent in numpy, 'normal' for the
+            normal equations (exact, no training) or 'tensorflow' for a keras
+            Dense(1) layer.
+        config (TrainConfig) : the training settings, any other keyword
+            arguments are used as TrainConfig settings instead.
     Returns:
         slope (float) : the slope of the line of best fit.
         intercept (float) : the intercept of the line of best fit.
     '''
+    result = train(xs, ys, backend, config, **kwargs)
+    return result.slope, result.intercept
+
+def train(xs, ys, backend = 'gd', config = None, **kwargs):
+    '''
+    Trains the model and reports how the training went.
+    Args:
+        xs (arr) : an array of x values stored as floats.
+        ys (arr) : an array of y values stored as floats.
+        backend (str) : one of BACKENDS (see make_train_model).
+        config (TrainConfig) : the training settings, any other keyword
+            arguments are used as TrainConfig settings instead.
+    Returns:
+        result (TrainResult) : the model and its training time.
+    '''
+    if backend not in BACKENDS:
+        raise ValueError("unknown backend %r, expected one of: %s"
+                         %(backend, ", ".join(sorted(BACKENDS))))
+    if config is None:
+        config = TrainConfig(**kwargs)
+    return BACKENDS[backend](xs, ys, config)
+
+def normal_model(xs, ys, config):
+    '''
+    Solves the normal equations of the single layer model, which have the
+        least squares line as their exact solution.
+    Args:
+        xs (arr) : an array of x values stored as floats.
+        ys (arr) : an array of y values stored as floats.
+        config (TrainConfig) : unused, there is nothing to train.
+    Returns:
+        result (TrainResult) : the model and its training time.
+    '''
+    start = time.perf_counter()
+    xs, ys = fit_engine.as_points(xs, ys)
+    slope, intercept = fit_engine.moments_fit(fit_engine.moments(xs, ys))
+    seconds = time.perf_counter() - start
+    errors = ys - (slope*xs + intercept)
+    return TrainResult(slope, intercept, [float(np.dot(errors, errors))/xs.size],
+                       1, 0, seconds, seconds, False)
+
+def standardise(xs, ys):
+    '''
+    Centres the points on their means and scales them to unit sd. The
+        trainers fit the standardised points, where the slope and intercept
+        steps do not pull against each other however far the x values are
+        from 0 and the learning rate is relative to the spread of the data,
+        and the same line is got back with unstandardise. Without this, on
+        an offset x range the intercept keeps drifting long after the loss
+        has stopped improving.
+    Args:
+        xs (arr) : an array of x values stored as floats.
+        ys (arr) : an array of y values stored as floats.
+    Returns:
+        xs (np.array) : the standardised x values.
+        ys (np.array) : the standardised y values.
+        scale (tuple) : the means and sds of the x and y values.
+    '''
+    xs, ys = fit_engine.as_points(xs, ys)
+    xMean = float(xs.mean())
+    yMean = float(ys.mean())
+    #constant values are only centred.
+    xSd = float(xs.std()) or 1.0
+    ySd = float(ys.std()) or 1.0
+    return (xs - xMean)/xSd, (ys - yMean)/ySd, (xMean, yMean, xSd, ySd)
+
+def unstandardise(slope, intercept, scale):
+    '''
+    Gets the line of the original points from one fitted to the
+        standardised points (see standardise).
+    Args:
+        slope (float) : the slope fitted to the standardised points.
+        intercept (float) : the intercept fitted to the standardised points.
+        scale (tuple) : the means and sds returned by standardise.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    xMean, yMean, xSd, ySd = scale
+    slope = float(slope)*ySd/xSd
+    return slope, yMean + float(intercept)*ySd - slope*xMean
+
+def shuffled_passes(xs, ys, config, rng):
+    '''
+    The input pipeline of the gradient descent model: endless passes over
+        the points, each one gathered once into a shuffled contiguous copy
+        that batches are sliced from without copying.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        config (TrainConfig) : the training settings.
+        rng (np.random.Generator) : the generator of the shuffling.
+    Returns:
+        passes (generator) : yields (xs, ys) arrays, one per pass.
+    '''
+    while True:
+        if config.shuffle:
+            order = rng.permutation(xs.size)
+            yield xs[order], ys[order]
+        else:
+            yield xs, ys
+
+def prefetch(iterator, depth):
+    '''
+    Runs an iterator on a background thread, keeping up to depth items ready.
+    Args:
+        iterator (iterable) : the items to prepare.
+        depth (int) : the number of items prepared ahead, 0 for none.
+    Returns:
+        items (generator) : yields the items of the iterator.
+    '''
+    if depth <= 0:
+        yield from iterator
+        return
+
+    ready = queue.Queue(depth)
+    stop = threading.Event()
+
+    def fill():
+        for item in iterator:
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout = 0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+
+    thread = threading.Thread(target = fill, daemon = True)
+    thread.start()
+    try:
+        while True:
+            yield ready.get()
+    finally:
+        stop.set()
+
+def gd_model(xs, ys, config):
+    '''
+    Trains the single layer model with mini-batch gradient descent (Adam) on
+        the mean squared error, the same set up as the keras model. The loss
+        is checked for a plateau every config.checkEvery steps. The model is
+        trained on the standardised points (see standardise).
+    Args:
+        xs (arr) : an array of x values stored as floats.
+        ys (arr) : an array of y values stored as floats.
+        config (TrainConfig) : the training settings.
+    Returns:
+        result (TrainResult) : the model and its training time.
+    '''
+    start = time.perf_counter()
+    xs, ys, scale = standardise(xs, ys)
+    rng = seeding.make_rng(config.seed)
+    totalSteps = config.epochs*config.steps(xs.size)
+    checkSteps = config.check_steps(xs.size)
+    batchSize = min(config.batchSize, xs.size)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-7
+
+    slope = intercept = 0.0
+    slopeM = slopeV = intM = intV = 0.0
+    step = 0
+    stop = False
+    stopper = EarlyStopping(config)
+    best = (slope, intercept)
+    passes = prefetch(shuffled_passes(xs, ys, config, rng), config.prefetch)
+    xPass, yPass = next(passes)
+    seen = 0
+    for first in range(0, totalSteps, checkSteps):
+        count = min(checkSteps, totalSteps - first)
+        checkLoss = 0.0
+        for i in range(count):
+            if seen + batchSize > xs.size:
+                xPass, yPass = next(passes)
+                seen = 0
+            xBatch = xPass[seen:seen+batchSize]
+            batchErrors = (slope*xBatch + intercept -
+                           yPass[seen:seen+batchSize])
+            seen += batchSize
+
+            checkLoss += np.dot(batchErrors, batchErrors)/batchSize
+            slopeGrad = 2*np.dot(batchErrors, xBatch)/batchSize
+            intGrad = 2*batchErrors.sum()/batchSize
+
+            step += 1
+            slopeM = beta1*slopeM + (1-beta1)*slopeGrad
+            slopeV = beta2*slopeV + (1-beta2)*slopeGrad*slopeGrad
+            intM = beta1*intM + (1-beta1)*intGrad
+            intV = beta2*intV + (1-beta2)*intGrad*intGrad
+            rate = stopper.rate*(1-beta2**step)**0.5/(1-beta1**step)
+            slope -= rate*slopeM/(slopeV**0.5 + epsilon)
+            intercept -= rate*intM/(intV**0.5 + epsilon)
+
+        #the loss is recorded in the units of the original points.
+        stop = stopper.update(float(checkLoss/count)*scale[3]**2,
+                              time.perf_counter() - start)
+        if stopper.bestCheck == len(stopper.losses):
+            best = (slope, intercept)
+        if stop:
+            break
+    passes.close()
+
+    #an early stop keeps the coefficients of the best check.
+    if stop:
+        slope, intercept = best
+    slope, intercept = unstandardise(slope, intercept, scale)
+    return TrainResult(slope, intercept, stopper.losses,
+                       stopper.bestCheck, step, time.perf_counter() - start,
+                       stopper.bestTime, stop)
+
+def tensorflow_model(xs, ys, config):
+    '''
+    Trains a keras Dense(1) layer on a shuffled, batched and prefetched
+        tf.data pipeline, importing tensorflow only when called.
+    Args:
+        xs (arr) : an array of x values stored as floats.
+        ys (arr) : an array of y values stored as floats.
+        config (TrainConfig) : the training settings.
+    Returns:
+        result (TrainResult) : the model and its training time.
+    '''
+    import tensorflow as tf
+
+    start = time.perf_counter()
+    xs, ys, scale = standardise(xs, ys)
+    dataset = tf.data.Dataset.from_tensor_slices((xs.reshape(-1, 1), ys))
+    if config.shuffle:
+        dataset = dataset.shuffle(min(xs.size, 1 << 16),
+                                  seed = config.seed if isinstance(config.seed,
+                                                                   int) else None)
+    dataset = dataset.repeat().batch(config.batchSize)
+    if config.prefetch:
+        dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
     model = tf.keras.Sequential(tf.keras.layers.Dense(units=1, input_shape=[1]))
 
-    model.compile(loss='mean_squared_error', optimizer=tf.keras.optimizers.Adam(0.1))
+    model.compile(loss='mean_squared_error',
+                  optimizer=tf.keras.optimizers.Adam(config.learningRate))
 
     #loss function
-    model.fit(xs, ys, epochs=10, verbose=2, steps_per_epoch = int(xs.size/2))
+    stopper = EarlyStopping(config)
+
+    class PlateauCallback(tf.keras.callbacks.Callback):
+        def on_epoch_end(self, epoch, logs = None):
+            if stopper.update(logs['loss']*scale[3]**2,
+                              time.perf_counter() - start):
+                self.model.stop_training = True
+            self.model.optimizer.learning_rate.assign(stopper.rate)
+
+    #a keras epoch is run per check, so the plateau is checked as often as
+    #in the numpy trainer.
+    totalSteps = config.epochs*config.steps(xs.size)
+    checkSteps = config.check_steps(xs.size)
+    checks = -(-totalSteps//checkSteps)
+    model.fit(dataset, epochs=checks, verbose=2,
+              steps_per_epoch = checkSteps,
+              callbacks = [PlateauCallback()])
 
-    slope, intercept = model.get_weights()
+    slope, intercept = unstandardise(*[np.squeeze(weight) for weight in
+                                       model.get_weights()], scale)
 
-    return slope, intercept
+    return TrainResult(slope, intercept, stopper.losses, stopper.bestCheck,
+                       min(totalSteps, len(stopper.losses)*checkSteps),
+                       time.perf_counter() - start, stopper.bestTime,
+                       len(stopper.losses) < checks)
 
-def find_errors(xs, ys, slope, intercept):
+BACKENDS = {
+    'gd' : gd_model,
+    'normal' : normal_model,
+    'tensorflow' : tensorflow_model,
+}
+
+def find_errors(xs, ys, slope, intercept, keep = True):
     '''
-    Prints the sum of errors squared for all x,y pairs given a slope and intercept.
+    Logs the sum of errors squared for all x,y pairs given a slope and intercept.
     Args:
         xs (arr) : an array of x values stored as floats.
         ys (arr) : an array of y values stored as floats.
         slope (float) : the slope of the current model (a in y = ax+b).
         intercept (float) : the y-intercept of the current model (b in y = ax+b).
+        keep (bool) : returns the residuals, False to only calculate the loss
+            and sd without storing them (see residuals.residual_stats).
     Returns:
-        errors (arr) : an array the residuals from the line of best fit.
+        errors (np.array) : an array the residuals from the line of best fit,
+            None if keep is False.
         sd (float) : the average standard deviation from the line of best fit.
     '''
-    loss = tot = 0
-    errors = []
-    for i in range(xs.size):
-        residual = (ys[i] - (slope*xs[i]+intercept))
-        loss += residual**2
-        errors.append(residual)
-    loss = loss[0][0]
-    print(loss)
-    return errors, (loss/xs.size)**0.5
+    errors, stats = residuals.residual_stats(xs, ys, slope, intercept, keep)
+    instrument.log('fit.loss', sse = stats.sse, rmse = stats.rmse,
+                   minError = stats.minError, maxError = stats.maxError)
+    return errors, stats.rmse
 
-def write_gen(filename, xs, ys):
+def write_gen(filename, xs, ys, outDir = None, fmt = 'csv'):
     '''
-    Writes out the generated points in a csv file.
+    Writes out the generated points in a csv (or binary) file.
     Args:
         filename (str) : the name of the input file.
         xs (arr) : an array of generated x values.
         ys (arr) : an array of generated y values.
+        outDir (str) : the directory to write to, defaults to the current one.
+        fmt (str) : the output format, one of 'csv', 'npy' or 'npz'.
+    Returns:
+        outFileName (str) : the path of the written file.
     '''
-    outFileName = 'gen_'+filename
-    with open(outFileName, 'w', newline = '') as pointsOut:
-        slopeWrite = csv.writer(pointsOut)
-        slopeWrite.writerow(['x', 'y'])
-        for i in range(len(xs)):
-            slopeWrite.writerow(['%f'%xs[i], '%f'%ys[i]])
-    print("Generated points located in %s"%outFileName)
+    outFileName = formats.output_name(filename, fmt, outDir)
+    gen_stream.write_blocks(outFileName, [(xs, ys)], fmt = fmt, size = len(xs))
+    instrument.log('write', output = outFileName, points = len(xs))
+    return outFileName
 
 if __name__ == '__main__':
     get_file()
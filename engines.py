@@ -0,0 +1,128 @@
+'''
+Selects the method used to calculate the line of best fit by name.
+Author: Edward Zhou
+'''
+
+import numpy as np
+
+import robust
+import median_weights
+import instrument
+import calc_ml
+import calc_lsr
+
+def fit_lsr(xs, ys, **kwargs):
+    '''
+    Fits the line of best fit with the least squares method (calc_lsr).
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    return calc_lsr.calculator(xs, ys, xs.mean(dtype = np.float64),
+                               ys.mean(dtype = np.float64), **kwargs)[2:]
+
+def fit_ml(xs, ys, backend = 'gd', **kwargs):
+    '''
+    Fits the line of best fit with a single layer model (calc_ml).
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        backend (str) : how the model is trained (see calc_ml.BACKENDS).
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    return calc_ml.make_train_model(xs, ys, backend, **kwargs)
+
+def fit_ml_tf(xs, ys, **kwargs):
+    '''
+    Fits the line of best fit with a keras single layer model (calc_ml),
+        the only engine that loads tensorflow.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    return calc_ml.make_train_model(xs, ys, 'tensorflow', **kwargs)
+
+def fit_theil_sen(xs, ys, **kwargs):
+    '''
+    Fits the line with the median of sampled pair slopes (robust.theil_sen),
+        which ignores up to 29% of points being outliers.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    return robust.theil_sen(xs, ys, **kwargs)
+
+def fit_huber(xs, ys, **kwargs):
+    '''
+    Fits the line minimising the Huber loss (robust.huber), which weighs
+        outliers down instead of squaring their residuals.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    return robust.huber(xs, ys, **kwargs)
+
+def fit_weights(xs, ys, **kwargs):
+    '''
+    Fits the line with the median-distance weighted estimator of
+        old/calc_weights (median_weights), kept as a comparison baseline.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    return median_weights.weighted_fit(xs, ys, **kwargs)
+
+ENGINES = {
+    'lsr' : fit_lsr,
+    'ml' : fit_ml,
+    'ml-tf' : fit_ml_tf,
+    'theil-sen' : fit_theil_sen,
+    'huber' : fit_huber,
+    'weights' : fit_weights,
+}
+
+def get_engine(name):
+    '''
+    Gets a fitting method by name.
+    Args:
+        name (str) : the name of the engine (one of ENGINES).
+    Returns:
+        engine (function) : takes xs, ys and returns slope, intercept.
+    '''
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError("unknown engine %r, expected one of: %s"
+                         %(name, ", ".join(sorted(ENGINES))))
+
+def fit(name, xs, ys, **kwargs):
+    '''
+    Fits the line of best fit with the named engine.
+    Args:
+        name (str) : the name of the engine (one of ENGINES).
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the line of best fit.
+        intercept (float) : the intercept of the line of best fit.
+    '''
+    engine = get_engine(name)
+    with instrument.span('fit', engine = name, points = len(xs)):
+        return engine(xs, ys, **kwargs)
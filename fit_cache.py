@@ -0,0 +1,185 @@
+'''
+Caches fitted lines on disk, keyed on a hash of the input file's contents
+    and the engine and parameters it was fitted with, so repeated runs over
+    unchanged files skip parsing and fitting and go straight to generating.
+    The cache is bounded in size and evicts the least recently used fits.
+Author: Edward Zhou
+'''
+
+import os
+import json
+import hashlib
+import zipfile
+import tempfile
+
+import numpy as np
+
+import loader
+import instrument
+import fit_engine
+import gen_partition
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '.cache', 'fits')
+MAX_BYTES = 1 << 28
+
+def file_digest(filename, chunkBytes = loader.CHUNK_BYTES):
+    '''
+    Hashes the contents of a file.
+    Args:
+        filename (str) : the file.
+        chunkBytes (int) : the size of the blocks the file is read in.
+    Returns:
+        digest (str) : the sha1 of the file as hex.
+    '''
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(chunkBytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(filename, engine = 'lsr', dtype = np.float64, **params):
+    '''
+    Gets the key of the fit of a file, which changes whenever the contents
+        of the file, the engine, its parameters or the dtype do (but not
+        when the file is only moved or touched).
+    Args:
+        filename (str) : the file with the points.
+        engine (str) : the name of the fitting engine (see engines.ENGINES).
+        dtype (str/type) : the dtype the points are kept as, so compact
+            float32 tables are never handed to float64 jobs.
+        params : the parameters the engine is called with.
+    Returns:
+        key (str) : the key as hex.
+    '''
+    with instrument.span('fit_cache.hash', file = filename):
+        content = file_digest(filename)
+    dtype = np.dtype(fit_engine.get_dtype(dtype)).name
+    settings = json.dumps([engine, dtype, params], sort_keys = True,
+                          default = str)
+    return hashlib.sha1((content + settings).encode()).hexdigest()
+
+def entry_path(key, cacheDir = CACHE_DIR):
+    '''
+    Gets the file a fit is stored in.
+    Args:
+        key (str) : the key of the fit (see cache_key).
+        cacheDir (str) : the directory holding cached fits.
+    Returns:
+        path (str) : the path of the .npz entry.
+    '''
+    return os.path.join(cacheDir, key + '.npz')
+
+def store(key, fit, sse = None, cacheDir = CACHE_DIR, maxBytes = MAX_BYTES):
+    '''
+    Stores a fit with its statistics and its sorted (x, error) table, in the
+        dtype of the fit's points, then evicts old fits until the cache fits
+        in maxBytes.
+    Args:
+        key (str) : the key of the fit (see cache_key).
+        fit (FitResult) : the fit, with its residuals.
+        sse (float) : the sum of squared errors, derived from the sd if None.
+        cacheDir (str) : the directory holding cached fits.
+        maxBytes (int) : the largest total size of the cache.
+    '''
+    table = gen_partition.fit_table(fit)
+    if sse is None:
+        sse = fit.sd*fit.sd*fit.xs.size
+
+    os.makedirs(cacheDir, exist_ok = True)
+    path = entry_path(key, cacheDir)
+    #a unique temporary file per write, so threads and processes storing the
+    #same key never write to or replace each other's file.
+    with tempfile.NamedTemporaryFile(dir = cacheDir, prefix = key,
+                                     suffix = '.tmp',
+                                     delete = False) as entryOut:
+        try:
+            np.savez(entryOut, slope = fit.slope, intercept = fit.intercept,
+                     sse = sse, sd = fit.sd, sortedX = table.sortedX,
+                     sortedError = table.sortedError)
+        except BaseException:
+            entryOut.close()
+            os.remove(entryOut.name)
+            raise
+    os.replace(entryOut.name, path)
+    evict(cacheDir, maxBytes)
+
+def lookup(key, cacheDir = CACHE_DIR):
+    '''
+    Gets a stored fit, marking it as recently used.
+    The points of the returned fit are the sorted table, in the dtype it was
+        stored as, with each y rebuilt as its line value plus its error, so
+        they are in increasing x order rather than file order (which the
+        generators do not depend on, apart from the draws a seed picks in
+        kde-kernel).
+    Args:
+        key (str) : the key of the fit (see cache_key).
+        cacheDir (str) : the directory holding cached fits.
+    Returns:
+        fit (FitResult) : the stored fit, None if it is not cached.
+        sse (float) : the sum of squared errors, None if it is not cached.
+    '''
+    path = entry_path(key, cacheDir)
+    try:
+        with np.load(path) as entry:
+            slope = float(entry['slope'])
+            intercept = float(entry['intercept'])
+            sse = float(entry['sse'])
+            sd = float(entry['sd'])
+            sortedX = entry['sortedX']
+            sortedError = entry['sortedError']
+        #an entry evicted by another process since the load is a miss too.
+        os.utime(path)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        instrument.count('fit_cache.misses')
+        return None, None
+    instrument.count('fit_cache.hits')
+
+    ys = sortedX*slope + intercept + sortedError
+    fit = fit_engine.FitResult(sortedX, ys, slope, intercept, sortedError, sd)
+    #the points are already in table order.
+    fit.sampleTable = gen_partition.SampleTable(fit.xs, fit.errors)
+    return fit, sse
+
+def evict(cacheDir = CACHE_DIR, maxBytes = MAX_BYTES):
+    '''
+    Deletes the least recently used fits until the cache fits in maxBytes.
+    Args:
+        cacheDir (str) : the directory holding cached fits.
+        maxBytes (int) : the largest total size of the cache.
+    Returns:
+        evicted (int) : the number of fits deleted.
+    '''
+    if not os.path.isdir(cacheDir):
+        return 0
+    entries = []
+    for name in os.listdir(cacheDir):
+        if name.endswith('.npz'):
+            try:
+                info = os.stat(os.path.join(cacheDir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_mtime_ns, info.st_size, name))
+    entries.sort()
+
+    total = sum(size for used, size, name in entries)
+    evicted = 0
+    for used, size, name in entries:
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(os.path.join(cacheDir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    instrument.count('fit_cache.evictions', evicted)
+    return evicted
+
+def clear(cacheDir = CACHE_DIR):
+    '''
+    Deletes every cached fit.
+    Args:
+        cacheDir (str) : the directory holding cached fits.
+    '''
+    evict(cacheDir, -1)
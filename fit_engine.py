@@ -0,0 +1,275 @@
+'''
+Vectorized least squares fitting over contiguous float64 arrays. Points can
+    also be kept as float32 to halve their memory, in which case the sums
+    are still accumulated in float64.
+Author: Edward Zhou
+'''
+
+import numpy as np
+
+import residuals
+
+#the dtypes points can be stored as, float32 being the compact mode.
+DTYPES = {
+    'float64' : np.float64,
+    'float32' : np.float32,
+}
+
+def get_dtype(name):
+    '''
+    Gets the dtype points are stored as by name.
+    Args:
+        name (str/dtype) : the name of the dtype (one of DTYPES) or the dtype.
+    Returns:
+        dtype (type) : np.float64 or np.float32.
+    '''
+    try:
+        return DTYPES[np.dtype(name).name]
+    except (TypeError, KeyError):
+        raise ValueError("unknown dtype %r, expected one of: %s"
+                         %(name, ", ".join(sorted(DTYPES))))
+
+def point_dtype(values):
+    '''
+    Gets the dtype points are kept as when no dtype is asked for: float32
+        values stay float32 and anything else is float64.
+    Args:
+        values (arr) : the values.
+    Returns:
+        dtype (type) : np.float64 or np.float32.
+    '''
+    if getattr(values, 'dtype', None) == np.float32:
+        return np.float32
+    return np.float64
+
+def as_points(xs, ys, dtype = np.float64):
+    '''
+    Converts x and y values into the contiguous arrays used by the fitting,
+        residual and generation code.
+    Args:
+        xs (arr) : an array of x values.
+        ys (arr) : an array of y values.
+        dtype (str/dtype) : the dtype of the arrays (one of DTYPES), None to
+            keep float32 values as float32 (see point_dtype).
+    Returns:
+        xs (np.array) : a contiguous float64 (or float32) array of x values.
+        ys (np.array) : a contiguous float64 (or float32) array of y values.
+    '''
+    dtype = point_dtype(xs) if dtype is None else get_dtype(dtype)
+    xs = np.ascontiguousarray(xs, dtype = dtype).ravel()
+    ys = np.ascontiguousarray(ys, dtype = dtype).ravel()
+    if xs.size != ys.size:
+        raise ValueError("xs and ys must have the same length "
+                         "(%d != %d)"%(xs.size, ys.size))
+    return xs, ys
+
+class FitResult:
+    '''
+    A fitted line with the points it was fitted to, the input every point
+        generator takes.
+    The points and residuals are float64, or float32 in the compact mode
+        (see DTYPES), where only their storage is float32.
+    Attributes:
+        xs (np.array) : an array of x values stored as float64 (or float32).
+        ys (np.array) : an array of y values stored as float64 (or float32).
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+        errors (np.array) : the residuals of the points from the line, in
+            the dtype of the points, None if they were not kept.
+        sd (float) : the root mean squared residual.
+        sampleTable (SampleTable) : the sorted table gen_partition draws
+            from, built the first time it is needed (see
+            gen_partition.fit_table).
+    '''
+
+    def __init__(self, xs, ys, slope, intercept, errors = None, sd = None,
+                 keepErrors = True, dtype = None):
+        self.xs, self.ys = as_points(xs, ys, dtype)
+        self.slope = float(np.squeeze(slope))
+        self.intercept = float(np.squeeze(intercept))
+        if errors is None and (keepErrors or sd is None):
+            errors, stats = residuals.residual_stats(
+                self.xs, self.ys, self.slope, self.intercept, keepErrors)
+            if sd is None:
+                sd = stats.rmse
+        if errors is not None:
+            errors = np.asarray(errors, dtype = self.xs.dtype)
+            if sd is None:
+                sd = (residuals.sum_squares(errors)/self.xs.size)**0.5
+        self.errors = errors
+        self.sd = sd
+        self.sampleTable = None
+
+    def __repr__(self):
+        return "FitResult(n=%d, slope=%g, intercept=%g, sd=%g)"%(
+            self.xs.size, self.slope, self.intercept, self.sd)
+
+def closed_form(xs, ys):
+    '''
+    Fits the line of best fit with a single pass of raw sums. This is the
+        fastest path, but loses precision when the data is far from zero
+        relative to its spread (use stable_fit for that case).
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    n = xs.size
+    xTot = xs.sum()
+    yTot = ys.sum()
+    xSqTot = np.dot(xs, xs)
+    xyTot = np.dot(xs, ys)
+
+    denom = n*xSqTot - xTot*xTot
+    if denom == 0:
+        raise ZeroDivisionError("all x values are identical")
+    slope = (n*xyTot - xTot*yTot)/denom
+    intercept = (yTot - slope*xTot)/n
+    return float(slope), float(intercept)
+
+def moments(xs, ys):
+    '''
+    Calculates the count, means and centred second moments of a block of
+        points with a two-pass (mean first, then deviations) reduction.
+        float32 points are converted to float64 first, so pass them in
+        chunks (see stable_fit) to keep the copy small.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        moments (tuple) : (n, xMean, yMean, xSqDiff, ySqDiff, xyDiff), where
+            the diffs are sums of (squared/cross) deviations from the means.
+    '''
+    n = xs.size
+    if n == 0:
+        return (0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    xs = np.asarray(xs, dtype = np.float64)
+    ys = np.asarray(ys, dtype = np.float64)
+    xMean = xs.mean()
+    yMean = ys.mean()
+    xDiff = xs - xMean
+    yDiff = ys - yMean
+    return (n, float(xMean), float(yMean), float(np.dot(xDiff, xDiff)),
+            float(np.dot(yDiff, yDiff)), float(np.dot(xDiff, yDiff)))
+
+def merge_moments(first, second):
+    '''
+    Combines the moments of two disjoint blocks of points (Chan et al.'s
+        pairwise update), so blocks can be reduced in any order.
+    Args:
+        first (tuple) : moments of the first block, as returned by moments.
+        second (tuple) : moments of the second block.
+    Returns:
+        moments (tuple) : the moments of both blocks together.
+    '''
+    n1, xMean1, yMean1, xSq1, ySq1, xy1 = first
+    n2, xMean2, yMean2, xSq2, ySq2, xy2 = second
+    if n1 == 0:
+        return second
+    if n2 == 0:
+        return first
+
+    n = n1 + n2
+    xDelta = xMean2 - xMean1
+    yDelta = yMean2 - yMean1
+    weight = n1*n2/n
+    return (n, xMean1 + xDelta*n2/n, yMean1 + yDelta*n2/n,
+            xSq1 + xSq2 + xDelta*xDelta*weight,
+            ySq1 + ySq2 + yDelta*yDelta*weight,
+            xy1 + xy2 + xDelta*yDelta*weight)
+
+def unmerge_moments(total, part):
+    '''
+    Takes the moments of a block of points back out of moments that include
+        it (merge_moments in reverse).
+    Args:
+        total (tuple) : moments of a set of points.
+        part (tuple) : moments of a block of points within that set.
+    Returns:
+        moments (tuple) : the moments of the rest of the points.
+    '''
+    n, xMean, yMean, xSq, ySq, xy = total
+    n2, xMean2, yMean2, xSq2, ySq2, xy2 = part
+    n1 = n - n2
+    if n1 < 0:
+        raise ValueError("cannot remove %d points from %d"%(n2, n))
+    if n2 == 0:
+        return total
+    if n1 == 0:
+        return (0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+    xMean1 = (n*xMean - n2*xMean2)/n1
+    yMean1 = (n*yMean - n2*yMean2)/n1
+    xDelta = xMean2 - xMean1
+    yDelta = yMean2 - yMean1
+    weight = n1*n2/n
+    #rounding can leave tiny negative sums of squares behind.
+    return (n1, xMean1, yMean1,
+            max(xSq - xSq2 - xDelta*xDelta*weight, 0.0),
+            max(ySq - ySq2 - yDelta*yDelta*weight, 0.0),
+            xy - xy2 - xDelta*yDelta*weight)
+
+def moments_fit(stats):
+    '''
+    Calculates the line of best fit from a set of moments.
+    Args:
+        stats (tuple) : moments as returned by moments or merge_moments.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    n, xMean, yMean, xSqDiff, ySqDiff, xyDiff = stats
+    if n == 0:
+        raise ValueError("cannot fit a line to zero points")
+    if xSqDiff == 0:
+        raise ZeroDivisionError("all x values are identical")
+    slope = xyDiff/xSqDiff
+    return slope, yMean - xMean*slope
+
+def stable_fit(xs, ys, chunkSize = 1 << 20):
+    '''
+    Fits the line of best fit by reducing fixed-size chunks to centred
+        moments and merging them (a blocked Welford update). Stays accurate
+        for very large or badly centred data at a small cost over closed_form,
+        and is how float32 points are fitted, a chunk at a time in float64.
+    Args:
+        xs (np.array) : an array of x values stored as float64 (or float32).
+        ys (np.array) : an array of y values stored as float64 (or float32).
+        chunkSize (int) : the number of points reduced at a time.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    stats = moments(xs[:0], ys[:0])
+    for start in range(0, xs.size, chunkSize):
+        stats = merge_moments(stats, moments(xs[start:start+chunkSize],
+                                             ys[start:start+chunkSize]))
+    return moments_fit(stats)
+
+def loss_trace(xs, ys, xMean, yMean):
+    '''
+    Calculates, for every point, the fit obtained after adding points one at
+        a time in file order, and how much each point moved it. This is the
+        per-point diagnostic calc_lsr.calculator used to print, in bulk.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        xMean (float) : the mean of all x values.
+        yMean (float) : the mean of all y values.
+    Returns:
+        residuals (np.array) : observed - predicted for each point using the
+            fit up to and including that point.
+        slopeLoss (np.array) : the change in slope caused by each point.
+        interceptLoss (np.array) : the change in intercept caused by each point.
+    '''
+    xDiff = xs - xMean
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        slopes = np.cumsum(xDiff*(ys - yMean))/np.cumsum(xDiff*xDiff)
+    intercepts = yMean - xMean*slopes
+
+    residuals = ys - (slopes*xs + intercepts)
+    slopeLoss = -np.diff(slopes, prepend = 0.0)
+    interceptLoss = -np.diff(intercepts, prepend = 0.0)
+    return residuals, slopeLoss, interceptLoss
@@ -0,0 +1,294 @@
+'''
+Mergeable sufficient statistics for fitting the line of best fit without
+    keeping the points in memory. States can be updated, merged, have points
+    removed and be saved to disk, so a fit can follow a growing file or a
+    sliding window of the newest points.
+Author: Edward Zhou
+'''
+
+import os
+import json
+import tempfile
+
+import numpy as np
+
+import loader
+import fit_engine
+
+STAT_NAMES = ('n', 'xMean', 'yMean', 'xSqDiff', 'ySqDiff', 'xyDiff')
+
+class FitState:
+    '''
+    The sufficient statistics of a set of points for the least squares
+        model. Internally the sums are kept centred on the running means
+        (n, means, and sums of squared/cross deviations), which carries the
+        same information as n, Σx, Σy, Σxy, Σx², Σy² without the
+        cancellation those raw sums suffer on large or offset data.
+    '''
+
+    def __init__(self, stats = None):
+        '''
+        Args:
+            stats (tuple) : moments as returned by fit_engine.moments,
+                defaults to the empty state.
+        '''
+        if stats is None:
+            stats = (0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        self._set(stats)
+
+    @classmethod
+    def from_points(cls, xs, ys):
+        '''
+        Builds the state of a block of points.
+        Args:
+            xs (arr) : an array of x values.
+            ys (arr) : an array of y values.
+        Returns:
+            state (FitState) : the state of the points.
+        '''
+        return cls(fit_engine.moments(*fit_engine.as_points(xs, ys)))
+
+    @property
+    def stats(self):
+        return (self.n, self.xMean, self.yMean,
+                self.xSqDiff, self.ySqDiff, self.xyDiff)
+
+    @property
+    def xTot(self):
+        return self.n*self.xMean
+
+    @property
+    def yTot(self):
+        return self.n*self.yMean
+
+    @property
+    def xSqTot(self):
+        return self.xSqDiff + self.n*self.xMean*self.xMean
+
+    @property
+    def ySqTot(self):
+        return self.ySqDiff + self.n*self.yMean*self.yMean
+
+    @property
+    def xyTot(self):
+        return self.xyDiff + self.n*self.xMean*self.yMean
+
+    def update(self, xs, ys):
+        '''
+        Folds a block of points into the state.
+        Args:
+            xs (arr) : an array of x values.
+            ys (arr) : an array of y values.
+        Returns:
+            self (FitState) : the updated state.
+        '''
+        self._set(fit_engine.merge_moments(self.stats,
+                                           FitState.from_points(xs, ys).stats))
+        return self
+
+    def remove(self, xs, ys):
+        '''
+        Takes a block of points that were folded in earlier back out.
+        Args:
+            xs (arr) : an array of x values.
+            ys (arr) : an array of y values.
+        Returns:
+            self (FitState) : the updated state.
+        '''
+        self._set(fit_engine.unmerge_moments(self.stats,
+                                             FitState.from_points(xs, ys).stats))
+        return self
+
+    def merge(self, other):
+        '''
+        Combines two states of disjoint sets of points. The order states are
+            merged in does not change the result (beyond rounding).
+        Args:
+            other (FitState) : the state to merge with.
+        Returns:
+            state (FitState) : a new state covering both sets of points.
+        '''
+        return FitState(fit_engine.merge_moments(self.stats, other.stats))
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def fit(self):
+        '''
+        Calculates the line of best fit of the points seen so far.
+        Returns:
+            slope (float) : the slope of the model (a in y = ax+b).
+            intercept (float) : the intercept of the model (b in y = ax+b).
+        '''
+        return fit_engine.moments_fit(self.stats)
+
+    def squared_loss(self, slope, intercept):
+        '''
+        Calculates the sum of errors squared of the points seen so far for
+            any line, without needing the points.
+        Args:
+            slope (float) : the slope of the model (a in y = ax+b).
+            intercept (float) : the intercept of the model (b in y = ax+b).
+        Returns:
+            loss (float) : the sum of squared residuals.
+        '''
+        offset = self.yMean - (slope*self.xMean + intercept)
+        return (self.ySqDiff - 2*slope*self.xyDiff + slope*slope*self.xSqDiff
+                + self.n*offset*offset)
+
+    def to_dict(self):
+        return dict(zip(STAT_NAMES, self.stats))
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(tuple(values[name] for name in STAT_NAMES))
+
+    def save(self, path, **extra):
+        '''
+        Writes the state to a json file (floats round trip exactly).
+        Args:
+            path (str) : the file to write.
+            extra : other values to store with the state.
+        '''
+        values = self.to_dict()
+        values.update(extra)
+        #a unique temporary file per write (see fit_cache.store).
+        with tempfile.NamedTemporaryFile('w', suffix = '.tmp', delete = False,
+                dir = os.path.dirname(os.path.abspath(path))) as stateOut:
+            try:
+                json.dump(values, stateOut)
+            except BaseException:
+                stateOut.close()
+                os.remove(stateOut.name)
+                raise
+        os.replace(stateOut.name, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Reads a state written by save.
+        Args:
+            path (str) : the file to read.
+        Returns:
+            state (FitState) : the state.
+            extra (dict) : the other values stored with it.
+        '''
+        with open(path) as stateIn:
+            values = json.load(stateIn)
+        extra = {name : value for name, value in values.items()
+                 if name not in STAT_NAMES}
+        return cls.from_dict(values), extra
+
+    def _set(self, stats):
+        (self.n, self.xMean, self.yMean,
+         self.xSqDiff, self.ySqDiff, self.xyDiff) = stats
+
+    def __repr__(self):
+        return "FitState(n=%d, xMean=%g, yMean=%g)"%(self.n, self.xMean,
+                                                      self.yMean)
+
+class SlidingWindow:
+    '''
+    The fit of the newest "size" points of a stream. The points in the
+        window are kept in a ring buffer so the oldest ones can be removed
+        from the state as new ones arrive.
+    '''
+
+    def __init__(self, size):
+        '''
+        Args:
+            size (int) : the number of newest points the fit covers.
+        '''
+        self.size = size
+        self.state = FitState()
+        self._points = np.empty((2, size))
+        self._start = 0
+        self._removed = 0
+
+    def update(self, xs, ys):
+        '''
+        Adds points to the window, dropping the oldest ones past its size.
+        Args:
+            xs (arr) : an array of x values.
+            ys (arr) : an array of y values.
+        Returns:
+            self (SlidingWindow) : the updated window.
+        '''
+        xs, ys = fit_engine.as_points(xs, ys)
+        if xs.size >= self.size:
+            xs, ys = xs[-self.size:], ys[-self.size:]
+            self._points[0], self._points[1] = xs, ys
+            self._start = 0
+            self.state = FitState.from_points(xs, ys)
+            return self
+
+        overflow = self.state.n + xs.size - self.size
+        if overflow > 0:
+            old = self._take(self._start, overflow)
+            self.state.remove(*old)
+            self._start = (self._start + overflow)%self.size
+            self._removed += overflow
+
+        end = (self._start + self.state.n)%self.size
+        index = (end + np.arange(xs.size))%self.size
+        self._points[0, index] = xs
+        self._points[1, index] = ys
+        self.state.update(xs, ys)
+
+        #removing points accumulates rounding, so the state is rebuilt from
+        #the buffer once every point in it has been replaced.
+        if self._removed >= self.size:
+            self.state = FitState.from_points(*self.points())
+            self._removed = 0
+        return self
+
+    def _take(self, start, count):
+        index = (start + np.arange(count))%self.size
+        return self._points[0, index], self._points[1, index]
+
+    def points(self):
+        '''
+        Gets the points in the window, oldest first.
+        Returns:
+            xs (np.array) : an array of x values stored as float64.
+            ys (np.array) : an array of y values stored as float64.
+        '''
+        return self._take(self._start, self.state.n)
+
+    def fit(self):
+        return self.state.fit()
+
+def fit_file(filename, statePath = None, chunkBytes = loader.CHUNK_BYTES):
+    '''
+    Fits a csv file that grows by appending. The state and the byte offset
+        read up to are saved in statePath, so the next call only reads the
+        rows appended since. The file is read again from the start if it got
+        smaller than the saved offset (i.e. it was rewritten).
+    Args:
+        filename (str) : the csv file with the points.
+        statePath (str) : the json file holding the state, defaults to the
+            csv file name with a .fitstate.json suffix.
+        chunkBytes (int) : the approximate size of text read per block.
+    Returns:
+        state (FitState) : the statistics of every point in the file.
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    if statePath is None:
+        statePath = filename + '.fitstate.json'
+
+    state, offset = FitState(), 0
+    if os.path.exists(statePath):
+        saved, extra = FitState.load(statePath)
+        if (extra.get('source') == os.path.abspath(filename) and
+                extra.get('offset', 0) <= os.path.getsize(filename)):
+            state, offset = saved, extra['offset']
+
+    for xs, ys, end in loader.iter_tail(filename, offset, chunkBytes):
+        if xs.size:
+            state.update(xs, ys)
+        offset = end
+    state.save(statePath, source = os.path.abspath(filename), offset = offset)
+
+    slope, intercept = state.fit()
+    return state, slope, intercept
@@ -0,0 +1,236 @@
+'''
+Output formats for generated points and fit summaries: csv text (the
+    default), raw float64 (or float32) .npy that can be memory mapped, and
+    compressed columnar .npz. loader reads back every format written here.
+Author: Edward Zhou
+'''
+
+import os
+import csv
+import zipfile
+
+import numpy as np
+
+EXTENSIONS = {
+    'csv' : '.csv',
+    'npy' : '.npy',
+    'npz' : '.npz',
+}
+
+def format_block(xs, ys):
+    '''
+    Formats a block of points as csv rows in a single string operation.
+    Args:
+        xs (arr) : an array of x values.
+        ys (arr) : an array of y values.
+    Returns:
+        text (str) : the rows, formatted like csv.writer with '%f' cells.
+    '''
+    values = np.column_stack((xs, ys)).ravel().tolist()
+    return ('%f,%f\r\n'*len(xs))%tuple(values)
+
+class CsvSink:
+    '''
+    Writes points as "x","y" csv rows with six decimals.
+    '''
+
+    def __init__(self, outFileName, size = None, dtype = np.float64):
+        self._file = open(outFileName, 'w', newline = '')
+        self._file.write('x,y\r\n')
+
+    def write(self, xs, ys):
+        self._file.write(format_block(xs, ys))
+
+    def close(self, complete = True):
+        self._file.close()
+
+class NpySink:
+    '''
+    Writes points into a (2, size) float64 (or float32) .npy file, xs in the
+        first row and ys in the second, so each column can be memory mapped
+        contiguously. The number of points has to be known when the file is
+        created, and closing a complete file checks they were all written
+        (close(complete = False) skips the check, when writing failed).
+    '''
+
+    def __init__(self, outFileName, size = None, dtype = np.float64):
+        if size is None:
+            raise ValueError("npy output needs the number of points up front")
+        self.size = size
+        self._seen = 0
+        self._points = np.lib.format.open_memmap(outFileName, mode = 'w+',
+                                                 dtype = dtype,
+                                                 shape = (2, size))
+
+    def write(self, xs, ys):
+        if self._seen + len(xs) > self.size:
+            raise ValueError("more than %d points written"%self.size)
+        self._points[0, self._seen:self._seen+len(xs)] = xs
+        self._points[1, self._seen:self._seen+len(xs)] = ys
+        self._seen += len(xs)
+
+    def close(self, complete = True):
+        self._points.flush()
+        del self._points
+        if complete and self._seen != self.size:
+            raise ValueError("expected %d points, %d were written"
+                             %(self.size, self._seen))
+
+class NpzSink:
+    '''
+    Writes points into a deflate compressed .npz file as column groups, one
+        x_<block> and y_<block> array per written block, so blocks can be
+        written as they are generated.
+    '''
+
+    def __init__(self, outFileName, size = None, dtype = np.float64):
+        self._zip = zipfile.ZipFile(outFileName, 'w', zipfile.ZIP_DEFLATED,
+                                    allowZip64 = True)
+        self._blocks = 0
+        self._dtype = dtype
+
+    def write(self, xs, ys):
+        for name, values in (('x', xs), ('y', ys)):
+            entry = '%s_%06d.npy'%(name, self._blocks)
+            with self._zip.open(entry, 'w', force_zip64 = True) as entryOut:
+                np.lib.format.write_array(entryOut, np.asarray(
+                    values, dtype = self._dtype), allow_pickle = False)
+        self._blocks += 1
+
+    def close(self, complete = True):
+        self._zip.close()
+
+SINKS = {
+    'csv' : CsvSink,
+    'npy' : NpySink,
+    'npz' : NpzSink,
+}
+
+def get_format(name):
+    '''
+    Checks a format name.
+    Args:
+        name (str) : the name of the format (one of SINKS).
+    Returns:
+        name (str) : the same name.
+    '''
+    if name not in SINKS:
+        raise ValueError("unknown format %r, expected one of: %s"
+                         %(name, ", ".join(sorted(SINKS))))
+    return name
+
+def format_of(filename, default = 'csv'):
+    '''
+    Gets the format of a file from its extension.
+    Args:
+        filename (str) : the file name.
+        default (str) : the format of unknown extensions.
+    Returns:
+        name (str) : the format name.
+    '''
+    ext = os.path.splitext(filename)[1].lower()
+    for name, formatExt in EXTENSIONS.items():
+        if ext == formatExt:
+            return name
+    return default
+
+def open_sink(outFileName, fmt = 'csv', size = None, dtype = np.float64):
+    '''
+    Opens a file for writing points in a format.
+    Args:
+        outFileName (str) : the file to write.
+        fmt (str) : the format name (one of SINKS).
+        size (int) : the total number of points, needed by npy.
+        dtype (str/type) : the dtype binary formats store the points as.
+    Returns:
+        sink : an object with write(xs, ys) and close() methods.
+    '''
+    return SINKS[get_format(fmt)](outFileName, size, dtype)
+
+def output_name(filename, fmt = 'csv', outDir = None):
+    '''
+    Gets the name of the file the generated points of an input file go to.
+    Args:
+        filename (str) : the name of the input file.
+        fmt (str) : the format name, which sets the extension.
+        outDir (str) : the output directory, None to keep the input's path.
+    Returns:
+        outFileName (str) : gen_<input name> with the format's extension.
+    '''
+    base = os.path.splitext(filename)[0] + EXTENSIONS[get_format(fmt)]
+    if outDir is None:
+        return 'gen_'+base
+    return os.path.join(outDir, 'gen_'+os.path.basename(base))
+
+def write_points(outFileName, xs, ys, fmt = 'csv'):
+    '''
+    Writes all points to a file in one go.
+    Args:
+        outFileName (str) : the file to write.
+        xs (arr) : an array of x values.
+        ys (arr) : an array of y values.
+        fmt (str) : the format name (one of SINKS).
+    '''
+    sink = open_sink(outFileName, fmt, len(xs))
+    try:
+        sink.write(xs, ys)
+    except BaseException:
+        sink.close(complete = False)
+        raise
+    sink.close()
+
+def write_summary(rows, outFileName = 'output.csv', fmt = None):
+    '''
+    Writes the Filename, Slope and Intercept of fitted files.
+    Args:
+        rows (iterable) : (filename, slope, intercept) tuples.
+        outFileName (str) : the summary file to write.
+        fmt (str) : the format name, defaults to the one of the extension.
+    '''
+    if fmt is None:
+        fmt = format_of(outFileName)
+    if get_format(fmt) == 'csv':
+        with open(outFileName, 'w', newline = '') as summaryOut:
+            summaryWrite = csv.writer(summaryOut)
+            summaryWrite.writerow(['Filename', 'Slope', 'Intercept'])
+            for filename, slope, intercept in rows:
+                summaryWrite.writerow([filename, '%f'%slope, '%f'%intercept])
+        return
+
+    rows = list(rows)
+    filenames = np.array([row[0] for row in rows], dtype = str)
+    slopes = np.array([row[1] for row in rows], dtype = np.float64)
+    intercepts = np.array([row[2] for row in rows], dtype = np.float64)
+    if fmt == 'npz':
+        np.savez_compressed(outFileName, Filename = filenames, Slope = slopes,
+                            Intercept = intercepts)
+    else:
+        table = np.empty(len(rows), dtype = [('Filename', filenames.dtype),
+                                             ('Slope', np.float64),
+                                             ('Intercept', np.float64)])
+        table['Filename'] = filenames
+        table['Slope'] = slopes
+        table['Intercept'] = intercepts
+        np.save(outFileName, table)
+
+def read_summary(filename):
+    '''
+    Reads a summary written by write_summary in any format.
+    Args:
+        filename (str) : the summary file.
+    Returns:
+        columns (dict) : the Filename, Slope and Intercept columns as arrays.
+    '''
+    fmt = format_of(filename)
+    if fmt == 'npy':
+        table = np.load(filename)
+        return {name : table[name] for name in table.dtype.names}
+    if fmt == 'npz':
+        with np.load(filename) as table:
+            return {name : table[name] for name in table.files}
+
+    with open(filename, newline = '') as summaryIn:
+        rows = list(csv.reader(summaryIn))[1:]
+    return {'Filename' : np.array([row[0] for row in rows], dtype = str),
+            'Slope' : np.array([float(row[1]) for row in rows]),
+            'Intercept' : np.array([float(row[2]) for row in rows])}
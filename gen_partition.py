@@ -4,9 +4,125 @@ Generates a set of points with an input of the line of best fit and sample
 Author: Edward Zhou
 '''
 
-import random
+import numpy as np
 
-def generator(xs, slope, intercept, errors, size = 100, **kwargs):
+import seeding
+import instrument
+import fit_engine
+
+def build_table(xs, errors):
+    '''
+    Sorts the sample points' errors by their x value.
+    Args:
+        xs (arr) : an array of x values of the sample points.
+        errors (arr) : the residuals of the sample points from
+            the line of best fit.
+    Returns:
+        sortedX (np.array) : the x values in increasing order.
+        sortedError (np.array) : the error of each sorted x value.
+        Both are float64, or float32 if xs is (see fit_engine.point_dtype).
+    '''
+    dtype = fit_engine.point_dtype(xs)
+    xs = np.asarray(xs, dtype = dtype).ravel()
+    errors = np.asarray(errors, dtype = dtype).ravel()
+    order = np.argsort(xs, kind = 'stable')
+    return xs[order], errors[order]
+
+def partitions(sortedX):
+    '''
+    Splits the sorted sample points into the 10 x-buckets errors are
+        resampled from.
+    Args:
+        sortedX (np.array) : the x values of the sample points in increasing
+            order.
+    Returns:
+        bounds (np.array) : the upper x bound of each bucket (non-decreasing,
+            the last one is infinite so every x falls in a bucket).
+        lows (np.array) : the first index of each bucket in the sorted table.
+        highs (np.array) : the last index of each bucket in the sorted table.
+    '''
+    length = sortedX.size
+    sub = length/10
+    buckets = np.arange(1, 11)
+    bounds = sortedX[[int(sub)] + [int(sub*i)-1 for i in buckets[1:]]]
+    #a bucket is the first one whose bound is at least x, which is the same
+    #bucket as the first one whose running maximum bound is at least x.
+    bounds = np.maximum.accumulate(bounds)
+    bounds[-1] = np.inf
+
+    lows = np.array([int(sub*(i-1)) for i in buckets])
+    highs = np.array([int(sub*i)-1 for i in buckets])
+    highs = np.clip(np.maximum(highs, lows), 0, length-1)
+    return bounds, lows, highs
+
+class SampleTable:
+    '''
+    The sample points' errors sorted by x with the bounds of the x-buckets
+        they are resampled from. It only depends on the fit, so it is built
+        once and shared by every block generated from it.
+    Attributes:
+        sortedX (np.array) : the x values in increasing order.
+        sortedError (np.array) : the error of each sorted x value.
+        minError (float) : the smallest sample error.
+        maxError (float) : the largest sample error.
+        bounds (np.array) : the upper x bound of each bucket.
+        lows (np.array) : the first index of each bucket.
+        highs (np.array) : the last index of each bucket.
+    '''
+
+    def __init__(self, sortedX, sortedError):
+        self.sortedX = sortedX
+        self.sortedError = sortedError
+        self.minError = sortedError.min()
+        self.maxError = sortedError.max()
+        self.bounds, self.lows, self.highs = partitions(sortedX)
+
+def make_table(xs, errors):
+    '''
+    Builds the sample table of a set of points.
+    Args:
+        xs (arr) : an array of x values of the sample points.
+        errors (arr) : the residuals of the sample points from
+            the line of best fit.
+    Returns:
+        table (SampleTable) : the sorted table and its buckets.
+    '''
+    return SampleTable(*build_table(xs, errors))
+
+def fit_table(fit):
+    '''
+    Gets the sample table of a fit, building it the first time and keeping
+        it on the fit (see FitResult.sampleTable).
+    Args:
+        fit (FitResult) : the fit, with its residuals.
+    Returns:
+        table (SampleTable) : the sorted table and its buckets.
+    '''
+    if fit.sampleTable is None:
+        fit.sampleTable = make_table(fit.xs, fit.errors)
+    return fit.sampleTable
+
+def redistribute(ys, errorSum, rng):
+    '''
+    Subtracts the total error of the generated points back out of them in
+        place, spread over random points with the further points being more
+        likely.
+    Args:
+        ys (np.array) : the generated y values.
+        errorSum (float) : the sum of the errors added to the y values.
+        rng (np.random.Generator) : the generator of the random draws.
+    '''
+    size = ys.size
+    if size == 0:
+        return
+    errorPiece = errorSum/size
+    randX = np.minimum(rng.exponential(1, size), 5)
+    sign = rng.choice([-1, 1], size)
+    index = (size/2 - size/10*(5-randX)*sign).astype(np.int64)
+    ys -= errorPiece*np.bincount(np.minimum(index, size-1), minlength = size)
+
+def generator(xs, slope, intercept, errors, size = 100, seed = None,
+              maxRounds = 1000, table = None, **kwargs):
     '''
     Generates points of size "size".
     Args:
@@ -16,69 +132,68 @@ def generator(xs, slope, intercept, errors, size = 100, **kwargs):
         errors (arr) : the residuals of the sample points from
             the line of best fit.
         size (int) : the number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed of the random draws,
+            None for fresh entropy.
+        maxRounds (int) : the number of times rejected errors are redrawn
+            before the remaining ones are clipped to the sample error range.
+        table (SampleTable) : the sample table of xs and errors, which are
+            then not looked at, None to build it (see fit_table to build it
+            once for a stream of blocks).
     Returns:
-        xs (arr) : an array of generated x values.
-        ys (arr) : an array of generated y values.
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
     '''
-    #gets the errors of the points.
-    errorByX = []
-    length = len(xs)
-    minError = maxError = errors[0]
-    for i in range(length):
-        if errors[i] < minError:
-            minError = errors[i]
-        if errors[i] > maxError:
-            maxError = errors[i]
-        errorByX.append((xs[i], errors[i]))
-
-    #sorts the points and errors by their x value.
-    errorByX = sorted(errorByX, key=lambda x:x[0], reverse=False)
+    rng = seeding.make_rng(seed)
+    slope = float(np.squeeze(slope))
+    intercept = float(np.squeeze(intercept))
+    if size == 0:
+        return np.empty(0), np.empty(0)
+
+    #gets the errors of the points, sorted by their x value.
+    if table is None:
+        table = make_table(xs, errors)
+    sortedX = table.sortedX
+    sortedError = table.sortedError
+    minError = table.minError
+    maxError = table.maxError
+    bounds, lows, highs = table.bounds, table.lows, table.highs
 
     #point generation.
-    xs = []
-    ys = []
-    xRange = (errorByX[0][0], errorByX[-1][0])
-    errorSum = 0
-    sub = length/10
-    for i in range(size):
-        x = random.uniform(xRange[0], xRange[1])
-        xMax = errorByX[int(sub)][0]
-        temp = 1
-        while not x <= xMax:
-            temp += 1
-            xMax = errorByX[int(sub*temp)-1][0]
-
-        error = maxError+1
-        #this generates points via resampled errors.
-        while error < minError or error > maxError:
-            error = errorByX[random.randint(int(sub*(temp-1)), \
-                                        int(sub*temp)-1)][1]*random.gauss(0, \
-                                            x/(xRange[1]-xRange[0])) +\
-                                        errorByX[random.randint(int(sub*(temp-1)), \
-                                        int(sub*temp)-1)][1]*random.gauss(0, 1)
-
-        errorSum += error
-        y = x*slope + intercept + error
-
-        xs.append(x)
-        ys.append(y)
-
-    #distributes the errors randomly across the points, with the further points being more likely.
-    errorPiece = errorSum/size
-    for i in range(size):
-        randX = random.expovariate(1)
-        if randX > 5:
-            randX = 5
-        index = int(size/2-size/10*(5-randX)*random.choice([-1, 1]))
-
-        ys[index] -= errorPiece
-
-    #checks if points are a numpy array, and if so extracts the actual values from the nested arrays.
-    try:
-        geny = []
-        for y in ys:
-            geny.append(y[0][0])
-    
-        return xs, geny
-    except TypeError:
-        return xs, ys
+    xRange = (sortedX[0], sortedX[-1])
+    xs = rng.uniform(xRange[0], xRange[1], size)
+    bucket = np.searchsorted(bounds, xs, side = 'left')
+
+    def draw(pending):
+        low = lows[bucket[pending]]
+        high = highs[bucket[pending]] + 1
+        return (sortedError[rng.integers(low, high)]*
+                rng.standard_normal(pending.size)*
+                (xs[pending]/(xRange[1]-xRange[0])) +
+                sortedError[rng.integers(low, high)]*
+                rng.standard_normal(pending.size))
+
+    #this generates points via resampled errors, redrawing only the errors
+    #that fall outside of the range of the sample errors.
+    errors = np.empty(size)
+    pending = np.arange(size)
+    rejected = np.empty(0)
+    rounds = 0
+    while pending.size and rounds < maxRounds:
+        error = draw(pending)
+        rounds += 1
+        accepted = (error >= minError) & (error <= maxError)
+        errors[pending[accepted]] = error[accepted]
+        pending = pending[~accepted]
+        rejected = error[~accepted]
+    instrument.count('partition.rounds', rounds)
+    if pending.size:
+        #the last rejected draws are clipped, a first draw if there was none.
+        if rounds == 0:
+            rejected = draw(pending)
+        instrument.count('partition.clipped', pending.size)
+        errors[pending] = np.clip(rejected, minError, maxError)
+
+    ys = xs*slope + intercept + errors
+    redistribute(ys, errors.sum(), rng)
+
+    return xs, ys
@@ -0,0 +1,195 @@
+'''
+Generates points as a stream of fixed-size blocks and writes them out on a
+    background thread, so any number of points can be generated in bounded
+    memory with generation and disk writes overlapping.
+Author: Edward Zhou
+'''
+
+import time
+import queue
+import threading
+import collections
+import concurrent.futures
+
+import numpy as np
+
+import seeding
+import instrument
+import formats
+
+BLOCK_SIZE = seeding.BLOCK_SIZE
+
+def iter_blocks(generator, args, size, seed = None, blockSize = BLOCK_SIZE,
+                workers = 1, dtype = np.float64, **kwargs):
+    '''
+    Generates points block by block. Each block is one call of the generator
+        with its own child stream of the seed, so the blocks are the same as
+        the ones seeding.parallel_generate concatenates.
+    The generators spread the sum of their errors back over the points they
+        generated; done per block this keeps every block (and so the whole
+        stream) free of a net error without needing the other blocks.
+    Args:
+        generator (function) : a generator taking size and seed keywords
+            (e.g. gen_partition.generator).
+        args (tuple) : the positional arguments of the generator.
+        size (int) : the total number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+        blockSize (int) : the number of points per block.
+        workers (int) : generates up to this many blocks ahead in worker
+            processes, keeping at most 2*workers blocks in memory.
+        dtype (str/type) : the dtype of the blocks, float32 for the compact
+            mode (see fit_engine.DTYPES). The generators still draw each
+            block in float64 (so seeded output does not depend on dtype) and
+            it is only cast afterwards, so float32 does not lower the peak
+            of generating a block, only the size of the blocks handed on.
+    Returns:
+        blocks (generator) : yields (xs, ys) float64 (or dtype) arrays per
+            block.
+    '''
+    parent = seeding.seed_sequence(seed)
+    tasks = ((min(blockSize, size-start), seeding.child(parent, i))
+             for i, start in enumerate(range(0, size, blockSize)))
+
+    if workers <= 1:
+        for blockLen, blockSeed in tasks:
+            with instrument.span('generate', points = blockLen):
+                xs, ys = generator(*args, size = blockLen, seed = blockSeed,
+                                   **kwargs)
+            yield (np.asarray(xs, dtype = dtype),
+                   np.asarray(ys, dtype = dtype))
+        return
+
+    with seeding.block_pool(workers, generator, args, kwargs) as pool:
+        pending = collections.deque()
+        for blockLen, blockSeed in tasks:
+            pending.append(pool.submit(seeding.pool_block, blockLen,
+                                       blockSeed))
+            if len(pending) >= 2*workers:
+                #with workers the span is the time spent waiting on them.
+                with instrument.span('generate', workers = workers):
+                    xs, ys = pending.popleft().result()
+                yield (np.asarray(xs, dtype = dtype),
+                       np.asarray(ys, dtype = dtype))
+        while pending:
+            with instrument.span('generate', workers = workers):
+                xs, ys = pending.popleft().result()
+            yield (np.asarray(xs, dtype = dtype),
+                   np.asarray(ys, dtype = dtype))
+
+class BlockWriter:
+    '''
+    Writes blocks of points to a file on a background thread. At most
+        "depth" blocks wait to be written, so a fast producer is held back
+        instead of filling memory (depth 2 is double buffering).
+    '''
+
+    def __init__(self, outFileName, depth = 2, fmt = 'csv', size = None,
+                 dtype = np.float64):
+        '''
+        Args:
+            outFileName (str) : the file to write.
+            depth (int) : the number of blocks that can wait to be written.
+            fmt (str) : the output format (see formats.SINKS).
+            size (int) : the total number of points, needed by npy.
+            dtype (str/type) : the dtype binary formats store the points as.
+        '''
+        self.outFileName = outFileName
+        self.rows = 0
+        self.busy = 0.0
+        self._error = None
+        self._queue = queue.Queue(depth)
+        self._sink = formats.open_sink(outFileName, fmt, size, dtype)
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                start = time.perf_counter()
+                self._sink.write(*block)
+                self.rows += len(block[0])
+                self.busy += time.perf_counter() - start
+            except Exception as error:
+                self._error = error
+
+    def write(self, xs, ys):
+        '''
+        Queues a block of points to be written, waiting while the queue is full.
+        Args:
+            xs (arr) : an array of x values.
+            ys (arr) : an array of y values.
+        '''
+        if self._error is not None:
+            raise self._error
+        self._queue.put((xs, ys))
+
+    def close(self, complete = True):
+        '''
+        Waits for every queued block to be written and closes the file.
+        Args:
+            complete (bool) : False when the blocks stopped early because of
+                an error, which then closes the file without checking or
+                raising, so that error is the one that gets through.
+        '''
+        self._queue.put(None)
+        self._thread.join()
+        self._sink.close(complete and self._error is None)
+        if complete and self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close(excInfo[0] is None)
+
+def write_blocks(outFileName, blocks, depth = 2, fmt = 'csv', size = None,
+                 dtype = np.float64):
+    '''
+    Writes a stream of blocks of points to a file.
+    Args:
+        outFileName (str) : the file to write.
+        blocks (iterable) : (xs, ys) blocks of points.
+        depth (int) : the number of blocks that can wait to be written.
+        fmt (str) : the output format (see formats.SINKS).
+        size (int) : the total number of points, needed by npy.
+        dtype (str/type) : the dtype binary formats store the points as.
+    Returns:
+        writer (BlockWriter) : the closed writer, with the number of rows
+            written and the seconds spent writing.
+    '''
+    with instrument.span('write', output = outFileName, format = fmt):
+        with BlockWriter(outFileName, depth, fmt, size, dtype) as writer:
+            for xs, ys in blocks:
+                writer.write(xs, ys)
+    instrument.count('rows.written', writer.rows)
+    return writer
+
+def generate_to_file(outFileName, generator, args, size, seed = None,
+                     blockSize = BLOCK_SIZE, workers = 1, fmt = 'csv',
+                     dtype = np.float64, **kwargs):
+    '''
+    Generates points block by block straight into a file.
+    Args:
+        outFileName (str) : the file to write.
+        generator (function) : a generator taking size and seed keywords.
+        args (tuple) : the positional arguments of the generator.
+        size (int) : the total number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+        blockSize (int) : the number of points per block.
+        workers (int) : the number of processes generating blocks.
+        fmt (str) : the output format (see formats.SINKS).
+        dtype (str/type) : the dtype the blocks are cast to and stored as
+            (see iter_blocks).
+    Returns:
+        writer (BlockWriter) : the closed writer.
+    '''
+    blocks = iter_blocks(generator, args, size, seed, blockSize, workers,
+                         dtype, **kwargs)
+    return write_blocks(outFileName, blocks, fmt = fmt, size = size,
+                        dtype = dtype)
@@ -0,0 +1,187 @@
+'''
+Selects the method used to generate points by name. Every generator takes a
+    FitResult (see fit_engine) and returns arrays of points, so they can be
+    switched or benchmarked without editing the callers.
+Author: Edward Zhou
+'''
+
+import os
+import sys
+import threading
+import importlib.util
+
+import numpy as np
+
+import gen_stream
+import instrument
+import gen_partition
+
+#gen_distribution and gen_kdf live in old/.
+OLD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'old')
+_oldLock = threading.Lock()
+
+def load_old(name):
+    '''
+    Loads a module of old/ by its path, once, without adding old/ to the
+        import path of every caller. It is kept in sys.modules as old.<name>.
+    Args:
+        name (str) : the name of the module, e.g. gen_kdf.
+    Returns:
+        module (module) : the loaded module.
+    '''
+    key = 'old.' + name
+    with _oldLock:
+        if key not in sys.modules:
+            spec = importlib.util.spec_from_file_location(
+                key, os.path.join(OLD_DIR, name + '.py'))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[key] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[key]
+                raise
+        return sys.modules[key]
+
+gen_distribution = load_old('gen_distribution')
+
+GENERATORS = {}
+#the generators that resample the residuals of the sample points, the others
+#only need the sd so the residuals do not have to be kept for them.
+USES_ERRORS = set()
+#what each generator builds from a fit once and reuses for every block.
+PREPARE = {}
+
+def register(name, errors = False, prepare = None):
+    '''
+    Adds a generator to the registry under a name.
+    Args:
+        name (str) : the name the generator is selected by.
+        errors (bool) : the generator uses the residuals of the FitResult.
+        prepare (function) : builds and keeps on the FitResult what the
+            generator reuses across calls, None if there is nothing.
+    Returns:
+        decorator (function) : registers the function it decorates.
+    '''
+    def decorator(function):
+        GENERATORS[name] = function
+        if errors:
+            USES_ERRORS.add(name)
+        if prepare is not None:
+            PREPARE[name] = prepare
+        return function
+    return decorator
+
+@register('partition', errors = True, prepare = gen_partition.fit_table)
+def partition(fit, size = 100, seed = None, **kwargs):
+    '''
+    Generates points with errors resampled from the nearby sample points.
+    '''
+    return gen_partition.generator(fit.xs, fit.slope, fit.intercept,
+                                   fit.errors, size = size, seed = seed,
+                                   table = gen_partition.fit_table(fit),
+                                   **kwargs)
+
+@register('gaussian')
+def gaussian(fit, size = 100, seed = None, **kwargs):
+    '''
+    Generates points with gaussian errors that grow with x.
+    '''
+    return gen_distribution.generator(fit.xs, fit.slope, fit.intercept,
+                                      fit.errors, fit.sd, size = size,
+                                      seed = seed, **kwargs)
+
+@register('kde')
+def kde(fit, size = 100, seed = None, **kwargs):
+    '''
+    Generates points from cells of a kernel density grid of the points.
+    '''
+    return load_old('gen_kdf').generator(fit.xs, fit.ys, size = size,
+                                         seed = seed, mode = 'grid', **kwargs)
+
+@register('kde-kernel')
+def kde_kernel(fit, size = 100, seed = None, **kwargs):
+    '''
+    Generates points by resampling the points with kernel noise.
+    '''
+    return load_old('gen_kdf').generator(fit.xs, fit.ys, size = size,
+                                         seed = seed, mode = 'kernel',
+                                         **kwargs)
+
+def get_generator(name):
+    '''
+    Gets a generator by name.
+    Args:
+        name (str) : the name of the generator (one of GENERATORS).
+    Returns:
+        generator (function) : takes a FitResult, size and seed and returns
+            the generated xs and ys.
+    '''
+    try:
+        return GENERATORS[name]
+    except KeyError:
+        raise ValueError("unknown generator %r, expected one of: %s"
+                         %(name, ", ".join(sorted(GENERATORS))))
+
+def uses_errors(name):
+    '''
+    Checks if a generator needs the residuals of the sample points.
+    Args:
+        name (str) : the name of the generator (one of GENERATORS).
+    Returns:
+        uses (bool) : True if the FitResult has to keep its residuals.
+    '''
+    get_generator(name)
+    return name in USES_ERRORS
+
+def prepare(name, fit):
+    '''
+    Builds what a generator reuses from a fit (e.g. the sorted sample table
+        of partition) before a stream of blocks, so it is built once rather
+        than once per block or worker.
+    Args:
+        name (str) : the name of the generator (one of GENERATORS).
+        fit (FitResult) : the fitted line and its sample points.
+    '''
+    get_generator(name)
+    if name in PREPARE:
+        PREPARE[name](fit)
+
+def generate(name, fit, size, seed = None, **kwargs):
+    '''
+    Generates points with the named generator.
+    Args:
+        name (str) : the name of the generator (one of GENERATORS).
+        fit (FitResult) : the fitted line and its sample points.
+        size (int) : the number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+    Returns:
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
+    '''
+    generator = get_generator(name)
+    with instrument.span('generate', generator = name, points = size):
+        return generator(fit, size = size, seed = seed, **kwargs)
+
+def iter_blocks(name, fit, size, seed = None,
+                blockSize = gen_stream.BLOCK_SIZE, workers = 1,
+                dtype = np.float64, **kwargs):
+    '''
+    Generates points with the named generator as a stream of blocks
+        (see gen_stream.iter_blocks).
+    Args:
+        name (str) : the name of the generator (one of GENERATORS).
+        fit (FitResult) : the fitted line and its sample points.
+        size (int) : the total number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+        blockSize (int) : the number of points per block.
+        workers (int) : the number of processes generating blocks.
+        dtype (str/type) : the dtype the blocks are cast to after being
+            generated in float64 (see gen_stream.iter_blocks).
+    Returns:
+        blocks (generator) : yields (xs, ys) float64 (or dtype) arrays per
+            block.
+    '''
+    prepare(name, fit)
+    return gen_stream.iter_blocks(get_generator(name), (fit,), size, seed,
+                                  blockSize, workers, dtype, **kwargs)
@@ -0,0 +1,243 @@
+'''
+Instruments the pipeline with timing spans, counters and memory snapshots,
+    reported as one json object per line through the "lsr" logger instead of
+    print(). Nothing is written until configure is called (warnings still
+    reach stderr), and the per-point trace only runs at the trace verbosity.
+Author: Edward Zhou
+'''
+
+import sys
+import json
+import time
+import logging
+import contextlib
+
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+VERBOSITY = {
+    'quiet' : logging.WARNING,
+    'info' : logging.INFO,
+    'debug' : logging.DEBUG,
+    'trace' : TRACE,
+}
+
+LOGGER = logging.getLogger('lsr')
+
+class Metrics:
+    '''
+    The totals of the spans and counters recorded in this process.
+    Attributes:
+        spans (dict) : calls, seconds and peakRss (the largest peak seen at
+            the end of a call, in bytes) per span name.
+        counters (dict) : the total per counter name.
+    '''
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+
+    def add_span(self, name, seconds, peak):
+        span = self.spans.setdefault(name, {'calls' : 0, 'seconds' : 0.0,
+                                            'peakRss' : None})
+        span['calls'] += 1
+        span['seconds'] += seconds
+        if peak is not None:
+            span['peakRss'] = max(span['peakRss'] or 0, peak)
+
+    def to_dict(self):
+        #copies, so the totals handed out are not cleared by a later reset.
+        return {'spans' : {name : dict(span)
+                           for name, span in self.spans.items()},
+                'counters' : dict(self.counters), 'peakRss' : peak_rss()}
+
+METRICS = Metrics()
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Formats a log record as a json object: the time, level and event name
+        and the fields it was logged with.
+    '''
+
+    def format(self, record):
+        entry = {'time' : round(record.created, 6),
+                 'level' : record.levelname,
+                 'event' : record.getMessage()}
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default = str)
+
+def configure(verbosity = 'info', logFile = None):
+    '''
+    Sends the log events at or above a verbosity to stderr or a file as json
+        lines, replacing any earlier configuration.
+    Args:
+        verbosity (str) : one of VERBOSITY, 'trace' adds the per-point
+            diagnostics of the fits.
+        logFile (str) : the file the events are appended to, None for stderr.
+    '''
+    for handler in list(LOGGER.handlers):
+        LOGGER.removeHandler(handler)
+        handler.close()
+    if logFile is None:
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        handler = logging.FileHandler(logFile)
+    handler.setFormatter(JsonFormatter())
+    LOGGER.addHandler(handler)
+    LOGGER.setLevel(VERBOSITY[verbosity])
+    LOGGER.propagate = False
+
+def enabled(level = logging.INFO):
+    '''
+    Checks if events of a level are logged, so costly fields can be skipped.
+    Args:
+        level (int) : the level, e.g. TRACE.
+    Returns:
+        enabled (bool) : True if events of the level are written.
+    '''
+    return LOGGER.isEnabledFor(level)
+
+def log(event, level = logging.INFO, **fields):
+    '''
+    Logs an event with fields.
+    Args:
+        event (str) : the name of the event, e.g. "fit.loss".
+        level (int) : the level of the event.
+    '''
+    if LOGGER.isEnabledFor(level):
+        LOGGER.log(level, event, extra = {'fields' : fields})
+
+def count(name, amount = 1):
+    '''
+    Adds to a counter.
+    Args:
+        name (str) : the name of the counter, e.g. "rows.parsed".
+        amount (int) : how much is added.
+    '''
+    METRICS.counters[name] = METRICS.counters.get(name, 0) + amount
+
+def proc_status(field):
+    '''
+    Reads a memory field of /proc/self/status (linux only).
+    Args:
+        field (str) : the field, e.g. VmRSS.
+    Returns:
+        value (int) : the value in bytes, None where it is not available.
+    '''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])*1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def current_rss():
+    '''
+    Gets the resident memory of this process now.
+    Returns:
+        rss (int) : the memory in bytes, None where it is not available.
+    '''
+    return proc_status('VmRSS')
+
+def reset_peak_rss():
+    '''
+    Starts the peak resident memory again from the current memory, so the
+        peak of a job can be measured in a process that ran others before it
+        (linux only).
+    Returns:
+        reset (bool) : True if the peak was reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as refs:
+            refs.write('5')
+    except OSError:
+        return False
+    return True
+
+def peak_rss():
+    '''
+    Gets the peak resident memory of this process so far (since the last
+        reset_peak_rss where it is supported).
+    Returns:
+        peak (int) : the peak in bytes, None where it is not available.
+    '''
+    peak = proc_status('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macOS.
+    return peak if sys.platform == 'darwin' else peak*1024
+
+def memory_snapshot(label, points = None, baseline = None):
+    '''
+    Logs the peak memory of this process so far.
+    Args:
+        label (str) : what the snapshot is taken after.
+        points (int) : the number of points the job handled, to also log the
+            peak per point.
+        baseline (int) : the memory in bytes before the job, which is taken
+            off the peak per point.
+    Returns:
+        peak (int) : the peak in bytes, None where it is not available.
+    '''
+    peak = peak_rss()
+    log('memory', label = label, peakRss = peak,
+        bytesPerPoint = bytes_per_point(peak, points, baseline))
+    return peak
+
+def bytes_per_point(peak, points, baseline = None):
+    '''
+    Gets the peak memory a job used per point it handled.
+    Args:
+        peak (int) : the peak memory in bytes.
+        points (int) : the number of points.
+        baseline (int) : the memory in bytes before the job.
+    Returns:
+        perPoint (float) : the bytes per point, None if unknown.
+    '''
+    if peak is None or not points:
+        return None
+    return max(peak - (baseline or 0), 0)/points
+
+@contextlib.contextmanager
+def span(name, **fields):
+    '''
+    Times the block it wraps, adding it to the metrics and logging it at
+        the debug level with its fields.
+    Args:
+        name (str) : the name of the stage, e.g. "load".
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        peak = peak_rss()
+        METRICS.add_span(name, seconds, peak)
+        log('span', logging.DEBUG, span = name, seconds = seconds,
+            peakRss = peak, **fields)
+
+def reset():
+    '''
+    Clears the spans and counters recorded so far.
+    '''
+    METRICS.spans = {}
+    METRICS.counters = {}
+
+def write_metrics(filename, metrics = None):
+    '''
+    Writes the spans, counters and peak memory recorded so far as json.
+    Args:
+        filename (str) : the metrics file.
+        metrics (dict) : the metrics to write instead, e.g. ones collected
+            from worker processes.
+    '''
+    if metrics is None:
+        metrics = METRICS.to_dict()
+    with open(filename, 'w') as metricsOut:
+        json.dump(metrics, metricsOut, indent = 2)
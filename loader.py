@@ -0,0 +1,327 @@
+'''
+Reads csv files of "x","y" points into float64 arrays in bulk, with an
+    optional binary cache so a file is only parsed as text once. Points
+    written as .npy or .npz (see formats) are read back without parsing.
+Author: Edward Zhou
+'''
+
+import os
+import hashlib
+import tempfile
+import warnings
+
+import numpy as np
+
+import instrument
+import fit_engine
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '.cache', 'points')
+CHUNK_BYTES = 1 << 23
+
+def is_point(line):
+    '''
+    Checks if a line of text starts like a point (i.e. with a number).
+    Args:
+        line (str) : a line of the csv file.
+    Returns:
+        isPoint (bool) : True if the line looks like a point.
+    '''
+    line = line.lstrip().lstrip('"')
+    return line != "" and line[0] in "-+.0123456789"
+
+def parse_lines(lines, malformed = 'skip'):
+    '''
+    Parses a block of csv lines into x and y values in one call, falling back
+        to line by line parsing only for blocks that contain bad rows.
+    Args:
+        lines (list) : lines of the csv file, without the header.
+        malformed (str) : 'skip' to drop rows that are not two numbers,
+            'raise' to raise a ValueError on them.
+    Returns:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        rejected (int) : the number of malformed rows dropped.
+    '''
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return np.empty(0), np.empty(0), 0
+    try:
+        points = np.loadtxt(lines, delimiter = ",", usecols = (0, 1),
+                            quotechar = '"', dtype = np.float64, ndmin = 2)
+        instrument.count('rows.parsed', len(points))
+        return points[:, 0].copy(), points[:, 1].copy(), 0
+    except ValueError:
+        if malformed == 'raise':
+            raise
+
+    xs = np.empty(len(lines))
+    ys = np.empty(len(lines))
+    seen = 0
+    for line in lines:
+        cells = line.replace('"', '').split(",")
+        try:
+            xs[seen] = float(cells[0])
+            ys[seen] = float(cells[1])
+        except (ValueError, IndexError):
+            continue
+        seen += 1
+    instrument.count('rows.parsed', seen)
+    instrument.count('rows.rejected', len(lines) - seen)
+    return xs[:seen], ys[:seen], len(lines) - seen
+
+def iter_chunks(filename, chunkBytes = CHUNK_BYTES, malformed = 'skip'):
+    '''
+    Reads a csv file of points in blocks of roughly chunkBytes bytes.
+    Args:
+        filename (str) : the csv file with the points.
+        chunkBytes (int) : the approximate size of text parsed at a time.
+        malformed (str) : how to treat malformed rows (see parse_lines).
+    Returns:
+        chunks (generator) : yields (xs, ys) float64 arrays per block.
+    '''
+    rejected = 0
+    with open(filename, newline = '') as file:
+        first = True
+        while True:
+            lines = file.readlines(chunkBytes)
+            if not lines:
+                break
+            #the header (if any) can only be the first line of the file.
+            if first:
+                first = False
+                if not is_point(lines[0]):
+                    lines = lines[1:]
+            xs, ys, skipped = parse_lines(lines, malformed)
+            rejected += skipped
+            if xs.size:
+                yield xs, ys
+    if rejected:
+        warnings.warn("skipped %d malformed rows in %s"%(rejected, filename))
+
+def iter_tail(filename, start = 0, chunkBytes = CHUNK_BYTES,
+              malformed = 'skip'):
+    '''
+    Reads the points of a csv file from a byte offset onwards, for files
+        that grow by appending. A last line without a line break may still
+        be being written, so it is left for the next read.
+    Args:
+        filename (str) : the csv file with the points.
+        start (int) : the byte offset to start at, 0 for the whole file
+            (only then is a header line looked for).
+        chunkBytes (int) : the approximate size of text parsed at a time.
+        malformed (str) : how to treat malformed rows (see parse_lines).
+    Returns:
+        chunks (generator) : yields (xs, ys, end) per block, end being the
+            byte offset just after the block's last line.
+    '''
+    rejected = 0
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        end = start
+        first = start == 0
+        while True:
+            lines = file.readlines(chunkBytes)
+            if not lines:
+                break
+            if not lines[-1].endswith(b'\n'):
+                lines = lines[:-1]
+                if not lines:
+                    break
+            end += sum(len(line) for line in lines)
+            lines = [line.decode() for line in lines]
+            if first:
+                first = False
+                if not is_point(lines[0]):
+                    lines = lines[1:]
+            xs, ys, skipped = parse_lines(lines, malformed)
+            rejected += skipped
+            yield xs, ys, end
+    if rejected:
+        warnings.warn("skipped %d malformed rows in %s"%(rejected, filename))
+
+def line_boundaries(filename, parts):
+    '''
+    Splits a file into byte ranges of about equal size that start and end on
+        line boundaries, so each range can be parsed on its own.
+    Args:
+        filename (str) : the csv file with the points.
+        parts (int) : the number of ranges wanted.
+    Returns:
+        ranges (arr) : (start, end) byte offsets, empty ranges left out.
+    '''
+    size = os.path.getsize(filename)
+    bounds = [0]
+    with open(filename, 'rb') as file:
+        for i in range(1, parts):
+            file.seek(max(size*i//parts, bounds[-1]))
+            #moves to the start of the next line (the seek may land on one).
+            if file.tell() > 0:
+                file.seek(file.tell()-1)
+                file.readline()
+            bounds.append(file.tell())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:])
+            if end > start]
+
+def iter_range(filename, start, end, chunkBytes = CHUNK_BYTES,
+               malformed = 'skip'):
+    '''
+    Reads the points of a byte range of a csv file (see line_boundaries).
+    Args:
+        filename (str) : the csv file with the points.
+        start (int) : the byte offset of the first line, 0 for the start of
+            the file (only then is a header line looked for).
+        end (int) : the byte offset just after the last line.
+        chunkBytes (int) : the approximate size of text parsed at a time.
+        malformed (str) : how to treat malformed rows (see parse_lines).
+    Returns:
+        chunks (generator) : yields (xs, ys, rejected) per block, rejected
+            being the number of malformed rows dropped from it.
+    '''
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        position = start
+        first = start == 0
+        while position < end:
+            text = file.read(min(chunkBytes, end - position))
+            if not text:
+                break
+            #finishes the last line of the chunk if it was cut in two.
+            if not text.endswith(b'\n') and position + len(text) < end:
+                text += file.readline()
+            position += len(text)
+            lines = text.decode().splitlines()
+            if first:
+                first = False
+                if lines and not is_point(lines[0]):
+                    lines = lines[1:]
+            yield parse_lines(lines, malformed)
+
+def read_points(filename, chunkBytes = CHUNK_BYTES, malformed = 'skip',
+                dtype = np.float64):
+    '''
+    Reads every point of a csv file into preallocated arrays, growing them
+        only when the size estimate from the first block was too small.
+    Args:
+        filename (str) : the csv file with the points.
+        chunkBytes (int) : the approximate size of text parsed at a time.
+        malformed (str) : how to treat malformed rows (see parse_lines).
+        dtype (type) : the dtype of the points, np.float32 halves their
+            memory (only a block at a time is parsed as float64).
+    Returns:
+        points (np.array) : a (2, n) array, points[0] are the xs and
+            points[1] the ys (each row is contiguous).
+    '''
+    fileSize = os.path.getsize(filename)
+    points = None
+    seen = 0
+    for xs, ys in iter_chunks(filename, chunkBytes, malformed):
+        if points is None:
+            perRow = min(fileSize, chunkBytes)/max(xs.size, 1)
+            points = np.empty((2, int(fileSize/perRow*1.1) + xs.size),
+                              dtype = dtype)
+        if seen + xs.size > points.shape[1]:
+            grown = np.empty((2, max(2*points.shape[1], seen + xs.size)),
+                             dtype = dtype)
+            grown[:, :seen] = points[:, :seen]
+            points = grown
+        points[0, seen:seen+xs.size] = xs
+        points[1, seen:seen+xs.size] = ys
+        seen += xs.size
+
+    if points is None:
+        raise ValueError("no points found in %s"%filename)
+    return np.ascontiguousarray(points[:, :seen])
+
+def read_binary(filename):
+    '''
+    Reads points written by formats in the npy or npz format.
+    Args:
+        filename (str) : the .npy or .npz file with the points.
+    Returns:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    '''
+    if filename.lower().endswith('.npy'):
+        points = np.load(filename, mmap_mode = 'r')
+        if points.ndim != 2 or 2 not in points.shape:
+            raise ValueError("%s does not hold (x, y) points"%filename)
+        if points.shape[0] != 2:
+            points = points.T
+        return points[0], points[1]
+
+    with np.load(filename) as groups:
+        if 'x' in groups.files:
+            return groups['x'], groups['y']
+        xNames = sorted(name for name in groups.files if name.startswith('x_'))
+        xs = [groups[name] for name in xNames]
+        ys = [groups['y_'+name[2:]] for name in xNames]
+    if not xs:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(xs), np.concatenate(ys)
+
+def cache_path(filename, cacheDir = CACHE_DIR, dtype = np.float64):
+    '''
+    Gets the cache file for a csv file, keyed on its path, size,
+        modification time and the dtype of the points, so an edited file is
+        never read from a stale cache.
+    Args:
+        filename (str) : the csv file with the points.
+        cacheDir (str) : the directory holding cached files.
+        dtype (type) : the dtype of the cached points.
+    Returns:
+        path (str) : the path of the .npy cache file.
+    '''
+    info = os.stat(filename)
+    key = "%s|%d|%d|%s"%(os.path.abspath(filename), info.st_size,
+                         info.st_mtime_ns, np.dtype(dtype).name)
+    return os.path.join(cacheDir,
+                        hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+def load_points(filename, cache = False, cacheDir = CACHE_DIR,
+                malformed = 'skip', dtype = np.float64):
+    '''
+    Loads the points of a csv, .npy or .npz file as float64 arrays.
+    Args:
+        filename (str) : the file with the points.
+        cache (bool) : stores the parsed points as a .npy file and memory maps
+            it on later calls instead of parsing the text again.
+        cacheDir (str) : the directory holding cached files.
+        malformed (str) : how to treat malformed rows (see parse_lines).
+        dtype (str/type) : the dtype of the points (see fit_engine.DTYPES),
+            float32 for the compact mode.
+    Returns:
+        xs (np.array) : an array of x values stored as float64 (or dtype).
+        ys (np.array) : an array of y values stored as float64 (or dtype).
+    '''
+    dtype = fit_engine.get_dtype(dtype)
+    with instrument.span('load', file = filename, cache = cache,
+                         dtype = np.dtype(dtype).name):
+        if filename.lower().endswith(('.npy', '.npz')):
+            xs, ys = read_binary(filename)
+            return (np.asarray(xs, dtype = dtype),
+                    np.asarray(ys, dtype = dtype))
+        if not cache:
+            points = read_points(filename, malformed = malformed,
+                                 dtype = dtype)
+            return points[0], points[1]
+
+        path = cache_path(filename, cacheDir, dtype)
+        if not os.path.exists(path):
+            points = read_points(filename, malformed = malformed,
+                                 dtype = dtype)
+            os.makedirs(cacheDir, exist_ok = True)
+            #a unique temporary file, so concurrent loads of the same file
+            #(threads included) never replace each other's file.
+            with tempfile.NamedTemporaryFile(dir = cacheDir, suffix = '.tmp',
+                                             delete = False) as cacheOut:
+                try:
+                    np.save(cacheOut, points)
+                except BaseException:
+                    cacheOut.close()
+                    os.remove(cacheOut.name)
+                    raise
+            os.replace(cacheOut.name, path)
+        points = np.load(path, mmap_mode = 'r')
+        return points[0], points[1]
@@ -0,0 +1,91 @@
+'''
+Fits a line with the median-distance weighted estimator of old/calc_weights:
+    the points are taken in order of distance from the median point, and the
+    intercept and slope are running averages of each point's estimate,
+    weighted by how far its x is from the median relative to the range of x
+    seen so far. The running averages are evaluated with cumulative sums.
+Author: Edward Zhou
+'''
+
+import numpy as np
+
+import fit_engine
+
+def upper_median(values):
+    '''
+    Finds the middle value of an array by selection, the upper of the two
+        middle values for an even number of values (as calc_weights did).
+    Args:
+        values (np.array) : the values, which are not modified.
+    Returns:
+        median (float) : the value at index n//2 of the sorted values.
+    '''
+    half = values.size//2
+    return float(np.partition(values, half)[half])
+
+def distance_order(xs, ys):
+    '''
+    Orders the points by increasing euclidean distance from the median point,
+        ties kept in file order.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        order (np.array) : the indices of the points in distance order.
+        xMedian (float) : the median of the x values.
+        yMedian (float) : the median of the y values.
+    '''
+    xMedian = upper_median(xs)
+    yMedian = upper_median(ys)
+    distances = np.sqrt((xs - xMedian)**2 + (ys - yMedian)**2)
+    return np.argsort(distances, kind = 'stable'), xMedian, yMedian
+
+def running_fit(xs, ys):
+    '''
+    Calculates the estimate after each point in distance order. The k-th
+        intercept is the mean of the first k point intercepts
+        (y-yMedian)*w, and the k-th slope the mean of the first k point
+        slopes (y-intercept)/x*w, using the k-th intercept, where
+        w = |(x-xMedian)/(xMax-xMin)*2| over the x range of the first k
+        points (w is dropped, and y-yMedian is y, while the range is 0).
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        order (np.array) : the indices of the points in the order used.
+        slopes (np.array) : the slope after each point.
+        intercepts (np.array) : the intercept after each point.
+    '''
+    xs, ys = fit_engine.as_points(xs, ys)
+    if xs.size == 0:
+        raise ValueError("cannot fit a line to zero points")
+    if (xs == 0).any():
+        raise ZeroDivisionError("the point slopes divide by x, which is 0")
+    order, xMedian, yMedian = distance_order(xs, ys)
+    xs = xs[order]
+    ys = ys[order]
+
+    xRange = np.maximum.accumulate(xs) - np.minimum.accumulate(xs)
+    ranged = xRange != 0
+    weights = np.ones(xs.size)
+    weights[ranged] = np.abs((xs[ranged] - xMedian)/xRange[ranged]*2)
+    seen = np.arange(1, xs.size+1)
+
+    pointIntercepts = np.where(ranged, (ys - yMedian)*weights, ys)
+    intercepts = np.cumsum(pointIntercepts)/seen
+    pointSlopes = (ys - intercepts)/xs*weights
+    slopes = np.cumsum(pointSlopes)/seen
+    return order, slopes, intercepts
+
+def weighted_fit(xs, ys):
+    '''
+    Fits the line with the median-distance weighted estimator.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    order, slopes, intercepts = running_fit(xs, ys)
+    return float(slopes[-1]), float(intercepts[-1])
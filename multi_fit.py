@@ -0,0 +1,165 @@
+'''
+Fits many small series of points at once: the series are concatenated into
+    one pair of arrays with the offset each starts at, and the sums of every
+    series are taken together with segmented reductions (np.add.reduceat),
+    so the cost per series is a few array elements instead of Python calls.
+Author: Edward Zhou
+'''
+
+import os
+import time
+import argparse
+
+import numpy as np
+
+import batch
+import loader
+import formats
+import instrument
+
+def concat_series(series):
+    '''
+    Concatenates series of points into one pair of arrays.
+    Args:
+        series (iterable) : (xs, ys) pairs of arrays.
+    Returns:
+        xs (np.array) : the x values of every series, one after the other.
+        ys (np.array) : the y values of every series, one after the other.
+        offsets (np.array) : the index each series starts at.
+    '''
+    xsList = []
+    ysList = []
+    counts = []
+    for xs, ys in series:
+        xsList.append(np.asarray(xs, dtype = np.float64).ravel())
+        ysList.append(np.asarray(ys, dtype = np.float64).ravel())
+        counts.append(xsList[-1].size)
+    offsets = np.zeros(len(counts), dtype = np.int64)
+    np.cumsum(counts[:-1], out = offsets[1:])
+    if not xsList:
+        return np.empty(0), np.empty(0), offsets
+    return np.concatenate(xsList), np.concatenate(ysList), offsets
+
+def segment_sums(values, offsets, counts):
+    '''
+    Sums every series of a concatenated array.
+    Args:
+        values (np.array) : the concatenated values.
+        offsets (np.array) : the index each series starts at.
+        counts (np.array) : the number of values in each series.
+    Returns:
+        sums (np.array) : the sum of each series, 0 for empty ones.
+    '''
+    sums = np.zeros(offsets.size)
+    #reduceat gives the value at the offset for an empty series and cannot
+    #start at the end of the array, so only non-empty series are reduced.
+    filled = counts > 0
+    if filled.any():
+        sums[filled] = np.add.reduceat(values, offsets[filled])
+    return sums
+
+def fit_series(xs, ys, offsets):
+    '''
+    Fits a least squares line to every series of concatenated points, with
+        the same centred sums as calc_lsr.calculator.
+    Args:
+        xs (np.array) : the x values of every series, one after the other.
+        ys (np.array) : the y values of every series, one after the other.
+        offsets (np.array) : the index each series starts at, increasing.
+    Returns:
+        columns (dict) : Slope, Intercept, SSE, sd and Points arrays with a
+            value per series. Series with fewer than two distinct x values
+            get a nan slope and intercept.
+    '''
+    xs = np.asarray(xs, dtype = np.float64).ravel()
+    ys = np.asarray(ys, dtype = np.float64).ravel()
+    offsets = np.asarray(offsets, dtype = np.int64).ravel()
+    counts = np.diff(np.append(offsets, xs.size))
+    if (counts < 0).any():
+        raise ValueError("offsets must be increasing and within the points")
+
+    with instrument.span('multi_fit', series = offsets.size, points = xs.size):
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            xMeans = segment_sums(xs, offsets, counts)/counts
+            yMeans = segment_sums(ys, offsets, counts)/counts
+            xDiff = xs - np.repeat(xMeans, counts)
+            yDiff = ys - np.repeat(yMeans, counts)
+            slopes = (segment_sums(xDiff*yDiff, offsets, counts)/
+                      segment_sums(xDiff*xDiff, offsets, counts))
+            slopes[~np.isfinite(slopes)] = np.nan
+            intercepts = yMeans - xMeans*slopes
+
+            #residuals from the centred values, y - (ax + b) = yDiff - a*xDiff.
+            errors = yDiff - np.repeat(slopes, counts)*xDiff
+            sse = segment_sums(errors*errors, offsets, counts)
+            sd = np.sqrt(sse/counts)
+
+    return {'Slope' : slopes, 'Intercept' : intercepts, 'SSE' : sse,
+            'sd' : sd, 'Points' : counts}
+
+def load_series(filenames, cache = False):
+    '''
+    Loads csv files of points as concatenated series.
+    Args:
+        filenames (arr) : the files with the points.
+        cache (bool) : reuses the binary copy of previously parsed files.
+    Returns:
+        xs (np.array) : the x values of every file, one after the other.
+        ys (np.array) : the y values of every file, one after the other.
+        offsets (np.array) : the index each file starts at.
+    '''
+    return concat_series(loader.load_points(filename, cache = cache)
+                         for filename in filenames)
+
+def fit_files(filenames, cache = False):
+    '''
+    Fits every file at once into a table shaped like output.csv.
+    Args:
+        filenames (arr) : the files with the points.
+        cache (bool) : reuses the binary copy of previously parsed files.
+    Returns:
+        columns (dict) : the Filename column (base names, as in output.csv)
+            and the columns of fit_series.
+    '''
+    columns = fit_series(*load_series(filenames, cache))
+    columns['Filename'] = np.array([os.path.basename(filename)
+                                    for filename in filenames], dtype = str)
+    return columns
+
+def write_table(columns, outFileName = 'output.csv', fmt = None):
+    '''
+    Writes the Filename, Slope and Intercept columns like batch does.
+    Args:
+        columns (dict) : the table of fit_files.
+        outFileName (str) : the summary file to write.
+        fmt (str) : the format name, defaults to the one of the extension.
+    '''
+    formats.write_summary(list(zip(columns['Filename'].tolist(),
+                                   columns['Slope'].tolist(),
+                                   columns['Intercept'].tolist())),
+                          outFileName, fmt)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument('inputs', nargs = '*', default = ['input_data'],
+                        help = "directories, globs or csv files "
+                               "(default: input_data)")
+    parser.add_argument('-o', '--output', default = 'output.csv',
+                        help = "the summary file, its extension (.csv, .npy "
+                               "or .npz) sets its format (default: output.csv)")
+    parser.add_argument('--cache', action = 'store_true',
+                        help = "cache parsed inputs as memory mapped .npy")
+    args = parser.parse_args(argv)
+
+    filenames = batch.find_inputs(args.inputs)
+    if not filenames:
+        parser.error("no csv files found in %s"%", ".join(args.inputs))
+
+    start = time.perf_counter()
+    columns = fit_files(filenames, args.cache)
+    write_table(columns, args.output)
+    print("Fitted %d files in %.3fs, summary located in %s"
+          %(len(filenames), time.perf_counter() - start, args.output))
+
+if __name__ == '__main__':
+    main()
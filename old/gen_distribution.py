@@ -4,57 +4,41 @@ Generates a set of points with an input of the line of best fit and sample
 Author: Edward Zhou
 '''
 
-import random
+import numpy as np
 
-def generator(xs, slope, intercept, errors, sd, size, **kwargs):
+import seeding
+import gen_partition
+
+def generator(xs, slope, intercept, errors, sd, size, seed = None, **kwargs):
     '''
-    Generates points of size "size".
+    Generates points of size "size", with gaussian errors whose spread grows
+        with x (sd*2*x/range) drawn all at once.
     Args:
         xs (arr) : an array of x values of the sample points.
         slope (float) : the slope of the line of best fit.
         intercept (float) : the intercept of the line of best fit.
         errors (arr) : the residuals of the sample points from
             the line of best fit.
+        sd (float) : the standard deviation of the residuals.
         size (int) : the number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed of the random draws,
+            None for fresh entropy.
     Returns:
-        xs (arr) : an array of generated x values.
-        ys (arr) : an array of generated y values.
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
     '''
-    #gets the errors of the points.
-    errorByX = []
-    length = len(xs)
-    minError = maxError = errors[0]
-    for i in range(length):
-        if errors[i] < minError:
-            minError = errors[i]
-        if errors[i] > maxError:
-            maxError = errors[i]
-        errorByX.append((xs[i], errors[i]))
-
-    #sorts the points and errors by their x value.
-    errorByX = sorted(errorByX, key=lambda x:x[0], reverse=False)
+    rng = seeding.make_rng(seed)
+    slope = float(np.squeeze(slope))
+    intercept = float(np.squeeze(intercept))
 
     #point generation.
-    xs = []
-    ys = []
-    xRange = (errorByX[0][0], errorByX[-1][0])
-    errorSum = 0
-    for i in range(size):
-        x = random.uniform(xRange[0], xRange[1])
-        error = random.gauss(0, sd)*2*x/(xRange[1]-xRange[0])
-        errorSum += error
-        y = x*slope + intercept + error
-        xs.append(x)
-        ys.append(y)
+    xs = np.asarray(xs, dtype = np.float64)
+    xRange = (xs.min(), xs.max())
+    genx = rng.uniform(xRange[0], xRange[1], size)
+    error = rng.normal(0, sd, size)*2*genx/(xRange[1]-xRange[0])
+    geny = genx*slope + intercept + error
 
     #distributes the errors randomly across the points, with the further points being more likely.
-    errorPiece = errorSum/size
-    for i in range(size):
-        randX = random.expovariate(1)
-        if randX > 5:
-            randX = 5
-        index = int(size/2-size/10*(5-randX)*random.choice([-1, 1]))
+    gen_partition.redistribute(geny, error.sum(), rng)
 
-        ys[index] -= errorPiece
-    
-    return xs, ys
+    return genx, geny
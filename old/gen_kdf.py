@@ -1,12 +1,22 @@
 '''
 Generates a set of points with an input of the line of best fit and sample
-    points using kernel density estimation.
+    points using kernel density estimation, either by sampling cells of a
+    density grid or by resampling the points with kernel shaped noise.
 Author: Edward Zhou
 '''
 
-from sklearn.neighbors import KernelDensity
 import numpy as np
-import random
+import hashlib
+import threading
+import collections
+
+import seeding
+
+#density grids of recently used inputs, most recently used last.
+GRID_CACHE = collections.OrderedDict()
+GRID_CACHE_SIZE = 8
+#guards GRID_CACHE, which the service's request threads share.
+_gridLock = threading.Lock()
 
 def kde2D(xs, ys, bandwidth, xbins=100j, ybins=100j):
     '''
@@ -20,11 +30,14 @@ def kde2D(xs, ys, bandwidth, xbins=100j, ybins=100j):
     Returns:
         zs (np.array) : array of arrays of probabilities for each x, y bin.
     '''
+    #only the grid mode needs sklearn.
+    from sklearn.neighbors import KernelDensity
+
     gridX, gridY = np.mgrid[xs.min():xs.max():xbins, 
                       ys.min():ys.max():ybins]
 
     grid = np.vstack([gridX.ravel(), gridY.ravel()]).T
-    points  = np.vstack([ys, xs]).T
+    points  = np.vstack([xs, ys]).T
 
     kde = KernelDensity(bandwidth=bandwidth)
     kde.fit(points)
@@ -34,48 +47,149 @@ def kde2D(xs, ys, bandwidth, xbins=100j, ybins=100j):
     zs = np.reshape(zs, gridX.shape)
     return zs
 
-def generator(xs, ys, size = 100, **kwargs):
+def select_bandwidth(xs, ys, rule = 'scott'):
+    '''
+    Calculates a Gaussian kernel bandwidth for each axis with a rule of thumb.
+        In 2D both rules scale the spread by n^(-1/6); 'silverman' uses the
+        smaller of the standard deviation and IQR/1.349 as the spread, which
+        keeps outliers from widening the kernel.
+    Args:
+        xs (np.array) : an array of x values of the sample points.
+        ys (np.array) : an array of y values of the sample points.
+        rule (str) : 'scott' or 'silverman'.
+    Returns:
+        bandwidths (np.array) : the x and y bandwidths.
+    '''
+    points = np.vstack([xs, ys])
+    spread = points.std(axis = 1, ddof = 1)
+    if rule == 'silverman':
+        lower, upper = np.percentile(points, [25, 75], axis = 1)
+        iqr = (upper - lower)/1.349
+        spread = np.where(iqr > 0, np.minimum(spread, iqr), spread)
+    elif rule != 'scott':
+        raise ValueError("unknown bandwidth rule %r, expected 'scott' or "
+                         "'silverman'"%rule)
+    return spread*points.shape[1]**(-1/6)
+
+def bandwidths(xs, ys, bandwidth):
+    '''
+    Gets the x and y bandwidths from a number or a rule name.
+    Args:
+        xs (np.array) : an array of x values of the sample points.
+        ys (np.array) : an array of y values of the sample points.
+        bandwidth (float/str) : the same bandwidth for both axes, or a rule
+            for select_bandwidth.
+    Returns:
+        bandwidths (np.array) : the x and y bandwidths.
+    '''
+    if isinstance(bandwidth, str):
+        return select_bandwidth(xs, ys, bandwidth)
+    return np.array([float(bandwidth)]*2)
+
+def density_table(xs, ys, bandwidth = 2.0, bins = 100):
+    '''
+    Evaluates the kernel density grid of the sample points and its flattened
+        cumulative table, reusing the result for repeated calls on the same
+        points and settings.
+    Args:
+        xs (np.array) : an array of x values of the sample points.
+        ys (np.array) : an array of y values of the sample points.
+        bandwidth (float/str) : the bandwidth for KernelDensity, or a rule
+            for select_bandwidth (the geometric mean of its x and y values).
+        bins (int) : the number of grid cells along each axis.
+    Returns:
+        zs (np.array) : array of arrays of probabilities for each x, y bin.
+        cumulative (np.array) : the running sum of zs in row order (x bins
+            first, then y bins within each x bin).
+    '''
+    digest = hashlib.sha1(xs.tobytes())
+    digest.update(ys.tobytes())
+    key = (digest.hexdigest(), str(bandwidth), int(bins))
+    with _gridLock:
+        table = GRID_CACHE.get(key)
+        if table is not None:
+            GRID_CACHE.move_to_end(key)
+            return table
+
+    #the grid is built outside the lock, so other inputs are not held up
+    #(two threads missing on the same input may both build it).
+    if isinstance(bandwidth, str):
+        bandwidth = float(np.sqrt(np.prod(select_bandwidth(xs, ys, bandwidth))))
+    zs = kde2D(xs, ys, bandwidth, bins*1j, bins*1j)
+    table = (zs, np.cumsum(zs.ravel()))
+    with _gridLock:
+        GRID_CACHE[key] = table
+        while len(GRID_CACHE) > GRID_CACHE_SIZE:
+            GRID_CACHE.popitem(last = False)
+    return table
+
+def resample(xs, ys, size, rng, bandwidth = 2.0):
+    '''
+    Draws points from the kernel density of the sample points directly, by
+        picking random sample points and adding Gaussian kernel noise. Costs
+        O(size) whatever the number of sample points and has no grid cells.
+    Args:
+        xs (np.array) : an array of x values of the sample points.
+        ys (np.array) : an array of y values of the sample points.
+        size (int) : the number of points to be generated.
+        rng (np.random.Generator) : the generator of the random draws.
+        bandwidth (float/str) : the kernel bandwidth, or a rule for
+            select_bandwidth.
+    Returns:
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
+    '''
+    xWidth, yWidth = bandwidths(xs, ys, bandwidth)
+    picks = rng.integers(0, xs.size, size)
+    return (xs[picks] + rng.normal(0, xWidth, size),
+            ys[picks] + rng.normal(0, yWidth, size))
+
+def generator(xs, ys, size = 100, seed = None, bandwidth = 2.0, bins = 100,
+              jitter = False, mode = 'grid', **kwargs):
     '''
     Generates points of size "size".
     Args:
         xs (arr) : an array of x values of the sample points.
         ys (arr) : an array of y values of the sample points.
         size (int) : the number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed of the random draws,
+            None for fresh entropy.
+        bandwidth (float/str) : the bandwidth of the kernel density, or
+            'scott'/'silverman' to select it from the sample points.
+        bins (int) : the number of grid cells along each axis.
+        jitter (bool) : spreads the points uniformly within their grid cell
+            instead of placing them on the cell's corner.
+        mode (str) : 'grid' samples cells of the evaluated density grid,
+            'kernel' resamples the points with kernel noise (see resample).
     Returns:
-        xs (arr) : an array of generated x values.
-        ys (arr) : an array of generated y values.
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
     '''
-    xs = np.array(xs, dtype = float)
-    ys = np.array(ys, dtype = float)
+    rng = seeding.make_rng(seed)
+    xs = np.ascontiguousarray(xs, dtype = float)
+    ys = np.ascontiguousarray(ys, dtype = float)
+    if mode == 'kernel':
+        return resample(xs, ys, size, rng, bandwidth)
+    if mode != 'grid':
+        raise ValueError("unknown mode %r, expected 'grid' or 'kernel'"%mode)
+
     xMin = xs.min()
     xMax = xs.max()
     yMin = ys.min()
     yMax = ys.max()
 
-    zs = kde2D(xs, ys, 2.0)
-    tot = 0
-    prob = []
-    xs = []
-    ys = []
-    for z in zs:
-        tot += z.sum()
-        prob.append(tot)
-    for i in range(size):
-        index = random.uniform(0, tot)
-        idx1 = idx2 = 0
-
-        #finds the proper x value of the point based on the cumulative probability function of xs.
-        while index > prob[idx1]:
-            idx1 += 1
-        if idx1 != 0:
-            index -= prob[idx1-1]
-
-        #finds the proper y value of the point based on the cumulative probability function of ys given an x.
-        runningSum = zs[idx1][idx2]
-        while index > runningSum:
-            idx2 += 1
-            runningSum += zs[idx1][idx2]
-
-        xs.append(idx1*(xMax-xMin)/100+xMin)
-        ys.append(idx2*(yMax-yMin)/100+yMin)
-    return xs, ys
\ No newline at end of file
+    zs, cumulative = density_table(xs, ys, bandwidth, bins)
+
+    #finds the cell of each point from the cumulative probability function
+    #of the cells (x bin first, then y bin given the x bin).
+    index = rng.uniform(0, cumulative[-1], size)
+    cells = np.minimum(np.searchsorted(cumulative, index, side = 'left'),
+                       cumulative.size-1)
+    idx1, idx2 = np.divmod(cells, zs.shape[1])
+
+    genx = idx1*(xMax-xMin)/bins+xMin
+    geny = idx2*(yMax-yMin)/bins+yMin
+    if jitter:
+        genx += rng.uniform(0, (xMax-xMin)/bins, size)
+        geny += rng.uniform(0, (yMax-yMin)/bins, size)
+    return genx, geny
@@ -0,0 +1,94 @@
+'''
+Fits the line of best fit of one large csv file on every core: the file is
+    split into byte ranges on line boundaries, each range is parsed and
+    reduced to a FitState in a worker process, and the states are merged.
+Author: Edward Zhou
+'''
+
+import os
+import time
+import warnings
+import argparse
+import concurrent.futures
+
+import loader
+from fit_state import FitState
+
+def reduce_range(filename, start, end, chunkBytes = loader.CHUNK_BYTES):
+    '''
+    Parses a byte range of a file and reduces it to its sufficient statistics.
+    Args:
+        filename (str) : the csv file with the points.
+        start (int) : the byte offset of the range's first line.
+        end (int) : the byte offset just after the range's last line.
+        chunkBytes (int) : the approximate size of text parsed at a time.
+    Returns:
+        stats (tuple) : the moments of the range (see FitState.stats).
+        rejected (int) : the number of malformed rows skipped.
+    '''
+    state = FitState()
+    rejected = 0
+    for xs, ys, skipped in loader.iter_range(filename, start, end, chunkBytes):
+        if xs.size:
+            state.update(xs, ys)
+        rejected += skipped
+    return state.stats, rejected
+
+def parallel_fit(filename, workers = None, shardsPerWorker = 4,
+                 chunkBytes = loader.CHUNK_BYTES):
+    '''
+    Fits a file by reducing byte ranges of it in a process pool. Gives the
+        same line as the serial fit up to rounding.
+    Args:
+        filename (str) : the csv file with the points.
+        workers (int) : the number of processes, defaults to the cpu count.
+        shardsPerWorker (int) : ranges per process, more ranges even out
+            workers that get slower ranges.
+        chunkBytes (int) : the approximate size of text parsed at a time.
+    Returns:
+        state (FitState) : the statistics of every point in the file.
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+        loss (float) : the total squared loss of the points from the line.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ranges = loader.line_boundaries(filename, workers*shardsPerWorker)
+    starts = [start for start, end in ranges]
+    ends = [end for start, end in ranges]
+    args = ([filename]*len(ranges), starts, ends, [chunkBytes]*len(ranges))
+
+    if workers <= 1 or len(ranges) <= 1:
+        partials = list(map(reduce_range, *args))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            partials = list(pool.map(reduce_range, *args))
+
+    state = FitState()
+    rejected = 0
+    for stats, skipped in partials:
+        state = state.merge(FitState(stats))
+        rejected += skipped
+    if rejected:
+        warnings.warn("skipped %d malformed rows in %s"%(rejected, filename))
+
+    slope, intercept = state.fit()
+    return state, slope, intercept, state.squared_loss(slope, intercept)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument('filename', help = "the csv file with the points")
+    parser.add_argument('-j', '--workers', type = int, default = None,
+                        help = "worker processes (default: cpu count)")
+    parser.add_argument('--shards-per-worker', type = int, default = 4)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    state, slope, intercept, loss = parallel_fit(args.filename, args.workers,
+                                                 args.shards_per_worker)
+    print("Total Squared Loss:\n%f"%loss)
+    print("\nSlope: %.5f\nIntercept: %.5f"%(slope, intercept))
+    print("Fitted %d points in %.3fs"%(state.n, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
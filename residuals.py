@@ -0,0 +1,126 @@
+'''
+Calculates the residuals of points from a line and their summary statistics
+    (sum of squared errors, root mean squared error, smallest and largest
+    error) in one vectorized pass, optionally without keeping the residuals.
+    Residuals of float32 points are calculated and summed in float64 and
+    only stored as float32.
+Author: Edward Zhou
+'''
+
+import numpy as np
+
+import instrument
+
+CHUNK_SIZE = 1 << 16
+
+class ResidualStats:
+    '''
+    The summary statistics of the residuals of points from a line.
+    Attributes:
+        n (int) : the number of points.
+        sse (float) : the sum of squared errors (the total squared loss).
+        rmse (float) : the root mean squared error, the sd used by the
+            generators.
+        minError (float) : the most negative residual.
+        maxError (float) : the most positive residual.
+    '''
+
+    def __init__(self, n, sse, minError, maxError):
+        self.n = n
+        self.sse = sse
+        self.rmse = (sse/n)**0.5 if n else 0.0
+        self.minError = minError
+        self.maxError = maxError
+
+    def __repr__(self):
+        return "ResidualStats(n=%d, sse=%g, rmse=%g, min=%g, max=%g)"%(
+            self.n, self.sse, self.rmse, self.minError, self.maxError)
+
+def residuals(xs, ys, slope, intercept, out = None):
+    '''
+    Calculates the residuals of points from a line.
+    Args:
+        xs (np.array) : an array of x values stored as float64 (or float32).
+        ys (np.array) : an array of y values stored as float64 (or float32).
+        slope (float) : the slope of the line (a in y = ax+b).
+        intercept (float) : the intercept of the line (b in y = ax+b).
+        out (np.array) : a float64 array the residuals are written into,
+            None for a new one.
+    Returns:
+        errors (np.array) : observed - predicted y for every point, as float64.
+    '''
+    errors = np.multiply(xs, slope, out = out, dtype = np.float64)
+    errors += intercept
+    return np.subtract(ys, errors, out = errors)
+
+def sum_squares(values, chunkSize = CHUNK_SIZE):
+    '''
+    Sums the squares of values in float64, float32 values a chunk at a time
+        so they are never all copied.
+    Args:
+        values (np.array) : the values.
+        chunkSize (int) : the number of float32 values converted at a time.
+    Returns:
+        total (float) : the sum of squares.
+    '''
+    if values.dtype == np.float64:
+        return float(np.dot(values, values))
+    total = 0.0
+    for start in range(0, values.size, chunkSize):
+        chunk = values[start:start+chunkSize].astype(np.float64)
+        total += float(np.dot(chunk, chunk))
+    return total
+
+def residual_stats(xs, ys, slope, intercept, keep = True,
+                   chunkSize = CHUNK_SIZE):
+    '''
+    Calculates the residuals of points from a line and their statistics.
+    Args:
+        xs (arr) : an array of x values.
+        ys (arr) : an array of y values.
+        slope (float) : the slope of the line (a in y = ax+b).
+        intercept (float) : the intercept of the line (b in y = ax+b).
+        keep (bool) : returns the residuals. Without them the points are
+            gone through in chunks of chunkSize, so only one chunk of
+            residuals is held at a time.
+        chunkSize (int) : the number of points per chunk when not keeping
+            the residuals, or when the points are float32.
+    Returns:
+        errors (np.array) : the residuals, in the dtype of the points (float32
+            points keep float32 residuals), None if keep is False.
+        stats (ResidualStats) : the statistics of the residuals.
+    '''
+    with instrument.span('residuals', points = np.size(xs), keep = keep):
+        xs = np.asarray(xs)
+        dtype = np.float32 if xs.dtype == np.float32 else np.float64
+        xs = np.asarray(xs, dtype = dtype).ravel()
+        ys = np.asarray(ys, dtype = dtype).ravel()
+        slope = float(np.squeeze(slope))
+        intercept = float(np.squeeze(intercept))
+        if xs.size == 0:
+            return (np.empty(0, dtype = dtype) if keep else None,
+                    ResidualStats(0, 0.0, float('nan'), float('nan')))
+
+        if keep and dtype == np.float64:
+            errors = residuals(xs, ys, slope, intercept)
+            return errors, ResidualStats(xs.size,
+                                         float(np.dot(errors, errors)),
+                                         float(errors.min()),
+                                         float(errors.max()))
+
+        #float32 residuals are stored from the float64 chunks as they go.
+        kept = np.empty(xs.size, dtype = dtype) if keep else None
+        buffer = np.empty(min(chunkSize, xs.size))
+        sse = 0.0
+        minError = np.inf
+        maxError = -np.inf
+        for start in range(0, xs.size, chunkSize):
+            end = min(start+chunkSize, xs.size)
+            errors = residuals(xs[start:end], ys[start:end], slope, intercept,
+                               out = buffer[:end-start])
+            sse += float(np.dot(errors, errors))
+            minError = min(minError, float(errors.min()))
+            maxError = max(maxError, float(errors.max()))
+            if keep:
+                kept[start:end] = errors
+        return kept, ResidualStats(xs.size, sse, minError, maxError)
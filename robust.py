@@ -0,0 +1,131 @@
+'''
+Fits lines that outliers do not pull around: a Theil-Sen fit on sampled
+    pair slopes and a Huber fit by iteratively reweighted least squares.
+    Medians are found by selection (np.partition) rather than sorting, so
+    both stay practical on millions of points.
+Author: Edward Zhou
+'''
+
+import numpy as np
+
+import seeding
+import fit_engine
+import residuals
+
+#the number of pair slopes Theil-Sen takes the median of, every pair is used
+#when there are fewer.
+MAX_PAIRS = 1 << 22
+#the tuning constant giving the Huber fit 95% of the efficiency of least
+#squares on gaussian errors.
+HUBER_K = 1.345
+#scales the median absolute deviation to the sd of gaussian errors.
+MAD_SCALE = 1.4826
+
+def median(values):
+    '''
+    Finds the median of an array by selection instead of a full sort.
+    Args:
+        values (np.array) : the values, which are not modified.
+    Returns:
+        median (float) : the middle value, the mean of the two middle values
+            for an even number of values.
+    '''
+    values = np.asarray(values, dtype = np.float64).ravel()
+    n = values.size
+    if n == 0:
+        raise ValueError("median of no values")
+    half = n//2
+    if n % 2:
+        return float(np.partition(values, half)[half])
+    lower, upper = np.partition(values, (half-1, half))[half-1:half+1]
+    return float((lower + upper)/2)
+
+def pair_indices(n, pairs, rng):
+    '''
+    Picks pairs of distinct points, all of them if there are at most "pairs".
+    Args:
+        n (int) : the number of points.
+        pairs (int) : the largest number of pairs picked.
+        rng (np.random.Generator) : the generator of the sampled pairs.
+    Returns:
+        first (np.array) : the index of the first point of every pair.
+        second (np.array) : the index of the second point of every pair.
+    '''
+    if n*(n-1)//2 <= pairs:
+        return np.triu_indices(n, 1)
+    first = rng.integers(0, n, pairs)
+    #an offset of 1 to n-1 never pairs a point with itself.
+    second = (first + rng.integers(1, n, pairs)) % n
+    return first, second
+
+def theil_sen(xs, ys, pairs = MAX_PAIRS, seed = 0):
+    '''
+    Fits the line with the median slope between pairs of points and the
+        median intercept those points give with it. Pairs are sampled once
+        there are more than "pairs" of them, making the fit O(n) with the
+        O(n^2) exact fit's 29% breakdown point (up to sampling error).
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        pairs (int) : the largest number of pair slopes used.
+        seed (int/SeedSequence/Generator) : the seed of the sampled pairs,
+            fixed by default so a file always gets the same fit.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    xs, ys = fit_engine.as_points(xs, ys)
+    first, second = pair_indices(xs.size, pairs, seeding.make_rng(seed))
+    xDiff = xs[second] - xs[first]
+    yDiff = ys[second] - ys[first]
+    valid = xDiff != 0
+    if not valid.any():
+        raise ZeroDivisionError("all x values are identical")
+    slope = median(yDiff[valid]/xDiff[valid])
+    intercept = median(residuals.residuals(xs, ys, slope, 0.0))
+    return slope, intercept
+
+def huber(xs, ys, k = HUBER_K, maxIter = 50, tol = 1e-10):
+    '''
+    Fits the line minimising the Huber loss, squared for residuals within k
+        scaled deviations of the line and linear beyond, by reweighting the
+        least squares fit until it stops moving. The scale is the median
+        absolute deviation of the residuals.
+    Args:
+        xs (np.array) : an array of x values stored as float64.
+        ys (np.array) : an array of y values stored as float64.
+        k (float) : the number of scaled deviations an outlier starts at.
+        maxIter (int) : the largest number of reweighted fits.
+        tol (float) : stops when the slope and intercept move less than this
+            relative to their size.
+    Returns:
+        slope (float) : the slope of the model (a in y = ax+b).
+        intercept (float) : the intercept of the model (b in y = ax+b).
+    '''
+    xs, ys = fit_engine.as_points(xs, ys)
+    slope, intercept = fit_engine.moments_fit(fit_engine.moments(xs, ys))
+    errors = np.empty(xs.size)
+    weights = np.empty(xs.size)
+    for i in range(maxIter):
+        residuals.residuals(xs, ys, slope, intercept, out = errors)
+        np.abs(errors, out = errors)
+        scale = MAD_SCALE*median(errors)
+        if scale == 0:
+            break
+
+        #w = min(1, k*scale/|r|), written without dividing by 0.
+        np.maximum(errors, k*scale, out = weights)
+        np.divide(k*scale, weights, out = weights)
+        weightTot = weights.sum()
+        xMean = np.dot(weights, xs)/weightTot
+        yMean = np.dot(weights, ys)/weightTot
+        xDiff = xs - xMean
+        weighted = weights*xDiff
+        newSlope = float(np.dot(weighted, ys - yMean)/np.dot(weighted, xDiff))
+        newIntercept = float(yMean - newSlope*xMean)
+
+        moved = max(abs(newSlope - slope), abs(newIntercept - intercept))
+        slope, intercept = newSlope, newIntercept
+        if moved <= tol*max(1.0, abs(slope), abs(intercept)):
+            break
+    return slope, intercept
@@ -0,0 +1,155 @@
+'''
+Creates reproducible random number streams for the point generators, and
+    splits a generation job into blocks that can be spread over workers
+    while giving the same output for the same seed whatever the worker count.
+Author: Edward Zhou
+'''
+
+import concurrent.futures
+
+import numpy as np
+
+BLOCK_SIZE = 1 << 20
+
+def seed_sequence(seed = None):
+    '''
+    Gets the SeedSequence behind a seed.
+    Args:
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+            A Generator is consumed to derive the sequence.
+    Returns:
+        sequence (np.random.SeedSequence) : the root of the streams.
+    '''
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(seed.integers(2**63, size = 4))
+    return np.random.SeedSequence(seed)
+
+def make_rng(seed = None):
+    '''
+    Gets a random number generator for a seed.
+    Args:
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+            A Generator is used as is.
+    Returns:
+        rng (np.random.Generator) : the generator.
+    '''
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+def child(seed, index):
+    '''
+    Gets the index-th independent child stream of a seed. Unlike
+        SeedSequence.spawn this does not depend on how many children were
+        spawned before, so the same index always gives the same stream.
+    Args:
+        seed (int/SeedSequence/Generator) : the parent seed.
+        index (int) : which child.
+    Returns:
+        sequence (np.random.SeedSequence) : the child's seed.
+    '''
+    parent = seed_sequence(seed)
+    return np.random.SeedSequence(parent.entropy,
+                                  spawn_key = parent.spawn_key + (index,),
+                                  pool_size = parent.pool_size)
+
+def spawn(seed, count):
+    '''
+    Gets independent, non-overlapping generators for count workers.
+    Args:
+        seed (int/SeedSequence/Generator) : the parent seed.
+        count (int) : the number of generators.
+    Returns:
+        rngs (arr) : a list of np.random.Generator.
+    '''
+    parent = seed_sequence(seed)
+    return [np.random.default_rng(child(parent, i)) for i in range(count)]
+
+def _generate_block(generator, args, size, seed, kwargs):
+    return generator(*args, size = size, seed = seed, **kwargs)
+
+#the generator, arguments and keywords a worker process of block_pool
+#generates blocks with, set once when the worker starts.
+_workerJob = None
+
+def _start_worker(generator, args, kwargs):
+    global _workerJob
+    _workerJob = (generator, args, kwargs)
+
+def pool_block(size, seed):
+    '''
+    Generates one block in a worker process of block_pool.
+    Args:
+        size (int) : the number of points of the block.
+        seed (SeedSequence) : the seed of the block.
+    Returns:
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
+    '''
+    generator, args, kwargs = _workerJob
+    return generator(*args, size = size, seed = seed, **kwargs)
+
+def block_pool(workers, generator, args, kwargs):
+    '''
+    Starts worker processes that each receive the generator and its
+        arguments once, when they start, so a block task (see pool_block)
+        only sends its size and seed rather than the whole fit again.
+    Args:
+        workers (int) : the number of processes.
+        generator (function) : a generator taking size and seed keywords.
+        args (tuple) : the positional arguments of the generator.
+        kwargs (dict) : the other keyword arguments of the generator.
+    Returns:
+        pool (ProcessPoolExecutor) : the pool.
+    '''
+    return concurrent.futures.ProcessPoolExecutor(
+        workers, initializer = _start_worker,
+        initargs = (generator, args, kwargs))
+
+def parallel_generate(generator, args, size, seed = None, workers = 1,
+                      blockSize = BLOCK_SIZE, threads = False,
+                      dtype = np.float64, **kwargs):
+    '''
+    Generates points in fixed-size blocks, each with its own child stream of
+        the seed. Blocks only depend on the seed and blockSize, so the output
+        is bit-identical whatever the number of workers.
+    Args:
+        generator (function) : a generator taking size and seed keywords
+            (e.g. gen_partition.generator).
+        args (tuple) : the positional arguments of the generator.
+        size (int) : the total number of points to be generated.
+        seed (int/SeedSequence/Generator) : the seed, None for fresh entropy.
+        workers (int) : the number of workers blocks are spread over.
+        blockSize (int) : the number of points per block.
+        threads (bool) : uses threads instead of processes as workers.
+        dtype (str/type) : the dtype of the points. The blocks are still
+            generated in float64 and cast before being concatenated, so
+            float32 halves the memory of the concatenated points but not
+            that of the blocks while they are generated.
+    Returns:
+        xs (np.array) : an array of generated x values.
+        ys (np.array) : an array of generated y values.
+    '''
+    parent = seed_sequence(seed)
+    sizes = [min(blockSize, size-start) for start in range(0, size, blockSize)]
+    seeds = [child(parent, i) for i in range(len(sizes))]
+    tasks = ([generator]*len(sizes), [args]*len(sizes), sizes, seeds,
+             [kwargs]*len(sizes))
+
+    if workers <= 1 or len(sizes) <= 1:
+        blocks = list(map(_generate_block, *tasks))
+    elif threads:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            blocks = list(pool.map(_generate_block, *tasks))
+    else:
+        with block_pool(workers, generator, args, kwargs) as pool:
+            blocks = list(pool.map(pool_block, sizes, seeds))
+
+    if not blocks:
+        return np.empty(0, dtype = dtype), np.empty(0, dtype = dtype)
+    return (np.concatenate([np.asarray(block[0], dtype = dtype)
+                            for block in blocks]),
+            np.concatenate([np.asarray(block[1], dtype = dtype)
+                            for block in blocks]))
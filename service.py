@@ -0,0 +1,429 @@
+'''
+Serves fits and generated points over HTTP on localhost from one warm
+    process, so a request does not pay for interpreter startup, imports or
+    refitting unchanged inputs. Concurrent least squares fits are coalesced
+    into one multi_fit call, and generated points are streamed back as csv
+    in chunks while they are being generated.
+Endpoints:
+    GET /health : the engines and generators available.
+    POST /fit : fits a "file" or inline "points" ({"x": [...], "y": [...]})
+        with an "engine" (default lsr) and its "params".
+    POST /generate : the same fields plus "generator", "size", "seed" and
+        "blockSize", answered with a chunked x,y csv stream.
+Author: Edward Zhou
+'''
+
+import json
+import time
+import queue
+import hashlib
+import logging
+import argparse
+import threading
+import collections
+import http.client
+import http.server
+import concurrent.futures
+
+import numpy as np
+
+import loader
+import engines
+import formats
+import fit_cache
+import instrument
+import fit_engine
+import generators
+import multi_fit
+
+HOST = '127.0.0.1'
+PORT = 8765
+#fits kept in memory, most recently used last.
+FIT_CACHE_SIZE = 256
+#small blocks so the first points reach the client quickly.
+STREAM_BLOCK_SIZE = 1 << 16
+
+class FitBatcher:
+    '''
+    Fits least squares lines for many threads at once: requests that arrive
+        while a batch is being fitted are queued and fitted together as one
+        set of series (see multi_fit.fit_series).
+    '''
+
+    def __init__(self, window = 0.0, maxBatch = 4096):
+        '''
+        Args:
+            window (float) : seconds to wait for more requests after the
+                first one, 0 to only take the ones already queued.
+            maxBatch (int) : the most requests fitted together.
+        '''
+        self.window = window
+        self.maxBatch = maxBatch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def fit(self, xs, ys):
+        '''
+        Fits a line, waiting for the batch it is fitted in.
+        Args:
+            xs (np.array) : an array of x values stored as float64.
+            ys (np.array) : an array of y values stored as float64.
+        Returns:
+            slope (float) : the slope of the model (a in y = ax+b).
+            intercept (float) : the intercept of the model (b in y = ax+b).
+        '''
+        future = concurrent.futures.Future()
+        self._queue.put((xs, ys, future))
+        return future.result()
+
+    def _take(self):
+        jobs = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(jobs) < self.maxBatch:
+            try:
+                timeout = deadline - time.perf_counter()
+                if timeout > 0:
+                    jobs.append(self._queue.get(timeout = timeout))
+                else:
+                    jobs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._take()
+            instrument.count('service.batches')
+            instrument.count('service.batched', len(jobs))
+            try:
+                columns = multi_fit.fit_series(*multi_fit.concat_series(
+                    (xs, ys) for xs, ys, future in jobs))
+            except Exception as error:
+                for xs, ys, future in jobs:
+                    future.set_exception(error)
+                continue
+            for i, (xs, ys, future) in enumerate(jobs):
+                slope = float(columns['Slope'][i])
+                if np.isnan(slope):
+                    future.set_exception(ZeroDivisionError(
+                        "cannot fit a line to %d points with one x value"
+                        %xs.size))
+                else:
+                    future.set_result((slope, float(columns['Intercept'][i])))
+
+class Service:
+    '''
+    The warm state shared by the request handlers: the fit batcher and the
+        most recently used fits.
+    '''
+
+    def __init__(self, diskCache = True, batchWindow = 0.0):
+        '''
+        Args:
+            diskCache (bool) : also keeps the fits of files in fit_cache, so
+                they outlive the server.
+            batchWindow (float) : see FitBatcher.
+        '''
+        self.diskCache = diskCache
+        self.batcher = FitBatcher(batchWindow)
+        self._fits = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, fit):
+        with self._lock:
+            self._fits[key] = fit
+            self._fits.move_to_end(key)
+            while len(self._fits) > FIT_CACHE_SIZE:
+                self._fits.popitem(last = False)
+
+    def get_fit(self, request):
+        '''
+        Gets the fit a request asks for, from memory, the disk cache or by
+            fitting it.
+        Args:
+            request (dict) : the decoded request (see the module docstring).
+        Returns:
+            fit (FitResult) : the fit.
+            cached (bool) : True if it was not fitted for this request.
+        '''
+        engine = request.get('engine', 'lsr')
+        params = request.get('params', {})
+        engines.get_engine(engine)
+        settings = json.dumps([engine, params], sort_keys = True)
+
+        filename = request.get('file')
+        if 'points' in request:
+            xs, ys = fit_engine.as_points(request['points']['x'],
+                                          request['points']['y'])
+            if xs.size != ys.size:
+                raise ValueError("x and y have different lengths")
+            digest = hashlib.sha1(xs.tobytes())
+            digest.update(ys.tobytes())
+            digest.update(settings.encode())
+            key = 'points:' + digest.hexdigest()
+        elif filename is not None:
+            xs = ys = None
+            key = fit_cache.cache_key(filename, engine, **params)
+        else:
+            raise ValueError("a request needs a file or points")
+
+        with self._lock:
+            fit = self._fits.get(key)
+            if fit is not None:
+                self._fits.move_to_end(key)
+        if fit is not None:
+            instrument.count('service.memory_hits')
+            return fit, True
+        if xs is None and self.diskCache:
+            fit = fit_cache.lookup(key)[0]
+            if fit is not None:
+                self._remember(key, fit)
+                return fit, True
+
+        if xs is None:
+            xs, ys = loader.load_points(filename)
+        if engine == 'lsr' and not params:
+            slope, intercept = self.batcher.fit(xs, ys)
+        else:
+            slope, intercept = engines.fit(engine, xs, ys, **params)
+        fit = fit_engine.FitResult(xs, ys, slope, intercept)
+        if filename is not None and 'points' not in request and self.diskCache:
+            #the fit is still good when the cache cannot take it.
+            try:
+                fit_cache.store(key, fit)
+            except OSError as error:
+                instrument.count('service.cache_errors')
+                instrument.log('service.cache_error', logging.WARNING,
+                               key = key, error = str(error))
+        self._remember(key, fit)
+        return fit, False
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''
+    Answers the requests of one connection (see the module docstring).
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        instrument.log('service.request', line = format%args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n'%(len(data), data))
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error' : "unknown path %s"%self.path})
+            return
+        self._send_json(200, {'engines' : sorted(engines.ENGINES),
+                              'generators' : sorted(generators.GENERATORS)})
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+            if self.path == '/fit':
+                with instrument.span('service.fit'):
+                    fit, cached = self.server.service.get_fit(request)
+                self._send_json(200, {'slope' : fit.slope,
+                                      'intercept' : fit.intercept,
+                                      'sse' : fit.sd*fit.sd*fit.xs.size,
+                                      'sd' : fit.sd,
+                                      'points' : int(fit.xs.size),
+                                      'cached' : cached})
+                return
+            if self.path != '/generate':
+                self._send_json(404, {'error' : "unknown path %s"%self.path})
+                return
+            fit, cached = self.server.service.get_fit(request)
+            size = int(request.get('size', fit.xs.size))
+            blocks = generators.iter_blocks(
+                request.get('generator', 'partition'), fit, size,
+                request.get('seed'),
+                int(request.get('blockSize', STREAM_BLOCK_SIZE)))
+            #the first block is made before answering, so a bad generator
+            #name or size is still reported as an error.
+            first = next(blocks, None)
+        except (ValueError, KeyError, TypeError, ZeroDivisionError,
+                OSError) as error:
+            self._send_json(400, {'error' : str(error)})
+            return
+
+        with instrument.span('service.generate', points = size):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('X-Slope', repr(fit.slope))
+            self.send_header('X-Intercept', repr(fit.intercept))
+            self.end_headers()
+            self._write_chunk(b'x,y\r\n')
+            if first is not None:
+                self._write_chunk(formats.format_block(*first).encode())
+            for xs, ys in blocks:
+                self._write_chunk(formats.format_block(xs, ys).encode())
+            self.wfile.write(b'0\r\n\r\n')
+
+class Server(http.server.ThreadingHTTPServer):
+    '''
+    A thread per connection, with room for bursts of connections.
+    '''
+
+    daemon_threads = True
+    request_queue_size = 128
+
+def make_server(host = HOST, port = PORT, diskCache = True,
+                batchWindow = 0.0):
+    '''
+    Creates the server, its connection threads sharing one Service.
+    Args:
+        host (str) : the address to listen on.
+        port (int) : the port to listen on, 0 for any free port.
+        diskCache (bool) : keeps the fits of files in fit_cache as well.
+        batchWindow (float) : see FitBatcher.
+    Returns:
+        server (Server) : the server, call serve_forever on it.
+    '''
+    server = Server((host, port), Handler)
+    server.service = Service(diskCache, batchWindow)
+    return server
+
+class Client:
+    '''
+    A client of the service, for scripts and testing.
+    '''
+
+    def __init__(self, host = HOST, port = PORT, timeout = 60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _post(self, path, body):
+        connection = http.client.HTTPConnection(self.host, self.port,
+                                                timeout = self.timeout)
+        connection.request('POST', path, json.dumps(body),
+                           {'Content-Type' : 'application/json'})
+        response = connection.getresponse()
+        if response.status != 200:
+            error = json.loads(response.read()).get('error')
+            connection.close()
+            raise ValueError("%s failed (%d): %s"%(path, response.status,
+                                                    error))
+        return connection, response
+
+    @staticmethod
+    def _request(filename, xs, ys, engine, fields):
+        body = {'engine' : engine}
+        if filename is not None:
+            body['file'] = filename
+        else:
+            body['points'] = {'x' : np.asarray(xs, dtype = float).tolist(),
+                              'y' : np.asarray(ys, dtype = float).tolist()}
+        body.update(fields)
+        return body
+
+    def fit(self, filename = None, xs = None, ys = None, engine = 'lsr',
+            **params):
+        '''
+        Fits a file on the server or points sent with the request.
+        Args:
+            filename (str) : the file with the points, as seen by the server.
+            xs (arr) : an array of x values, when there is no file.
+            ys (arr) : an array of y values, when there is no file.
+            engine (str) : the name of the fitting engine.
+            params : the parameters of the engine.
+        Returns:
+            result (dict) : slope, intercept, sse, sd, points and cached.
+        '''
+        connection, response = self._post('/fit', self._request(
+            filename, xs, ys, engine, {'params' : params}))
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def generate(self, filename = None, xs = None, ys = None, engine = 'lsr',
+                 generator = 'partition', size = None, seed = None,
+                 blockSize = STREAM_BLOCK_SIZE):
+        '''
+        Generates points on the server, reading them as they are streamed.
+        Args:
+            filename (str) : the file with the points, as seen by the server.
+            xs (arr) : an array of x values, when there is no file.
+            ys (arr) : an array of y values, when there is no file.
+            engine (str) : the name of the fitting engine.
+            generator (str) : the name of the point generator.
+            size (int) : the number of points, defaults to as many as the
+                sample points.
+            seed (int) : the seed of the generated points.
+            blockSize (int) : the points the server generates at a time.
+        Returns:
+            blocks (generator) : yields (xs, ys) arrays as they arrive.
+        '''
+        fields = {'generator' : generator, 'seed' : seed,
+                  'blockSize' : blockSize}
+        if size is not None:
+            fields['size'] = size
+        connection, response = self._post('/generate', self._request(
+            filename, xs, ys, engine, fields))
+        try:
+            rest = b''
+            header = True
+            while True:
+                data = response.read1(1 << 20)
+                if not data:
+                    break
+                lines = (rest + data).split(b'\r\n')
+                rest = lines.pop()
+                if header and lines:
+                    lines = lines[1:]
+                    header = False
+                genx, geny, rejected = loader.parse_lines(
+                    [line.decode() for line in lines], 'raise')
+                if genx.size:
+                    yield genx, geny
+            if rest.strip():
+                genx, geny, rejected = loader.parse_lines([rest.decode()],
+                                                          'raise')
+                yield genx, geny
+        finally:
+            connection.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip(),
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default = HOST)
+    parser.add_argument('-p', '--port', type = int, default = PORT)
+    parser.add_argument('--no-disk-cache', action = 'store_true',
+                        help = "only keep fits in memory")
+    parser.add_argument('--batch-window', type = float, default = 0.0,
+                        help = "seconds a fit waits for others to batch with")
+    parser.add_argument('-v', '--verbosity', default = None,
+                        choices = sorted(instrument.VERBOSITY))
+    args = parser.parse_args(argv)
+
+    if args.verbosity is not None:
+        instrument.configure(args.verbosity)
+    server = make_server(args.host, args.port, not args.no_disk_cache,
+                         args.batch_window)
+    print("Serving on http://%s:%d"%server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Shared fixtures for the tests, which import the modules from the package
+    directory the same way the scripts do.
+Author: Edward Zhou
+'''
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_DIR = os.path.join(PACKAGE_DIR, 'input_data')
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
+
+def input_files():
+    '''
+    Gets the sample inputs shipped with the package.
+    Returns:
+        filenames (list) : the paths of the csv files in input_data.
+    '''
+    return sorted(os.path.join(INPUT_DIR, name)
+                  for name in os.listdir(INPUT_DIR) if name.endswith('.csv'))
+
+@pytest.fixture
+def points():
+    '''
+    A noisy line of 5000 points away from zero.
+    '''
+    rng = np.random.default_rng(7)
+    xs = rng.uniform(1, 100, 5000)
+    ys = 2.5*xs - 4 + rng.normal(0, 3, xs.size)
+    return xs, ys
+
+@pytest.fixture
+def csv_points(tmp_path, points):
+    '''
+    The points fixture written to a csv with a header, as the inputs are.
+    '''
+    xs, ys = points
+    filename = str(tmp_path/'points.csv')
+    np.savetxt(filename, np.column_stack((xs, ys)), delimiter = ',',
+               header = 'x,y', comments = '', fmt = '%.17g')
+    return filename
@@ -0,0 +1,46 @@
+'''
+Checks that batch keeps the results and metrics of every file apart.
+Author: Edward Zhou
+'''
+
+import os
+import json
+
+import pytest
+
+import batch
+import loader
+import instrument
+from conftest import PACKAGE_DIR, input_files
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_metrics_are_per_file(tmp_path, workers):
+    filenames = input_files()[1:4]
+    results = batch.run(filenames, outDir = str(tmp_path/'out'),
+                        workers = workers, seed = 5)
+    sizes = [loader.load_points(filename)[0].size for filename in filenames]
+    assert [result['metrics']['counters']['rows.parsed']
+            for result in results] == sizes
+    assert [result['metrics']['counters']['rows.written']
+            for result in results] == sizes
+    assert [result['metrics']['spans']['load']['calls']
+            for result in results] == [1]*len(filenames)
+
+    metricsFile = str(tmp_path/'metrics.json')
+    instrument.write_metrics(metricsFile, {result['filename'] :
+                                           result['metrics']
+                                           for result in results})
+    with open(metricsFile) as metricsIn:
+        written = json.load(metricsIn)
+    assert [written[filename]['counters']['rows.parsed']
+            for filename in filenames] == sizes
+
+def test_results_match_output(tmp_path):
+    filenames = input_files()
+    results = batch.run(filenames, outDir = str(tmp_path/'out'), workers = 1)
+    outFileName = str(tmp_path/'output.csv')
+    batch.write_summary(results, outFileName)
+    with open(outFileName) as summaryIn:
+        written = summaryIn.read()
+    with open(os.path.join(PACKAGE_DIR, 'output.csv')) as expectedIn:
+        assert written == expectedIn.read()
@@ -0,0 +1,67 @@
+'''
+Checks the vectorised bootstrap against refitting every resample, and that
+    its resamples do not depend on how they are chunked or spread.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import seeding
+import fit_engine
+import bootstrap
+
+def exact_fit(xs, ys):
+    return fit_engine.moments_fit(fit_engine.moments(xs, ys))
+
+@pytest.fixture
+def sample():
+    rng = np.random.default_rng(9)
+    xs = rng.uniform(0, 10, 300)
+    ys = 2*xs + 1 + rng.normal(0, 1 + xs/5, xs.size)
+    return xs, ys
+
+def test_pairs_match_refits(sample):
+    xs, ys = sample
+    replicates = bootstrap.BLOCK_REPLICATES
+    result = bootstrap.bootstrap(xs, ys, replicates, seed = 4)
+    #the first block draws every resample's indices from child 0 in order.
+    rng = seeding.make_rng(seeding.child(seeding.seed_sequence(4), 0))
+    index = rng.integers(0, xs.size, (replicates, xs.size), dtype = np.int64)
+    refits = np.array([exact_fit(xs[row], ys[row]) for row in index])
+    assert np.allclose(result.slopes, refits[:, 0], rtol = 1e-9)
+    assert np.allclose(result.intercepts, refits[:, 1], rtol = 1e-9)
+
+@pytest.mark.parametrize('mode', bootstrap.MODES)
+def test_same_resamples_for_any_chunks_or_workers(sample, mode):
+    first = bootstrap.bootstrap(*sample, 200, mode = mode, seed = 8)
+    spread = bootstrap.bootstrap(*sample, 200, mode = mode, seed = 8,
+                                 workers = 2)
+    chunked = bootstrap.bootstrap(*sample, 200, mode = mode, seed = 8,
+                                  chunkBytes = 50000)
+    assert first.slopes.size == 200
+    assert np.array_equal(first.slopes, spread.slopes)
+    assert np.array_equal(first.intercepts, spread.intercepts)
+    #the same resamples, but a matrix product of another shape may round
+    #the last bit differently.
+    assert np.allclose(first.slopes, chunked.slopes, rtol = 1e-12)
+    assert np.allclose(first.intercepts, chunked.intercepts, rtol = 1e-12)
+
+@pytest.mark.parametrize('mode', bootstrap.MODES)
+def test_intervals_cover_the_fit(sample, mode):
+    result = bootstrap.bootstrap(*sample, 1000, mode = mode, seed = 1)
+    assert (result.slope, result.intercept) == pytest.approx(
+        exact_fit(*sample))
+    low, high = result.slopeInterval
+    assert low < result.slope < high
+    #the resampled slopes spread like the standard error of the slope.
+    xs, ys = sample
+    errors = ys - (result.slope*xs + result.intercept)
+    xDiff = xs - xs.mean()
+    stdError = np.sqrt(np.dot(errors, errors)/(xs.size - 2)/
+                       np.dot(xDiff, xDiff))
+    assert np.std(result.slopes) == pytest.approx(stdError, rel = 0.3)
+
+def test_unknown_mode(sample):
+    with pytest.raises(ValueError):
+        bootstrap.bootstrap(*sample, mode = 'wild')
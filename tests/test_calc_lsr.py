@@ -0,0 +1,27 @@
+'''
+Checks the least squares fit against the results in output.csv.
+Author: Edward Zhou
+'''
+
+import os
+import csv
+
+import pytest
+
+import loader
+import calc_lsr
+from conftest import PACKAGE_DIR, INPUT_DIR
+
+def expected_fits():
+    with open(os.path.join(PACKAGE_DIR, 'output.csv')) as resultsIn:
+        return [(row['Filename'], float(row['Slope']), float(row['Intercept']))
+                for row in csv.DictReader(resultsIn)]
+
+@pytest.mark.parametrize('filename, slope, intercept', expected_fits())
+@pytest.mark.parametrize('stable', [False, True])
+def test_calculator_matches_output(filename, slope, intercept, stable):
+    xs, ys = loader.load_points(os.path.join(INPUT_DIR, filename))
+    fitted = calc_lsr.calculator(xs, ys, xs.mean(), ys.mean(),
+                                 stable = stable)[2:]
+    #output.csv is rounded to 6 decimals.
+    assert fitted == pytest.approx((slope, intercept), abs = 5e-7)
@@ -0,0 +1,37 @@
+'''
+Checks that the trained model lands on the least squares line.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import calc_ml
+import fit_engine
+
+def exact_fit(xs, ys):
+    return fit_engine.moments_fit(fit_engine.moments(xs, ys))
+
+@pytest.mark.parametrize('low, high', [(0, 10), (-5, 5), (1000, 1010)])
+def test_gd_matches_least_squares(low, high):
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(low, high, 100000)
+    ys = 1.5*xs - 5.9 + rng.normal(0, 1, xs.size)
+    slope, intercept = exact_fit(xs, ys)
+    result = calc_ml.train(xs, ys, 'gd', seed = 1)
+    assert result.slope == pytest.approx(slope, abs = 1e-3)
+    #the intercept error is the slope error times the distance to x = 0.
+    assert result.intercept == pytest.approx(intercept, abs = 0.1)
+
+def test_no_epochs_runs_no_steps(points):
+    result = calc_ml.train(*points, 'gd', epochs = 0)
+    assert result.steps == 0
+    assert not result.stoppedEarly
+
+def test_normal_is_exact(points):
+    assert calc_ml.make_train_model(*points, 'normal') == pytest.approx(
+        exact_fit(*points), rel = 1e-12)
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        calc_ml.train(np.arange(3.0), np.arange(3.0), 'svm')
@@ -0,0 +1,85 @@
+'''
+Checks that cached fits are found again only for the same contents, engine
+    and dtype.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import loader
+import fit_cache
+import fit_engine
+
+def fit_file(filename, dtype):
+    xs, ys = loader.load_points(filename, dtype = dtype)
+    return fit_engine.FitResult(xs, ys, *fit_engine.stable_fit(xs, ys))
+
+def test_miss_then_hit(tmp_path, csv_points):
+    cacheDir = str(tmp_path/'fits')
+    key = fit_cache.cache_key(csv_points, 'lsr', np.float64)
+    assert fit_cache.lookup(key, cacheDir) == (None, None)
+
+    fit = fit_file(csv_points, np.float64)
+    fit_cache.store(key, fit, cacheDir = cacheDir)
+    cached, sse = fit_cache.lookup(key, cacheDir)
+    assert (cached.slope, cached.intercept) == (fit.slope, fit.intercept)
+    assert cached.xs.dtype == np.float64
+    assert sse == pytest.approx(float((fit.errors**2).sum()))
+
+def test_keys_differ_by_dtype(tmp_path, csv_points):
+    cacheDir = str(tmp_path/'fits')
+    key64 = fit_cache.cache_key(csv_points, 'lsr', np.float64)
+    key32 = fit_cache.cache_key(csv_points, 'lsr', np.float32)
+    assert key64 != key32
+
+    fit_cache.store(key64, fit_file(csv_points, np.float64),
+                    cacheDir = cacheDir)
+    assert fit_cache.lookup(key32, cacheDir) == (None, None)
+
+    fit32 = fit_file(csv_points, np.float32)
+    fit_cache.store(key32, fit32, cacheDir = cacheDir)
+    cached, sse = fit_cache.lookup(key32, cacheDir)
+    assert cached.xs.dtype == np.float32
+    assert cached.slope == fit32.slope
+    assert fit_cache.lookup(key64, cacheDir)[0].xs.dtype == np.float64
+
+def test_changed_contents_miss(tmp_path, csv_points):
+    cacheDir = str(tmp_path/'fits')
+    key = fit_cache.cache_key(csv_points, 'lsr')
+    fit_cache.store(key, fit_file(csv_points, np.float64),
+                    cacheDir = cacheDir)
+    with open(csv_points, 'a') as pointsOut:
+        pointsOut.write('1,2\n')
+    assert fit_cache.cache_key(csv_points, 'lsr') != key
+
+def test_corrupt_entry_misses(tmp_path, csv_points):
+    cacheDir = str(tmp_path/'fits')
+    key = fit_cache.cache_key(csv_points, 'lsr')
+    fit_cache.store(key, fit_file(csv_points, np.float64),
+                    cacheDir = cacheDir)
+    path = fit_cache.entry_path(key, cacheDir)
+    with open(path, 'r+b') as entry:
+        entry.truncate(100)
+    assert fit_cache.lookup(key, cacheDir) == (None, None)
+
+def test_entry_evicted_during_lookup_misses(tmp_path, csv_points,
+                                            monkeypatch):
+    cacheDir = str(tmp_path/'fits')
+    key = fit_cache.cache_key(csv_points, 'lsr')
+    fit_cache.store(key, fit_file(csv_points, np.float64),
+                    cacheDir = cacheDir)
+    def evicted(path):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(fit_cache.os, 'utime', evicted)
+    assert fit_cache.lookup(key, cacheDir) == (None, None)
+
+def test_parse_cache_names_differ_by_dtype(tmp_path, csv_points):
+    cacheDir = str(tmp_path/'parsed')
+    assert (loader.cache_path(csv_points, cacheDir, np.float64) !=
+            loader.cache_path(csv_points, cacheDir, np.float32))
+    xs64 = loader.load_points(csv_points, cache = True, cacheDir = cacheDir)[0]
+    xs32 = loader.load_points(csv_points, cache = True, cacheDir = cacheDir,
+                              dtype = np.float32)[0]
+    assert (xs64.dtype, xs32.dtype) == (np.float64, np.float32)
+    assert np.array_equal(xs32, xs64.astype(np.float32))
@@ -0,0 +1,51 @@
+'''
+Checks that merged, updated and reduced states give the same line as
+    fitting the points directly.
+Author: Edward Zhou
+'''
+
+import pytest
+
+import calc_lsr
+from fit_state import FitState
+
+def direct_fit(xs, ys):
+    return calc_lsr.calculator(xs, ys, xs.mean(), ys.mean())[2:]
+
+def test_merge_matches_direct_fit(points):
+    xs, ys = points
+    state = FitState()
+    for start in range(0, xs.size, 700):
+        state = state.merge(FitState.from_points(xs[start:start+700],
+                                                 ys[start:start+700]))
+    assert state.n == xs.size
+    assert state.fit() == pytest.approx(direct_fit(xs, ys), rel = 1e-9)
+
+def test_merge_order_does_not_matter(points):
+    xs, ys = points
+    first = FitState.from_points(xs[:1000], ys[:1000])
+    second = FitState.from_points(xs[1000:], ys[1000:])
+    assert (first + second).fit() == pytest.approx((second + first).fit(),
+                                                   rel = 1e-12)
+
+def test_update_matches_direct_fit(points):
+    xs, ys = points
+    state = FitState()
+    for start in range(0, xs.size, 999):
+        state.update(xs[start:start+999], ys[start:start+999])
+    assert state.fit() == pytest.approx(direct_fit(xs, ys), rel = 1e-9)
+
+def test_remove_matches_fit_of_the_rest(points):
+    xs, ys = points
+    state = FitState.from_points(xs, ys).remove(xs[:1500], ys[:1500])
+    assert state.n == xs.size - 1500
+    assert state.fit() == pytest.approx(direct_fit(xs[1500:], ys[1500:]),
+                                        rel = 1e-9)
+
+def test_save_round_trips(tmp_path, points):
+    state = FitState.from_points(*points)
+    path = str(tmp_path/'state.json')
+    state.save(path, offset = 12)
+    loaded, extra = FitState.load(path)
+    assert loaded.stats == state.stats
+    assert extra == {'offset' : 12}
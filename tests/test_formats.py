@@ -0,0 +1,48 @@
+'''
+Checks that points and summaries read back the same in every format.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import loader
+import formats
+
+FORMATS = ['csv', 'npy', 'npz']
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_write_points_round_trip(tmp_path, points, fmt):
+    xs, ys = points
+    outFileName = str(tmp_path/('points.' + fmt))
+    formats.write_points(outFileName, xs, ys, fmt)
+    readx, ready = loader.load_points(outFileName)
+    #csv keeps 6 decimals, the binary formats every bit.
+    tolerance = 5e-7 if fmt == 'csv' else 0
+    assert np.allclose(readx, xs, rtol = 0, atol = tolerance)
+    assert np.allclose(ready, ys, rtol = 0, atol = tolerance)
+
+@pytest.mark.parametrize('fmt', FORMATS)
+@pytest.mark.parametrize('make', [list, iter])
+def test_write_summary_round_trip(tmp_path, fmt, make):
+    rows = [('data_1.csv', 2.5, -4.0), ('data_2.csv', -0.125, 10.75),
+            ('data_3.csv', np.nan, np.nan)]
+    outFileName = str(tmp_path/('output.' + fmt))
+    formats.write_summary(make(rows), outFileName)
+    columns = formats.read_summary(outFileName)
+    assert list(columns['Filename']) == [row[0] for row in rows]
+    assert np.array_equal(columns['Slope'], [row[1] for row in rows],
+                          equal_nan = True)
+    assert np.array_equal(columns['Intercept'], [row[2] for row in rows],
+                          equal_nan = True)
+
+def test_format_names():
+    assert formats.format_of('gen_data.NPZ') == 'npz'
+    assert formats.format_of('data.txt') == 'csv'
+    assert formats.format_of('data.txt', default = 'npy') == 'npy'
+    assert formats.output_name('in/data.csv', 'npy', 'out') == \
+        'out/gen_data.npy'
+    with pytest.raises(ValueError, match = 'unknown format'):
+        formats.get_format('parquet')
+    with pytest.raises(ValueError, match = 'unknown format'):
+        formats.write_points('points.txt', [1.0], [2.0], 'txt')
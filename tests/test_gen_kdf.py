@@ -0,0 +1,45 @@
+'''
+Checks the density grid cache of old/gen_kdf, alone and shared by threads.
+Author: Edward Zhou
+'''
+
+import threading
+
+import numpy as np
+
+import generators
+
+gen_kdf = generators.load_old('gen_kdf')
+
+def sample_inputs(count):
+    rng = np.random.default_rng(0)
+    return [(rng.normal(size = 200), rng.normal(size = 200))
+            for i in range(count)]
+
+def test_density_table_is_reused():
+    xs, ys = sample_inputs(1)[0]
+    first = gen_kdf.density_table(xs, ys, bins = 20)
+    assert gen_kdf.density_table(xs.copy(), ys.copy(), bins = 20) is first
+    assert gen_kdf.density_table(xs, ys, bins = 21) is not first
+
+def test_density_table_from_threads():
+    inputs = sample_inputs(2*gen_kdf.GRID_CACHE_SIZE)
+    expected = [gen_kdf.kde2D(xs, ys, 2.0, 20j, 20j) for xs, ys in inputs]
+    errors = []
+    def build(offset):
+        try:
+            for i in range(len(inputs)):
+                index = (offset + i)%len(inputs)
+                zs, cumulative = gen_kdf.density_table(*inputs[index],
+                                                       bins = 20)
+                assert np.array_equal(zs, expected[index])
+        except Exception as error:
+            errors.append(error)
+    threads = [threading.Thread(target = build, args = (i,))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(gen_kdf.GRID_CACHE) == gen_kdf.GRID_CACHE_SIZE
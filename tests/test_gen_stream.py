@@ -0,0 +1,47 @@
+'''
+Checks that streamed points reach every output format intact, and that a
+    failed stream reports its own error.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import loader
+import gen_stream
+
+def line(size = 100, seed = None, **kwargs):
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, 10, size)
+    return xs, 3*xs + 1
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'npz'])
+def test_generate_to_file_matches_blocks(tmp_path, fmt):
+    outFileName = str(tmp_path/('points.' + fmt))
+    writer = gen_stream.generate_to_file(outFileName, line, (), 2500,
+                                         seed = 3, blockSize = 1000,
+                                         fmt = fmt)
+    blocks = list(gen_stream.iter_blocks(line, (), 2500, seed = 3,
+                                         blockSize = 1000))
+    xs, ys = loader.load_points(outFileName)
+    assert writer.rows == 2500
+    #csv keeps 6 decimals, the binary formats every bit.
+    tolerance = 5e-7 if fmt == 'csv' else 0
+    assert np.allclose(xs, np.concatenate([block[0] for block in blocks]),
+                       rtol = 0, atol = tolerance)
+    assert np.allclose(ys, np.concatenate([block[1] for block in blocks]),
+                       rtol = 0, atol = tolerance)
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'npz'])
+def test_failed_stream_keeps_its_error(tmp_path, fmt):
+    def failing():
+        yield line(1000)
+        raise RuntimeError("generator failed")
+    with pytest.raises(RuntimeError, match = "generator failed"):
+        gen_stream.write_blocks(str(tmp_path/('points.' + fmt)), failing(),
+                                fmt = fmt, size = 2000)
+
+def test_short_npy_stream_is_reported(tmp_path):
+    with pytest.raises(ValueError, match = "expected 2000 points"):
+        gen_stream.write_blocks(str(tmp_path/'points.npy'), [line(1000)],
+                                fmt = 'npy', size = 2000)
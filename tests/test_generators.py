@@ -0,0 +1,50 @@
+'''
+Checks that seeded generation does not depend on how it is spread over
+    workers.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import seeding
+import fit_engine
+import generators
+import gen_partition
+
+@pytest.fixture
+def fit(points):
+    xs, ys = points
+    return fit_engine.FitResult(xs, ys, *fit_engine.closed_form(xs, ys))
+
+def collect(blocks):
+    blocks = list(blocks)
+    return (np.concatenate([xs for xs, ys in blocks]),
+            np.concatenate([ys for xs, ys in blocks]))
+
+@pytest.mark.parametrize('name', sorted(generators.GENERATORS))
+def test_iter_blocks_same_for_any_workers(fit, name):
+    serial = collect(generators.iter_blocks(name, fit, 3000, seed = 11,
+                                            blockSize = 1000, workers = 1))
+    parallel = collect(generators.iter_blocks(name, fit, 3000, seed = 11,
+                                              blockSize = 1000, workers = 2))
+    assert serial[0].size == 3000
+    assert np.array_equal(serial[0], parallel[0])
+    assert np.array_equal(serial[1], parallel[1])
+
+def test_iter_blocks_depends_on_seed(fit):
+    first = collect(generators.iter_blocks('partition', fit, 100, seed = 1))
+    second = collect(generators.iter_blocks('partition', fit, 100, seed = 2))
+    assert not np.array_equal(first[1], second[1])
+
+@pytest.mark.parametrize('workers, threads', [(2, False), (2, True)])
+def test_parallel_generate_same_for_any_workers(fit, workers, threads):
+    args = (fit.xs, fit.slope, fit.intercept, fit.errors)
+    serial = seeding.parallel_generate(gen_partition.generator, args, 2500,
+                                       seed = 4, blockSize = 1000)
+    parallel = seeding.parallel_generate(gen_partition.generator, args,
+                                         2500, seed = 4, blockSize = 1000,
+                                         workers = workers, threads = threads)
+    assert serial[0].size == 2500
+    assert np.array_equal(serial[0], parallel[0])
+    assert np.array_equal(serial[1], parallel[1])
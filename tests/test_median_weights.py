@@ -0,0 +1,62 @@
+'''
+Checks the vectorised median-distance estimator against the point by point
+    loop of the original old/calc_weights.
+Author: Edward Zhou
+'''
+
+import os
+import math
+
+import numpy as np
+import pytest
+
+import loader
+import median_weights
+from conftest import input_files
+
+def loop_fit(xs, ys):
+    '''
+    The sorter and calculator loop of the original old/calc_weights.
+    '''
+    points = [[x, y] for x, y in zip(xs, ys)]
+    xMedian = sorted(points, key = lambda point: point[0])[len(points)//2][0]
+    yMedian = sorted(points, key = lambda point: point[1])[len(points)//2][1]
+    for point in points:
+        point.append(math.sqrt((point[0]-xMedian)**2+(point[1]-yMedian)**2))
+    points = sorted(points, key = lambda point: point[2])
+
+    seen = slope = intercept = 0
+    for x, y, distance in points:
+        if seen == 0:
+            xMin = xMax = x
+        seen += 1
+        xMin = min(xMin, x)
+        xMax = max(xMax, x)
+        if xMax-xMin != 0:
+            weight = abs((x-xMedian)/(xMax-xMin)*2)
+            intercept = ((seen-1)*intercept + (y-yMedian)*weight)/seen
+            slope = ((seen-1)*slope + (y-intercept)/x*weight)/seen
+        else:
+            intercept = ((seen-1)*intercept + y)/seen
+            slope = ((seen-1)*slope + (y-intercept)/x)/seen
+    return slope, intercept
+
+@pytest.mark.parametrize('filename', input_files(),
+                         ids = os.path.basename)
+def test_weighted_fit_matches_loop(filename):
+    xs, ys = loader.load_points(filename)
+    assert median_weights.weighted_fit(xs, ys) == pytest.approx(
+        loop_fit(xs.tolist(), ys.tolist()), rel = 1e-9, abs = 1e-12)
+
+def test_weighted_fit_matches_loop_with_ties():
+    #repeated points check that ties keep their file order.
+    rng = np.random.default_rng(3)
+    xs = rng.integers(1, 6, 200).astype(np.float64)
+    ys = 3*xs + rng.integers(-2, 3, 200)
+    assert median_weights.weighted_fit(xs, ys) == pytest.approx(
+        loop_fit(xs.tolist(), ys.tolist()), rel = 1e-9, abs = 1e-12)
+
+def test_weighted_fit_rejects_zero_x():
+    with pytest.raises(ZeroDivisionError):
+        median_weights.weighted_fit(np.array([0.0, 1.0]),
+                                    np.array([1.0, 2.0]))
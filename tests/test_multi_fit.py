@@ -0,0 +1,48 @@
+'''
+Checks the segmented fit of many series against fitting each on its own,
+    and that its summary round trips in every format.
+Author: Edward Zhou
+'''
+
+import numpy as np
+import pytest
+
+import loader
+import calc_lsr
+import formats
+import multi_fit
+from conftest import input_files
+
+def test_fit_files_matches_each_file():
+    filenames = input_files()
+    columns = multi_fit.fit_files(filenames)
+    for i, filename in enumerate(filenames):
+        xs, ys = loader.load_points(filename)
+        slope, intercept = calc_lsr.calculator(xs, ys, xs.mean(),
+                                               ys.mean())[2:]
+        assert columns['Slope'][i] == pytest.approx(slope, rel = 1e-9)
+        assert columns['Intercept'][i] == pytest.approx(intercept, rel = 1e-9)
+        assert columns['Points'][i] == xs.size
+
+def test_fit_series_handles_short_series():
+    xs, ys, offsets = multi_fit.concat_series([([1.0, 2.0, 3.0],
+                                                [2.0, 4.0, 6.0]),
+                                               ([], []), ([5.0], [1.0])])
+    columns = multi_fit.fit_series(xs, ys, offsets)
+    assert columns['Slope'][0] == pytest.approx(2.0)
+    assert columns['Intercept'][0] == pytest.approx(0.0, abs = 1e-12)
+    assert np.isnan(columns['Slope'][1:]).all()
+
+@pytest.mark.parametrize('extension', ['csv', 'npy', 'npz'])
+def test_write_table_round_trips(tmp_path, extension):
+    columns = multi_fit.fit_files(input_files())
+    outFileName = str(tmp_path/('output.' + extension))
+    multi_fit.write_table(columns, outFileName)
+    table = formats.read_summary(outFileName)
+    assert table['Filename'].tolist() == columns['Filename'].tolist()
+    #csv keeps 6 decimals, the binary formats every bit.
+    tolerance = 5e-7 if extension == 'csv' else 0
+    assert np.allclose(table['Slope'], columns['Slope'], rtol = 0,
+                       atol = tolerance)
+    assert np.allclose(table['Intercept'], columns['Intercept'], rtol = 0,
+                       atol = tolerance)
@@ -0,0 +1,22 @@
+'''
+Checks that fitting byte ranges of a file in parallel gives the serial fit.
+Author: Edward Zhou
+'''
+
+import pytest
+
+import loader
+import calc_lsr
+import parallel_fit
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parallel_fit_matches_serial(csv_points, workers):
+    xs, ys = loader.load_points(csv_points)
+    slope, intercept = calc_lsr.calculator(xs, ys, xs.mean(), ys.mean())[2:]
+    state, parSlope, parIntercept, loss = parallel_fit.parallel_fit(
+        csv_points, workers = workers, chunkBytes = 4096)
+    assert state.n == xs.size
+    assert (parSlope, parIntercept) == pytest.approx((slope, intercept),
+                                                     rel = 1e-9)
+    residuals = ys - (slope*xs + intercept)
+    assert loss == pytest.approx((residuals**2).sum(), rel = 1e-6)
@@ -0,0 +1,45 @@
+'''
+Checks the shared residual pass and that the get_file paths only keep the
+    residuals for the generators that resample them.
+Author: Edward Zhou
+'''
+
+import os
+
+import numpy as np
+import pytest
+
+import calc_ml
+import calc_lsr
+import residuals
+import generators
+from conftest import INPUT_DIR
+
+def test_chunked_stats_match_kept(points):
+    xs, ys = points
+    errors, kept = residuals.residual_stats(xs, ys, 2.5, -4)
+    none, chunked = residuals.residual_stats(xs, ys, 2.5, -4, keep = False,
+                                             chunkSize = 777)
+    assert none is None
+    assert np.array_equal(errors, ys - (2.5*xs - 4))
+    assert chunked.sse == pytest.approx(kept.sse, rel = 1e-12)
+    assert chunked.rmse == pytest.approx(kept.rmse, rel = 1e-12)
+    assert (chunked.minError, chunked.maxError) == (kept.minError,
+                                                    kept.maxError)
+
+@pytest.mark.parametrize('module', [calc_lsr, calc_ml])
+@pytest.mark.parametrize('generator', ['partition', 'gaussian'])
+def test_get_file_keeps_errors_only_when_used(monkeypatch, tmp_path,
+                                              module, generator):
+    fits = []
+    def generate(name, fit, size, seed = None, **kwargs):
+        fits.append(fit)
+        return fit.xs, fit.ys
+    monkeypatch.setattr(generators, 'generate', generate)
+    monkeypatch.setattr('builtins.input', lambda prompt: os.path.join(
+        INPUT_DIR, 'data_1_3.csv'))
+    monkeypatch.setattr(module.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(module, 'write_gen', lambda *args: 'out.csv')
+    module.get_file(generator)
+    assert (fits[0].errors is not None) == generators.uses_errors(generator)
+    assert fits[0].sd > 0
@@ -0,0 +1,71 @@
+'''
+Checks the robust engines against references and against outliers.
+Author: Edward Zhou
+'''
+
+import os
+
+import numpy as np
+import pytest
+
+import loader
+import robust
+import engines
+from conftest import input_files
+
+@pytest.fixture
+def outliers():
+    #a line with 10% of its points thrown far above it.
+    rng = np.random.default_rng(2)
+    xs = rng.uniform(0, 100, 20000)
+    ys = 2*xs + 1 + rng.normal(0, 1, xs.size)
+    ys[rng.random(xs.size) < 0.1] += 500
+    return xs, ys
+
+def test_median_matches_numpy():
+    rng = np.random.default_rng(0)
+    for size in (1, 2, 7, 10):
+        values = rng.normal(size = size)
+        assert robust.median(values) == np.median(values)
+
+@pytest.mark.parametrize('filename', input_files(),
+                         ids = os.path.basename)
+def test_theil_sen_matches_scipy(filename):
+    stats = pytest.importorskip('scipy.stats')
+    xs, ys = loader.load_points(filename)
+    slope = robust.theil_sen(xs, ys)[0]
+    assert slope == pytest.approx(stats.theilslopes(ys, xs)[0], rel = 1e-12)
+
+def test_sampled_theil_sen_is_close_to_exact():
+    rng = np.random.default_rng(1)
+    xs = rng.uniform(0, 10, 3000)
+    ys = 2*xs + 1 + rng.normal(0, 1, xs.size)
+    exact = robust.theil_sen(xs, ys)
+    sampled = robust.theil_sen(xs, ys, pairs = 200000)
+    assert sampled == pytest.approx(exact, abs = 0.02)
+
+def test_huber_is_a_reweighting_fixed_point(outliers):
+    xs, ys = outliers
+    slope, intercept = robust.huber(xs, ys)
+    errors = ys - (slope*xs + intercept)
+    scale = robust.MAD_SCALE*np.median(np.abs(errors))
+    weights = np.minimum(1, robust.HUBER_K*scale/np.abs(errors))
+    #the weighted least squares equations of the final weights hold.
+    assert abs(np.dot(weights, errors)) < 1e-6*xs.size
+    assert abs(np.dot(weights*errors, xs)) < 1e-6*xs.size*xs.mean()
+
+@pytest.mark.parametrize('engine', ['theil-sen', 'huber'])
+def test_robust_engines_ignore_outliers(outliers, engine):
+    slope, intercept = engines.fit(engine, *outliers)
+    lsrSlope, lsrIntercept = engines.fit('lsr', *outliers)
+    assert slope == pytest.approx(2, abs = 0.01)
+    assert intercept == pytest.approx(1, abs = 1)
+    assert abs(lsrIntercept - 1) > 10
+
+def test_identical_x_values():
+    with pytest.raises(ZeroDivisionError):
+        robust.theil_sen(np.ones(5), np.arange(5.0))
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        engines.get_engine('ransac')
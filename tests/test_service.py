@@ -0,0 +1,81 @@
+'''
+Checks the fit and generate endpoints of the service against the modules
+    they serve, through the client.
+Author: Edward Zhou
+'''
+
+import threading
+
+import numpy as np
+import pytest
+
+import loader
+import service
+import fit_cache
+import fit_engine
+import generators
+
+@pytest.fixture
+def client():
+    server = service.make_server(port = 0, diskCache = False)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    try:
+        yield service.Client(port = server.server_address[1], timeout = 10)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_fit_points_matches_least_squares(client, points):
+    xs, ys = points
+    result = client.fit(xs = xs, ys = ys)
+    slope, intercept = np.polyfit(xs, ys, 1)
+    assert result['slope'] == pytest.approx(slope, rel = 1e-9)
+    assert result['intercept'] == pytest.approx(intercept, rel = 1e-9)
+    assert result['points'] == xs.size
+    assert not result['cached']
+    assert client.fit(xs = xs, ys = ys)['cached']
+
+def test_fit_file_matches_loaded_points(client, csv_points):
+    xs, ys = loader.load_points(csv_points)
+    result = client.fit(csv_points)
+    slope, intercept = np.polyfit(xs, ys, 1)
+    assert result['slope'] == pytest.approx(slope, rel = 1e-9)
+    assert result['intercept'] == pytest.approx(intercept, rel = 1e-9)
+    assert result['points'] == xs.size
+
+def test_generate_streams_the_seeded_blocks(client, csv_points):
+    xs, ys = loader.load_points(csv_points)
+    result = client.fit(csv_points)
+    fit = fit_engine.FitResult(xs, ys, result['slope'], result['intercept'])
+    streamed = list(client.generate(csv_points, size = 2500, seed = 5,
+                                    blockSize = 1000))
+    expected = list(generators.iter_blocks('partition', fit, 2500, 5, 1000))
+    genx = np.concatenate([block[0] for block in streamed])
+    geny = np.concatenate([block[1] for block in streamed])
+    #the stream is csv, with 6 decimals.
+    assert genx.size == 2500
+    assert np.allclose(genx, np.concatenate([b[0] for b in expected]),
+                       rtol = 0, atol = 5e-7)
+    assert np.allclose(geny, np.concatenate([b[1] for b in expected]),
+                       rtol = 0, atol = 5e-7)
+
+def test_bad_requests_raise(client, points):
+    xs, ys = points
+    with pytest.raises(ValueError, match = r'\(400\)'):
+        client.fit(xs = xs, ys = ys, engine = 'unknown')
+    with pytest.raises(ValueError, match = r'\(400\)'):
+        client.fit(xs = xs, ys = ys[:-1])
+    with pytest.raises(ValueError, match = r'\(400\)'):
+        list(client.generate(xs = xs, ys = ys, generator = 'unknown'))
+
+def test_fit_survives_a_failed_cache_store(monkeypatch, csv_points):
+    def failing(key, fit):
+        raise OSError("disk full")
+    monkeypatch.setattr(fit_cache, 'lookup', lambda key: (None, None))
+    monkeypatch.setattr(fit_cache, 'store', failing)
+    fit, cached = service.Service().get_fit({'file' : csv_points})
+    slope, intercept = np.polyfit(fit.xs, fit.ys, 1)
+    assert not cached
+    assert fit.slope == pytest.approx(slope, rel = 1e-9)
+    assert fit.intercept == pytest.approx(intercept, rel = 1e-9)